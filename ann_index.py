@@ -0,0 +1,189 @@
+# Inverted-file (IVF) approximate nearest-neighbour index in pure NumPy.
+#
+# Rows are clustered with spherical k-means; a query scores only the rows in the
+# n_probe clusters whose centroids are closest. n_probe is the recall/latency
+# knob: n_probe == n_lists is exact search. The index is saved as ivf.npz inside
+# the embedding index directory and is tied to that index's build version.
+#
+#   python ann_index.py build --dest embedding_index
+#   python ann_index.py eval --dest embedding_index --nprobe 1 2 4 8 16
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+
+import embedding_index
+
+IVF_FILE = "ivf.npz"
+
+log = logging.getLogger("tds_ta.ann_index")
+
+
+def default_n_lists(n_rows):
+    return max(1, min(4096, int(round(np.sqrt(n_rows)))))
+
+
+def _assign(matrix, centroids, chunk_size=8192):
+    assignments = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), chunk_size):
+        block = matrix[start : start + chunk_size]
+        assignments[start : start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(matrix, n_lists, n_iter=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = np.array(matrix[rng.choice(len(matrix), n_lists, replace=False)], dtype=np.float32)
+    for _ in range(n_iter):
+        assignments = _assign(matrix, centroids)
+        sums = np.zeros_like(centroids)
+        for start in range(0, len(matrix), 8192):
+            block_assignments = assignments[start : start + 8192]
+            one_hot = np.zeros((len(block_assignments), n_lists), dtype=np.float32)
+            one_hot[np.arange(len(block_assignments)), block_assignments] = 1.0
+            sums += one_hot.T @ matrix[start : start + 8192]
+        counts = np.bincount(assignments, minlength=n_lists)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters from random rows so every list stays useful.
+            sums[empty] = matrix[rng.choice(len(matrix), int(empty.sum()), replace=False)]
+        centroids = embedding_index.normalize_rows(sums)
+    return centroids, _assign(matrix, centroids)
+
+
+class IVFIndex:
+    def __init__(self, centroids, list_offsets, list_rows, index_version=None):
+        self.centroids = centroids  # [n_lists, dim] unit vectors
+        self.list_offsets = list_offsets  # [n_lists + 1] into list_rows
+        self.list_rows = list_rows  # row ids grouped by list
+        self.index_version = index_version
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, matrix, n_lists=None, n_iter=10, seed=0, index_version=None):
+        n_lists = min(n_lists or default_n_lists(len(matrix)), len(matrix))
+        centroids, assignments = spherical_kmeans(matrix, n_lists, n_iter, seed)
+        list_rows = np.argsort(assignments, kind="stable").astype(np.int32)
+        counts = np.bincount(assignments, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(centroids, list_offsets, list_rows, index_version)
+
+    def candidates(self, query, n_probe):
+        n_probe = min(max(1, n_probe), self.n_lists)
+        centroid_scores = self.centroids @ query
+        if n_probe < self.n_lists:
+            lists = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        else:
+            lists = np.arange(self.n_lists)
+        return np.concatenate(
+            [self.list_rows[self.list_offsets[l] : self.list_offsets[l + 1]] for l in lists]
+        )
+
+    def search(self, matrix, query, top_n, n_probe):
+        """Return (row_indices, scores) of the best top_n rows among the probed lists."""
+        rows = self.candidates(query, n_probe)
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = matrix[rows] @ query
+        k = min(top_n, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return rows[best].astype(np.int64), scores[best]
+
+    def save(self, index_dir):
+        path = os.path.join(index_dir, IVF_FILE)
+        tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_rows=self.list_rows,
+            index_version=np.array(self.index_version or ""),
+        )
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, index_dir, expected_version=None):
+        """Load ivf.npz, or return None if it is missing or was built for another index version."""
+        path = os.path.join(index_dir, IVF_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            version = str(data["index_version"]) or None
+            if expected_version is not None and version != expected_version:
+                return None
+            return cls(data["centroids"], data["list_offsets"], data["list_rows"], version)
+
+
+def load_or_build(index_dir, matrix, index_version, n_lists=None, save=True):
+    # save=False (read-only workers) builds a missing index in memory only.
+    ivf = IVFIndex.load(index_dir, expected_version=index_version)
+    if ivf is None:
+        start = time.perf_counter()
+        ivf = IVFIndex.build(matrix, n_lists=n_lists, index_version=index_version)
+        log.info(f"Built IVF index ({ivf.n_lists} lists) in {time.perf_counter() - start:.1f}s")
+        if not save:
+            log.warning(f"{index_dir} has no IVF index for this build; kept in memory, not saved.")
+            return ivf
+        try:
+            ivf.save(index_dir)
+        except OSError as e:
+            log.warning(f"Could not save IVF index to {index_dir}: {e}")
+    return ivf
+
+
+def evaluate(matrix, ivf, n_probes, top_n=10, n_queries=200, seed=0):
+    # Queries are perturbed copies of stored rows, so no embedding calls are needed.
+    from vector_store import VectorStore
+
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(matrix), min(n_queries, len(matrix)), replace=False)
+    noise = rng.standard_normal((len(picks), matrix.shape[1])).astype(np.float32) * 0.02
+    queries = embedding_index.normalize_rows(matrix[picks] + noise)
+    exact_store = VectorStore(matrix, [None] * len(matrix), normalized=True)
+
+    start = time.perf_counter()
+    exact = [set(exact_store.search_indices(q, top_n)[0].tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"exact           recall@{top_n}=1.000  {exact_ms:7.3f} ms/query")
+    for n_probe in n_probes:
+        start = time.perf_counter()
+        found = [set(ivf.search(matrix, q, top_n, n_probe)[0].tolist()) for q in queries]
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact)])
+        print(f"ivf nprobe={n_probe:<4d} recall@{top_n}={recall:.3f}  {ms:7.3f} ms/query")
+
+
+def main():
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger("tds_ta").setLevel(logging.INFO)  # build progress from the library code
+    parser = argparse.ArgumentParser(description="Build or evaluate the IVF ANN index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("--dest", default="embedding_index")
+    build.add_argument("--n-lists", type=int, default=None)
+    ev = sub.add_parser("eval")
+    ev.add_argument("--dest", default="embedding_index")
+    ev.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ev.add_argument("--top-n", type=int, default=10)
+    ev.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    matrix, _, header = embedding_index.load_index(args.dest)
+    version = embedding_index.index_version(header)
+    if args.command == "build":
+        ivf = IVFIndex.build(matrix, n_lists=args.n_lists, index_version=version)
+        print(f"Saved {ivf.n_lists}-list IVF index to {ivf.save(args.dest)}")
+    else:
+        ivf = load_or_build(args.dest, matrix, version)
+        evaluate(matrix, ivf, args.nprobe, args.top_n, args.queries)
+
+
+if __name__ == "__main__":
+    main()
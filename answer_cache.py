@@ -0,0 +1,119 @@
+import re
+
+import numpy as np
+
+# Words with a digit in them (GA4, Q8, 2024, 3.12): near-identical questions that differ in
+# one of these embed almost the same but need different answers.
+IDENTIFIER_RE = re.compile(r"\w*\d[\w.]*")
+
+
+def question_identifiers(question):
+    return frozenset(token.rstrip(".") for token in IDENTIFIER_RE.findall(str(question).casefold()))
+
+
+class SemanticAnswerCache:
+    """Answers keyed by question embedding; a near-duplicate question reuses the stored answer.
+
+    A stored answer is only reused for a question with the same identifiers (words
+    containing digits), however close the embeddings are. Entries are only valid for
+    the index version they were built from. Looking up with a different version
+    (i.e. after a rebuild) drops everything.
+    """
+
+    def __init__(self, max_entries=0, threshold=0.95):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.index_version = None
+        self._matrix = None  # [max_entries, dim] unit vectors, allocated on first store
+        self._answers = [None] * max_entries
+        self._identifiers = [None] * max_entries
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._size = 0
+        self._clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _normalize(self, embedding):
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, index_version):
+        if index_version != self.index_version:
+            if self._size:
+                self.invalidations += 1
+            self.clear()
+            self.index_version = index_version
+
+    def clear(self):
+        self._answers = [None] * self.max_entries
+        self._identifiers = [None] * self.max_entries
+        self._last_used[:] = 0
+        self._size = 0
+
+    def lookup(self, question, embedding, index_version):
+        """Return (answer, similarity) for the closest cached question above threshold, else (None, best)."""
+        if not self.enabled:
+            return None, 0.0
+        self._check_version(index_version)
+        if not self._size:
+            self.misses += 1
+            return None, 0.0
+        query = self._normalize(embedding)
+        if query.shape[0] != self._matrix.shape[1]:
+            self.misses += 1
+            return None, 0.0
+        scores = self._matrix[: self._size] @ query
+        identifiers = question_identifiers(question)
+        eligible = scores.copy()
+        for slot in np.flatnonzero(scores >= self.threshold):
+            if self._identifiers[slot] != identifiers:
+                eligible[slot] = -np.inf  # same wording, different assignment / question / year
+        best = int(np.argmax(eligible))
+        if eligible[best] >= self.threshold:
+            self._clock += 1
+            self._last_used[best] = self._clock
+            self.hits += 1
+            return self._answers[best], float(scores[best])
+        self.misses += 1
+        return None, float(scores.max())
+
+    def store(self, question, embedding, index_version, answer):
+        if not self.enabled:
+            return
+        self._check_version(index_version)
+        vector = self._normalize(embedding)
+        if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+            self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            self.clear()
+        if self._size < self.max_entries:
+            slot = self._size
+            self._size += 1
+        else:
+            slot = int(np.argmin(self._last_used))  # least recently used
+            self.evictions += 1
+        self._clock += 1
+        self._matrix[slot] = vector
+        self._answers[slot] = answer
+        self._identifiers[slot] = question_identifiers(question)
+        self._last_used[slot] = self._clock
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": self._size,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "index_version": self.index_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
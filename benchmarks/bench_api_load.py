@@ -0,0 +1,180 @@
+# Load-test main.app end to end against the local fake AI Pipe server.
+#
+#   python benchmarks/bench_api_load.py --latency-ms 80 --concurrency 1,8,32 --requests 200
+#   python benchmarks/bench_api_load.py --endpoint /api/stream --token-ms 5
+#   python benchmarks/bench_api_load.py --questions project-tds-virtual-ta-promptfoo.yaml --json-out load.json
+#
+# The app runs under uvicorn in its own process, builds its index from the scraped
+# data with fake embeddings, and answers with fake chat completions from a second
+# process, so no AI Pipe credits are spent and the numbers are not dominated by
+# network noise. Query and answer caches are disabled unless --caches is given.
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from harness import (
+    REPO_DIR,
+    app_env,
+    check_dotenv,
+    free_port,
+    load_questions,
+    percentile,
+    prepare_workdir,
+    spawn_app,
+    spawn_fake_aipipe,
+    write_json,
+)
+
+
+def parse_server_timing(header):
+    stages = {}
+    for part in (header or "").split(","):
+        name, _, rest = part.strip().partition(";dur=")
+        if name and rest:
+            stages[name] = float(rest)
+    return stages
+
+
+async def one_request(client, endpoint, question):
+    start = time.perf_counter()
+    first_byte = None
+    if endpoint == "/api/stream":
+        async with client.stream("POST", endpoint, json={"question": question}) as response:
+            async for _ in response.aiter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+            stages = {}
+    else:
+        response = await client.post(endpoint, json={"question": question})
+        stages = parse_server_timing(response.headers.get("server-timing"))
+    return response.status_code, time.perf_counter() - start, first_byte, stages
+
+
+async def run_level(base_url, endpoint, questions, concurrency, n_requests):
+    latencies, first_bytes, errors = [], [], 0
+    stage_totals = {}
+    next_index = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+
+        async def worker():
+            nonlocal next_index, errors
+            while next_index < n_requests:
+                question = questions[next_index % len(questions)]
+                next_index += 1
+                try:
+                    status, elapsed, first_byte, stages = await one_request(client, endpoint, question)
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                if status != 200:
+                    errors += 1
+                    continue
+                latencies.append(elapsed)
+                if first_byte is not None:
+                    first_bytes.append(first_byte)
+                for name, ms in stages.items():
+                    stage_totals[name] = stage_totals.get(name, 0.0) + ms
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    latencies.sort()
+    first_bytes.sort()
+    result = {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": errors,
+        "rps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "stage_mean_ms": {name: total / max(1, len(latencies)) for name, total in stage_totals.items()},
+    }
+    if first_bytes:
+        result["ttfb_p50_ms"] = percentile(first_bytes, 50) * 1000
+    return result
+
+
+def print_row(result):
+    ttfb = f"  ttfb p50 {result['ttfb_p50_ms']:7.1f}" if "ttfb_p50_ms" in result else ""
+    print(
+        f"c={result['concurrency']:<4d} {result['requests']:5d} req  {result['errors']:3d} err  "
+        f"{result['rps']:8.1f} req/s  p50 {result['p50_ms']:7.1f}  p95 {result['p95_ms']:7.1f}  "
+        f"p99 {result['p99_ms']:7.1f} ms{ttfb}"
+    )
+    if result["stage_mean_ms"]:
+        stages = "  ".join(f"{name} {ms:.1f}" for name, ms in result["stage_mean_ms"].items())
+        print(f"       mean stage ms: {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the /api/ pipeline.")
+    parser.add_argument("--endpoint", default="/api/", choices=["/api/", "/api/stream"])
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per level")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--questions", help="promptfoo .yaml, .txt, .json or .jsonl question corpus")
+    parser.add_argument("--data-dir", help="directory with course_content and discourse_posts (default: repo)")
+    parser.add_argument("--limit-items", type=int, default=0, help="records kept per data file; 0 = all")
+    parser.add_argument("--workdir", help="reuse this directory (and its built index) between runs")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake embedding/chat latency")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="fake delay between streamed chunks")
+    parser.add_argument("--caches", action="store_true", help="keep the embedding and answer caches on")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--json-out")
+    args = parser.parse_args()
+
+    check_dotenv()
+    questions = load_questions(args.questions)
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    workdir = args.workdir or tempfile.mkdtemp(prefix="tds-load-")
+    if not os.path.exists(os.path.join(workdir, "course_content.jsonl")):
+        prepare_workdir(workdir, args.data_dir or REPO_DIR, args.limit_items)
+    json_out = os.path.abspath(args.json_out) if args.json_out else None
+
+    fake_process, fake_url = spawn_fake_aipipe(free_port(), args.dim, args.latency_ms, args.token_ms)
+    port = free_port()
+    try:
+        app_process, startup_seconds = spawn_app(
+            port, workdir, app_env(fake_url, caches=args.caches), args.workers
+        )
+    except BaseException:
+        fake_process.terminate()
+        raise
+    base_url = f"http://127.0.0.1:{port}"
+    print(f"App ready in {startup_seconds:.2f}s (workdir {workdir}); {len(questions)} questions, "
+          f"fake latency {args.latency_ms:g} ms, endpoint {args.endpoint}, {args.workers} worker(s)")
+
+    results = {
+        "endpoint": args.endpoint,
+        "workers": args.workers,
+        "startup_s": startup_seconds,
+        "latency_ms": args.latency_ms,
+        "levels": [],
+    }
+    try:
+        if args.warmup:
+            asyncio.run(run_level(base_url, args.endpoint, questions, 1, args.warmup))
+        for level in levels:
+            result = asyncio.run(run_level(base_url, args.endpoint, questions, level, args.requests))
+            print_row(result)
+            results["levels"].append(result)
+        results["upstream"] = httpx.get(fake_url.rsplit("/v1", 1)[0] + "/stats").json()
+    finally:
+        app_process.terminate()
+        app_process.wait(timeout=30)
+        fake_process.terminate()
+    if json_out:
+        write_json(json_out, results)
+
+
+if __name__ == "__main__":
+    main()
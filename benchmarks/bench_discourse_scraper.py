@@ -0,0 +1,216 @@
+# Compare the original sequential Discourse scraper with the concurrent,
+# rate-limited one, against a local fake Discourse server. Both must write
+# byte-identical output.
+#
+#   python benchmarks/bench_discourse_scraper.py --topics 60 --latency-ms 50 --legacy-delay 0.1
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scrapers"))
+from fake_discourse import make_server  # noqa: E402
+from new_discourse import (  # noqa: E402
+    BASE_DISCOURSE_URL,
+    CATEGORY_TOPICS_PATH_TEMPLATE,
+    END_DATE,
+    MAX_TOPIC_LIST_PAGES,
+    START_DATE,
+    TOPIC_POSTS_PATH_TEMPLATE,
+    get_plain_text_bs,
+    parse_discourse_date,
+    scrape_discourse_api,
+)
+
+
+def legacy_scrape_discourse_api(base_url, output_filename, request_delay):
+    # Copy of the original sequential scrape_discourse_api, kept as the baseline.
+    # Only the base URL, delay and output path are parameters; output is discarded.
+    all_posts_data = []
+    relevant_topic_summaries = []
+    
+    session = requests.Session()
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36 OPR/119.0.0.0',
+        'Accept': 'application/json, text/plain, */*',
+        'X-Requested-With': 'XMLHttpRequest',
+    }
+    session.headers.update(headers)
+
+    print("Fetching topic summaries from Discourse category (paginated, sorted)...")
+    for page_num_topics in range(MAX_TOPIC_LIST_PAGES + 1): # 0 to MAX_TOPIC_LIST_PAGES inclusive
+        category_url = f"{base_url}{CATEGORY_TOPICS_PATH_TEMPLATE}{page_num_topics}"
+        print(f"Fetching topic list page: {category_url}")
+        try:
+            response = session.get(category_url)
+            response.raise_for_status()
+            category_page_data = response.json()
+        except Exception as e:
+            print(f"Error fetching topic list page {page_num_topics}: {e}")
+            break 
+
+        topics_on_page = category_page_data.get('topic_list', {}).get('topics', [])
+        if not topics_on_page:
+            print(f"No more topics found on topic list page {page_num_topics}.")
+            break
+        
+        for topic_summary in topics_on_page:
+            created_at_str = topic_summary.get('created_at')
+            last_posted_at_str = topic_summary.get('last_posted_at')
+            
+            topic_created_dt = parse_discourse_date(created_at_str) if created_at_str else None
+            topic_last_posted_dt = parse_discourse_date(last_posted_at_str) if last_posted_at_str else None
+
+            if topic_created_dt and topic_last_posted_dt:
+                if topic_created_dt <= END_DATE and topic_last_posted_dt >= START_DATE:
+                    relevant_topic_summaries.append(topic_summary)
+            elif topic_created_dt and topic_created_dt <= END_DATE and topic_created_dt >= START_DATE: # If last_posted_at is missing, check created_at
+                 relevant_topic_summaries.append(topic_summary)
+
+
+        print(f"Collected {len(topics_on_page)} topics from list page {page_num_topics}. Total relevant topics so far: {len(relevant_topic_summaries)}")
+        # Optional: Check if created_at of last topic on page is older than START_DATE to break early
+        # if topics_on_page and parse_discourse_date(topics_on_page[-1].get('created_at')) < START_DATE:
+        #     print("Topics on current page are older than START_DATE, stopping topic list fetching.")
+        #     break
+        time.sleep(request_delay)
+
+    print(f"\nFinished collecting topic summaries. Total relevant topics to process: {len(relevant_topic_summaries)}")
+    print("Now fetching all posts for relevant topics and filtering by date...")
+
+    unique_post_urls_added = set() # To avoid duplicate posts if a topic is somehow processed twice
+
+    for i, topic_summary in enumerate(relevant_topic_summaries):
+        topic_id = topic_summary.get('id')
+        topic_title = topic_summary.get('title')
+        topic_slug = topic_summary.get('slug')
+        
+        if not topic_id or not topic_slug: continue
+
+        print(f"\nProcessing Topic {i+1}/{len(relevant_topic_summaries)}: '{topic_title}' (ID: {topic_id})")
+        
+        page_num_posts = 0
+        while True: # Loop for paginating posts within this topic
+            topic_posts_url = base_url + TOPIC_POSTS_PATH_TEMPLATE.format(topic_id=topic_id, page_num_posts=page_num_posts)
+            print(f"  Fetching posts page: {topic_posts_url}")
+            try:
+                time.sleep(request_delay)
+                topic_response = session.get(topic_posts_url)
+                if topic_response.status_code == 404:
+                    print(f"  Reached end of posts (404) for topic {topic_id} at page {page_num_posts}.")
+                    break 
+                topic_response.raise_for_status()
+                topic_page_data = topic_response.json()
+            except Exception as e:
+                print(f"  Error fetching posts for topic ID {topic_id}, page {page_num_posts}: {e}")
+                break 
+
+            posts_on_page = topic_page_data.get('post_stream', {}).get('posts', [])
+            if not posts_on_page and page_num_posts > 0 : # If not the first page and no posts, assume end
+                 print(f"  No more posts found for topic {topic_id} at page {page_num_posts}.")
+                 break
+            if not posts_on_page and page_num_posts == 0 and 'errors' in topic_page_data: # Handle cases where first page itself is an error
+                 print(f"  Error on first page of posts for topic {topic_id}: {topic_page_data.get('errors')}")
+                 break
+
+
+            for post in posts_on_page:
+                post_created_at_str = post.get('created_at')
+                if not post_created_at_str: continue
+                
+                post_date = parse_discourse_date(post_created_at_str)
+                if not post_date: continue
+
+                if START_DATE <= post_date <= END_DATE:
+                    post_number = post.get('post_number')
+                    post_permalink = f"{BASE_DISCOURSE_URL}/t/{topic_slug}/{topic_id}/{post_number}"
+                    
+                    if post_permalink not in unique_post_urls_added:
+                        post_content_html = post.get('cooked', '')
+                        post_content_text = get_plain_text_bs(post_content_html)
+                        username = post.get('username')
+                        
+                        all_posts_data.append({
+                            "url": post_permalink, "topic_title": topic_title, "topic_id": topic_id,
+                            "post_number": post_number, "author": username, "date_utc": post_date.isoformat(),
+                            "content": post_content_text
+                        })
+                        unique_post_urls_added.add(post_permalink)
+            
+            if not posts_on_page and page_num_posts == 0 : # If first page had no posts (e.g. topic deleted or empty)
+                print(f"  No posts found on the very first page for topic {topic_id}. Likely empty or issue.")
+                break
+
+            page_num_posts += 1
+            # Safety break if a topic somehow has an absurd number of pages (e.g., > 50 for typical topics)
+            if page_num_posts > 50 : # Adjust as needed, 50 pages * ~20 posts/page = ~1000 posts
+                print(f"  Reached safety limit of 50 pages for posts in topic {topic_id}. Moving to next topic.")
+                break
+    
+    print(f"\nFound {len(all_posts_data)} posts in the specified date range from Discourse after robust scraping.")
+    with open(output_filename, "w", encoding='utf-8') as f:
+        json.dump(all_posts_data, f, indent=2, ensure_ascii=False)
+    print(f"Discourse posts saved to: {output_filename}")
+    return output_filename
+
+
+def run_timed(server, fn, *args):
+    requests_before = server.RequestHandlerClass.stats["requests"]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn(*args)
+    elapsed = time.perf_counter() - start
+    return elapsed, server.RequestHandlerClass.stats["requests"] - requests_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Discourse scraper against a fake server.")
+    parser.add_argument("--topics", type=int, default=60)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of 429s for the new scraper")
+    parser.add_argument("--legacy-delay", type=float, default=0.75, help="REQUEST_DELAY of the original")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=20.0)
+    args = parser.parse_args()
+
+    server = make_server("127.0.0.1", 0, args.topics, args.latency_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.json")
+        new_path = os.path.join(tmp, "new.json")
+        legacy_s, legacy_requests = run_timed(
+            server, legacy_scrape_discourse_api, base_url, legacy_path, args.legacy_delay
+        )
+        # 429s are injected only for the new scraper; the original gives up on them.
+        server.RequestHandlerClass.config.rate_limit_rate = args.rate_limit_rate
+        new_s, new_requests = run_timed(
+            server, scrape_discourse_api, base_url, new_path, args.workers, args.rps
+        )
+        with open(legacy_path, "rb") as f:
+            legacy_bytes = f.read()
+        with open(new_path, "rb") as f:
+            new_bytes = f.read()
+    server.shutdown()
+
+    assert legacy_bytes == new_bytes, "concurrent scraper output differs from the original"
+    print(f"{args.topics} topics, {len(json.loads(new_bytes))} posts in range, identical output")
+    print(f"sequential (delay {args.legacy_delay:g}s)       {legacy_s:7.2f}s  {legacy_requests} requests")
+    print(
+        f"concurrent ({args.workers} workers, {args.rps:g} rps)  {new_s:7.2f}s  {new_requests} requests, "
+        f"{server.RequestHandlerClass.stats['rate_limited']} answered 429"
+    )
+    print(f"speedup: {legacy_s / new_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# Compare the original course-page extractor (find_all(True) plus a parents scan
+# per element) and Discourse text cleaner with the single-pass walkers in
+# scrapers/html_extract.py, over saved HTML fixtures.
+#
+#   python scrapers/new_course.py --mode selenium --save-html benchmarks/fixtures/course
+#   python benchmarks/bench_html_extract.py --fixtures benchmarks/fixtures/course
+#
+# Without --fixtures, Docsify-like pages and Discourse "cooked" posts are
+# synthesized from course_content.json and discourse_posts.json.
+import argparse
+import glob
+import html
+import json
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scrapers"))
+import html_extract  # noqa: E402
+from new_course import iter_page_sections  # noqa: E402
+from new_discourse import get_plain_text_bs  # noqa: E402
+
+
+def legacy_get_content_from_page(page_source, page_url):
+    # Copy of the extraction half of the original get_content_from_page_selenium.
+    page_course_data = []
+    soup = page_source if isinstance(page_source, BeautifulSoup) else BeautifulSoup(page_source, 'html.parser')
+    content_article = soup.find('article', class_='markdown-section', id='main')
+    if not content_article:
+        content_section = soup.find('section', class_='content')
+        if content_section: content_article = content_section
+        else:
+            content_article = soup.find('main')
+            if not content_article:
+                if soup.body: content_article = soup.body 
+                else:
+                    print(f"Selenium: Could not find specific content container for URL: {page_url}")
+                    return []
+    
+    page_h1_tag = content_article.find('h1')
+    current_section_title = page_h1_tag.get_text(separator=' ', strip=True) if page_h1_tag else \
+                           (soup.title.string if soup.title else page_url.split('#')[-1] or "Page Content")
+    current_section_content_parts = []
+
+    for element in content_article.find_all(True, recursive=True): 
+        if not hasattr(element, 'name'): continue
+        if any(parent.get('class') and 'sidebar' in parent.get('class') for parent in element.parents): continue
+        
+        if element.name in ['h1', 'h2', 'h3', 'h4', 'h5']:
+            new_title = element.get_text(separator=' ', strip=True)
+            if current_section_content_parts or (element.name != 'h1' and new_title != current_section_title):
+                section_text = "\n".join(part for part in current_section_content_parts if part).strip()
+                if section_text: page_course_data.append({"title": current_section_title, "content": section_text, "source_url": page_url})
+                current_section_content_parts = []
+                current_section_title = new_title
+            elif element.name == 'h1' and not current_section_content_parts : current_section_title = new_title
+        elif element.name == 'p':
+            text = element.get_text(separator=' ', strip=True)
+            if text and not (element.find('img') and not element.text.strip()): current_section_content_parts.append(text)
+        elif element.name == 'ul' or element.name == 'ol':
+            list_items = [li.get_text(separator=' ', strip=True) for li in element.find_all('li', recursive=False) if li.get_text(strip=True)]
+            if list_items: current_section_content_parts.append("\n".join(f"- {item}" for item in list_items))
+        elif element.name == 'pre' or (element.name == 'div' and element.has_attr('class') and 'sourceCode' in element['class']):
+            code_text = element.get_text()
+            if code_text.strip(): current_section_content_parts.append(f"```\n{code_text.strip()}\n```")
+        elif element.name == 'details':
+            summary_tag = element.find('summary', recursive=False)
+            if summary_tag: current_section_content_parts.append(f"Details Summary: {summary_tag.get_text(separator=' ', strip=True)}")
+            for detail_child in element.find_all(['p', 'ul', 'ol', 'div', 'pre'], recursive=False):
+                if summary_tag and detail_child == summary_tag: continue
+                if detail_child.name == 'p': current_section_content_parts.append(detail_child.get_text(separator=' ', strip=True))
+                elif detail_child.name in ['ul', 'ol']:
+                    d_list_items = [li.get_text(separator=' ', strip=True) for li in detail_child.find_all('li', recursive=False) if li.get_text(strip=True)]
+                    if d_list_items: current_section_content_parts.append("\n".join(f"  - {item}" for item in d_list_items))
+                elif detail_child.name == 'pre' or (detail_child.name == 'div' and detail_child.has_attr('class') and 'sourceCode' in detail_child['class']):
+                    d_code_text = detail_child.get_text()
+                    if d_code_text.strip(): current_section_content_parts.append(f"```\n{d_code_text.strip()}\n```")
+        elif element.name == 'blockquote':
+            quote_text = element.get_text(separator='\n', strip=True)
+            if quote_text:
+                formatted_quote = "> " + quote_text.replace('\n', '\n> ') # no backslashes inside f-strings before Python 3.12
+                current_section_content_parts.append(formatted_quote)
+        elif element.name == 'table':
+            table_representation = ["Table:"]
+            for row_idx, row in enumerate(element.find_all('tr')):
+                cols = [col.get_text(strip=True) for col in row.find_all(['th', 'td'])]
+                if row_idx == 0 and element.find('thead'): 
+                    table_representation.append(" | ".join(cols))
+                    table_representation.append(" | ".join(["---"] * len(cols)))
+                elif cols: table_representation.append(" | ".join(cols))
+            if len(table_representation) > 1 : current_section_content_parts.append("\n".join(table_representation))
+
+    if current_section_content_parts:
+        section_text = "\n".join(part for part in current_section_content_parts if part).strip()
+        if section_text: page_course_data.append({"title": current_section_title, "content": section_text, "source_url": page_url})
+    if not page_course_data and content_article:
+        all_text = content_article.get_text(separator='\n', strip=True)
+        sidebar_check = content_article.find('aside', class_='sidebar')
+        if sidebar_check: all_text = all_text.replace(sidebar_check.get_text(separator='\n', strip=True), '').strip()
+        if all_text:
+            title_tag_text = soup.title.string if soup.title else None
+            final_title = title_tag_text or page_url.split('#')[-1] or "Page Content"
+            page_course_data.append({"title": final_title, "content": all_text, "source_url": page_url})
+    return page_course_data
+
+
+def legacy_get_plain_text_bs(html_content):
+    # Copy of the original new_discourse.get_plain_text_bs.
+    if not html_content: return ""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for blockquote in soup.find_all('blockquote'): blockquote.decompose()
+    return soup.get_text(separator='\n', strip=True)
+
+
+def synth_course_pages(course_items):
+    pages = {}
+    for item in course_items:
+        pages.setdefault(item["source_url"], []).append(item)
+    sidebar = "".join(
+        f'<li><a href="#/{url.split("#/")[-1]}">{html.escape(url)}</a><ul><li><a href="#">sub</a></li></ul></li>'
+        for url in pages
+    )
+    fixtures = []
+    for url, items in pages.items():
+        body = []
+        for i, item in enumerate(items):
+            body.append(f"<h{1 if i == 0 else 2}>{html.escape(item['title'])}</h{1 if i == 0 else 2}>")
+            paragraphs = [p for p in item["content"].split("\n") if p.strip()]
+            for j, para in enumerate(paragraphs):
+                text = html.escape(para)
+                if j % 7 == 3:
+                    body.append(f"<ul><li><p>{text}</p><ul><li>{text}</li></ul></li><li>{text}</li></ul>")
+                elif j % 7 == 5:
+                    body.append(f"<details><summary>More</summary><p>{text}</p><ul><li>{text}</li></ul></details>")
+                elif j % 11 == 6:
+                    body.append(f"<blockquote><p>{text}</p></blockquote>")
+                elif j % 13 == 8:
+                    body.append(f'<div class="sourceCode"><pre><code>{text}</code></pre></div>')
+                else:
+                    body.append(f"<div><p>{text}</p></div>")
+        fixtures.append((url, (
+            "<html><head><title>Tools in Data Science</title></head><body>"
+            f'<aside class="sidebar"><div class="sidebar-nav"><ul>{sidebar}</ul></div></aside>'
+            f'<section class="content"><article class="markdown-section" id="main">{"".join(body)}</article></section>'
+            "</body></html>"
+        )))
+    return fixtures
+
+
+def synth_cooked_posts(posts):
+    cooked = []
+    for i, post in enumerate(posts):
+        paragraphs = "".join(f"<p>{html.escape(line)}</p>" for line in post.get("content", "").split("\n") if line)
+        quote = f'<aside class="quote"><blockquote><p>{html.escape(posts[i - 1].get("content", "")[:200])}</p></blockquote></aside>'
+        cooked.append(quote + paragraphs + "<pre><code>x = 1\n</code></pre><!-- c --><script>t()</script>")
+    return cooked
+
+
+def load_fixtures(fixtures_dir):
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.html"))):
+        with open(path, "r", encoding="utf-8") as f:
+            fixtures.append((f"https://tds.s-anand.net/#/{os.path.basename(path)[:-5]}", f.read()))
+    return fixtures
+
+
+def time_per_item(fn, items, repeat):
+    start = time.perf_counter()
+    results = None
+    for _ in range(repeat):
+        results = [fn(*item) if isinstance(item, tuple) else fn(item) for item in items]
+    return (time.perf_counter() - start) * 1000 / (len(items) * repeat), results
+
+
+def summarize(sections):
+    parts = [part for page in sections for s in page for part in s["content"].split("\n")]
+    return sum(len(page) for page in sections), sum(len(s["content"]) for page in sections for s in page), len(parts) - len(set(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HTML section extractor.")
+    parser.add_argument("--fixtures", default=None, help="Directory of saved course pages (*.html)")
+    parser.add_argument("--course", default=os.path.join(ROOT, "course_content.json"))
+    parser.add_argument("--discourse", default=os.path.join(ROOT, "discourse_posts.json"))
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        pages = load_fixtures(args.fixtures)
+    else:
+        with open(args.course, "r", encoding="utf-8") as f:
+            pages = synth_course_pages(json.load(f))
+    with open(args.discourse, "r", encoding="utf-8") as f:
+        cooked = synth_cooked_posts(json.load(f)[: args.posts])
+    items = [(source, url) for url, source in pages]
+    print(f"{len(pages)} course pages ({sum(len(s) for _, s in pages) / 2**20:.1f} MiB), {len(cooked)} cooked posts")
+
+    legacy_ms, legacy = time_per_item(legacy_get_content_from_page, items, args.repeat)
+    print(f"{'course: legacy find_all + parents':<36} {legacy_ms:8.2f} ms/page  sections={summarize(legacy)[0]} chars={summarize(legacy)[1]} duplicate lines={summarize(legacy)[2]}")
+    for parser_name in ("html.parser", "lxml") if html_extract.HTML_PARSER == "lxml" else ("html.parser",):
+        html_extract.HTML_PARSER = parser_name
+        ms, fast = time_per_item(lambda source, url: list(iter_page_sections(source, url)), items, args.repeat)
+        s = summarize(fast)
+        print(f"{'course: single pass (' + parser_name + ')':<36} {ms:8.2f} ms/page  sections={s[0]} chars={s[1]} duplicate lines={s[2]}  ({legacy_ms / ms:.1f}x)")
+
+    # Tree walk only, on pages parsed once up front.
+    soups = [(BeautifulSoup(source, "html.parser"), url) for source, url in items]
+    legacy_ms, _ = time_per_item(legacy_get_content_from_page, soups, args.repeat)
+    ms, _ = time_per_item(
+        lambda soup, url: list(html_extract.iter_sections(soup.find("article") or soup.body, url, "")), soups, args.repeat
+    )
+    print(f"{'walk only: legacy':<36} {legacy_ms:8.2f} ms/page")
+    print(f"{'walk only: single pass':<36} {ms:8.2f} ms/page  ({legacy_ms / ms:.1f}x)")
+
+    legacy_ms, legacy_text = time_per_item(legacy_get_plain_text_bs, cooked, args.repeat)
+    print(f"{'discourse: decompose + get_text':<36} {legacy_ms:8.3f} ms/post")
+    for parser_name in ("html.parser", "lxml") if "lxml" in sys.modules else ("html.parser",):
+        html_extract.HTML_PARSER = parser_name
+        ms, fast_text = time_per_item(get_plain_text_bs, cooked, args.repeat)
+        mismatches = sum(a != b for a, b in zip(legacy_text, fast_text))
+        print(f"{'discourse: single pass (' + parser_name + ')':<36} {ms:8.3f} ms/post  mismatches={mismatches}  ({legacy_ms / ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
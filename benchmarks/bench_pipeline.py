@@ -0,0 +1,157 @@
+# Microbenchmarks for the parts of the answer pipeline that run locally:
+# app startup, retrieval, thread expansion, prompt building and link derivation.
+#
+#   python benchmarks/bench_pipeline.py --json-out pipeline.json
+#   python benchmarks/bench_pipeline.py --baseline pipeline.json --max-regression 0.25
+#
+# Query embeddings come from the fake AI Pipe embedding function, so no network
+# calls are timed. With --baseline, any p50 more than --max-regression slower than
+# the baseline run fails the process with exit status 1.
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from harness import (
+    REPO_DIR,
+    app_env,
+    check_dotenv,
+    clean_index,
+    free_port,
+    load_questions,
+    percentile,
+    prepare_workdir,
+    spawn_app,
+    start_fake_aipipe,
+    write_json,
+)
+from fake_aipipe import fake_embedding
+
+
+def time_op(fn, inputs, repeat):
+    for item in inputs:  # warm caches (tokenizer, BLAS threads) before timing
+        fn(item)
+    timings = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "p50_us": percentile(timings, 50) * 1e6,
+        "p95_us": percentile(timings, 95) * 1e6,
+        "calls": len(timings),
+    }
+
+
+def bench_startup(workdir, env, runs, cold):
+    # Fresh uvicorn processes: imports, data loading and index open (or build, with --cold).
+    timings = []
+    for _ in range(runs):
+        if cold:
+            clean_index(workdir)
+        process, seconds = spawn_app(free_port(), workdir, env)
+        process.terminate()
+        process.wait(timeout=30)
+        timings.append(seconds)
+    return {"runs": runs, "cold": cold, "median_s": statistics.median(timings), "min_s": min(timings)}
+
+
+def bench_in_process(questions, dim, repeat):
+    import main
+
+    if not asyncio.run(main.refresh_index("benchmark")):
+        sys.exit("Could not load or build the embedding index.")
+    model = os.environ["EMBEDDING_MODEL_NAME"]
+    queries = [(q, fake_embedding(q, model, dim)) for q in questions]
+    contexts = {q: main.retrieve_contexts(q, emb) for q, emb in queries}
+    candidates = max(3, main.HYBRID_CANDIDATES)
+    ops = {
+        "vector_search": lambda qe: main.vector_store.search_indices(qe[1], candidates),
+        "bm25_search": lambda qe: main.lexical_index.search(qe[0], candidates),
+        "hybrid_search": lambda qe: main.hybrid_search(qe[0], qe[1], top_n=3),
+        "retrieve_contexts": lambda qe: main.retrieve_contexts(qe[0], qe[1]),
+        "build_llm_messages": lambda qe: main.build_llm_messages(qe[0], contexts[qe[0]]),
+        "derive_links": lambda qe: main.derive_links(contexts[qe[0]]),
+    }
+    results = {name: time_op(fn, queries, repeat) for name, fn in ops.items()}
+    results["_index"] = {"rows": len(main.vector_store), "dim": main.vector_store.dim}
+    return results
+
+
+def compare(results, baseline, max_regression):
+    regressions = []
+    for name, entry in results["ops"].items():
+        before = baseline.get("ops", {}).get(name, {}).get("p50_us")
+        if before and entry["p50_us"] > before * (1 + max_regression):
+            regressions.append(f"{name}: p50 {before:.1f} -> {entry['p50_us']:.1f} us")
+    before = baseline.get("startup", {}).get("median_s")
+    now = results.get("startup", {}).get("median_s")
+    if before and now and now > before * (1 + max_regression):
+        regressions.append(f"startup: median {before:.2f} -> {now:.2f} s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of startup, retrieval and prompt building.")
+    parser.add_argument("--questions", help="promptfoo .yaml, .txt, .json or .jsonl question corpus")
+    parser.add_argument("--data-dir", help="directory with course_content and discourse_posts (default: repo)")
+    parser.add_argument("--limit-items", type=int, default=0, help="records kept per data file; 0 = all")
+    parser.add_argument("--workdir", help="reuse this directory (and its built index) between runs")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the question corpus")
+    parser.add_argument("--startup-runs", type=int, default=3, help="0 skips the startup benchmark")
+    parser.add_argument("--cold", action="store_true", help="rebuild the index before each startup run")
+    parser.add_argument("--json-out")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    check_dotenv()
+    questions = load_questions(args.questions)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="tds-pipeline-")
+    if not os.path.exists(os.path.join(workdir, "course_content.jsonl")):
+        prepare_workdir(workdir, args.data_dir or REPO_DIR, args.limit_items)
+    json_out = os.path.abspath(args.json_out) if args.json_out else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    fake_server, fake_url = start_fake_aipipe(args.dim)  # only used if the index must be built
+    env = app_env(fake_url)
+    os.environ.update(env)
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+
+    results = {"questions": len(questions)}
+    ops = bench_in_process(questions, args.dim, args.repeat)
+    results["index"] = ops.pop("_index")
+    results["ops"] = ops
+    print(f"{results['index']['rows']} rows x {results['index']['dim']} dims, {len(questions)} questions")
+    for name, entry in ops.items():
+        print(f"{name:<20} p50 {entry['p50_us']:9.1f} us  p95 {entry['p95_us']:9.1f} us")
+    if args.startup_runs:
+        results["startup"] = bench_startup(workdir, env, args.startup_runs, args.cold)
+        print(
+            f"{'startup' + (' (cold)' if args.cold else ''):<20} median {results['startup']['median_s']:.2f} s  "
+            f"min {results['startup']['min_s']:.2f} s over {args.startup_runs} runs"
+        )
+    fake_server.shutdown()
+
+    if json_out:
+        write_json(json_out, results)
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.max_regression:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Compare the legacy per-row cosine loop with the matrix-backed VectorStore.
+#
+#   python benchmarks/bench_vector_store.py --rows 20000 --dim 1536
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from vector_store import VectorStore  # noqa: E402
+
+
+def legacy_find_top_n_similar(query_embedding, content_embeddings_list, top_n=5):
+    # Verbatim copy of the original main.find_top_n_similar, kept as the baseline.
+    if not query_embedding or not content_embeddings_list:
+        return []
+    query_embedding_reshaped = np.array(query_embedding).reshape(1, -1)
+    similarities = []
+    for content_emb_vector, data_object in content_embeddings_list:
+        content_emb_vector_reshaped = np.array(content_emb_vector).reshape(1, -1)
+        sim = cosine_similarity(query_embedding_reshaped, content_emb_vector_reshaped)[
+            0
+        ][0]
+        similarities.append((sim, data_object))
+    similarities.sort(key=lambda x: x[0], reverse=True)
+    return [data_object for sim, data_object in similarities[:top_n]]
+
+
+def time_calls(fn, queries, repeat):
+    timings = []
+    for _ in range(repeat):
+        for q in queries:
+            start = time.perf_counter()
+            fn(q)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.rows, args.dim)).astype(np.float32)
+    pairs = [
+        (vec.tolist(), {"url": f"https://example.com/{i}", "content": str(i)})
+        for i, vec in enumerate(vectors)
+    ]
+    queries = [rng.standard_normal(args.dim).tolist() for _ in range(args.queries)]
+
+    start = time.perf_counter()
+    store = VectorStore.from_pairs(pairs)
+    build_s = time.perf_counter() - start
+
+    # Both implementations must agree on the result set.
+    for q in queries:
+        legacy = [d["url"] for d in legacy_find_top_n_similar(q, pairs, args.top_n)]
+        fast = [d["url"] for d in store.search(q, args.top_n)]
+        assert legacy == fast, (legacy, fast)
+
+    legacy_p50, legacy_p95 = time_calls(
+        lambda q: legacy_find_top_n_similar(q, pairs, args.top_n), queries, 1
+    )
+    store_p50, store_p95 = time_calls(
+        lambda q: store.search(q, args.top_n), queries, args.repeat
+    )
+
+    print(f"rows={args.rows} dim={args.dim} top_n={args.top_n}")
+    print(f"VectorStore build: {build_s * 1000:.1f} ms")
+    print(f"legacy loop   p50={legacy_p50 * 1000:9.2f} ms  p95={legacy_p95 * 1000:9.2f} ms")
+    print(f"VectorStore   p50={store_p50 * 1000:9.2f} ms  p95={store_p95 * 1000:9.2f} ms")
+    print(f"speedup (p50): {legacy_p50 / store_p50:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
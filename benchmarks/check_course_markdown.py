@@ -0,0 +1,63 @@
+# Check that the Markdown fast path of scrapers/new_course.py splits a page into the
+# same sections as the browser-rendered HTML path, over pairs of fixtures:
+# <name>.md (the Docsify source) and <name>.html (the page as Docsify renders it).
+#
+#   python benchmarks/check_course_markdown.py
+#   python benchmarks/check_course_markdown.py --fixtures benchmarks/fixtures/markdown
+#
+# Titles must match exactly. Content is compared with whitespace collapsed, since
+# get_text(separator=' ') on the HTML side puts spaces around inline <code> and <a>.
+import argparse
+import glob
+import os
+import re
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scrapers"))
+from new_course import iter_page_sections, markdown_sections  # noqa: E402
+
+SPACE_BEFORE_PUNCTUATION_RE = re.compile(r"\s+([.,;:!?)])")
+
+
+def comparable(section):
+    content = section["content"].replace("\n> ", " ")
+    return section["title"], SPACE_BEFORE_PUNCTUATION_RE.sub(r"\1", " ".join(content.split()))
+
+
+def check_page(markdown_path, html_path):
+    page_url = f"https://tds.s-anand.net/#/{os.path.basename(markdown_path)[:-3]}"
+    with open(markdown_path, "r", encoding="utf-8") as f:
+        from_markdown = [comparable(s) for s in markdown_sections(f.read(), page_url)]
+    with open(html_path, "r", encoding="utf-8") as f:
+        from_html = [comparable(s) for s in iter_page_sections(f.read(), page_url)]
+    problems = []
+    if [title for title, _ in from_markdown] != [title for title, _ in from_html]:
+        problems.append(f"titles: markdown {[t for t, _ in from_markdown]} vs html {[t for t, _ in from_html]}")
+    for (title, md_text), (_, html_text) in zip(from_markdown, from_html):
+        if md_text != html_text:
+            problems.append(f"content of {title!r}:\n  markdown: {md_text!r}\n  html:     {html_text!r}")
+    return len(from_markdown), problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Markdown and HTML course page sectioning.")
+    parser.add_argument("--fixtures", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "markdown"))
+    args = parser.parse_args()
+
+    failed = 0
+    for markdown_path in sorted(glob.glob(os.path.join(args.fixtures, "*.md"))):
+        html_path = markdown_path[:-3] + ".html"
+        if not os.path.exists(html_path):
+            print(f"SKIP {markdown_path}: no {os.path.basename(html_path)}")
+            continue
+        n_sections, problems = check_page(markdown_path, html_path)
+        print(f"{'FAIL' if problems else 'ok  '} {os.path.basename(markdown_path)}: {n_sections} sections")
+        for problem in problems:
+            print(f"  {problem}")
+        failed += bool(problems)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
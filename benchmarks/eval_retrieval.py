@@ -0,0 +1,216 @@
+# Offline retrieval quality vs. cost, per retrieval configuration.
+#
+#   python benchmarks/eval_retrieval.py --labels labels.jsonl --embed        # first run: embed questions once
+#   python benchmarks/eval_retrieval.py --labels labels.jsonl \
+#       --config "top5:RETRIEVAL_TOP_N=5" --config "no-bm25:HYBRID_LEXICAL_WEIGHT=0"
+#
+# labels is .json/.jsonl records like {"question": "...", "expected_urls": ["https://..."]},
+# or a promptfoo YAML config whose tests have vars.question and URLs in their asserts.
+# A configuration is a name plus main.py settings (the same names as in .env); each one is
+# run through main.retrieve_contexts against the existing embedding index. Question
+# embeddings are read from a SQLite cache, so after the first --embed run nothing leaves
+# the machine. For every configuration it reports recall@k and MRR of the expected URLs
+# among the returned links, the contexts and prompt tokens sent to the LLM, and latency.
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, REPO_DIR)
+import records_io  # noqa: E402
+
+URL_RE = re.compile(r"https?://[^\s\"'\]\),]+")
+EMBED_BATCH_SIZE = 256
+
+# Compared when no --config is given; "baseline" is whatever .env / the defaults say.
+DEFAULT_CONFIGS = [
+    "baseline:",
+    "vector-only:HYBRID_LEXICAL_WEIGHT=0",
+    "no-threads:THREAD_EXPAND_MAX=0",
+    "top5:RETRIEVAL_TOP_N=5",
+    "top5-no-threads:RETRIEVAL_TOP_N=5,THREAD_EXPAND_MAX=0",
+    "ivf-nprobe4:RETRIEVAL_INDEX=ivf,IVF_NPROBE=4",
+    "int8:VECTOR_QUANTIZATION=int8",
+]
+
+
+def load_labels(path):
+    """[(question, [expected url, ...]), ...] from JSON/JSON Lines records or a promptfoo YAML config."""
+    labels = []
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            sys.exit("Reading a promptfoo config needs PyYAML: pip install pyyaml")
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        for test in config.get("tests") or []:
+            question = (test.get("vars") or {}).get("question")
+            urls = URL_RE.findall(json.dumps(test.get("assert") or [], ensure_ascii=False))
+            labels.append((question, urls))
+    else:
+        for record in records_io.iter_records(path):
+            urls = record.get("expected_urls") or record.get("urls") or record.get("url") or []
+            labels.append((record.get("question"), [urls] if isinstance(urls, str) else list(urls)))
+    labels = [(q, urls) for q, urls in labels if q and urls]
+    if not labels:
+        sys.exit(f"No labelled questions (question + expected URLs) in {path}")
+    return labels
+
+
+def parse_config(spec, main):
+    """'name:VAR=value,VAR=value' -> (name, {VAR: value}), typed like main's own setting."""
+    name, _, assignments = spec.partition(":")
+    settings = {}
+    for assignment in filter(None, (a.strip() for a in assignments.split(","))):
+        key, _, value = assignment.partition("=")
+        if not hasattr(main, key):
+            sys.exit(f"Unknown setting {key!r} in config {name!r}")
+        current = getattr(main, key)
+        settings[key] = type(current)(value) if isinstance(current, (int, float)) else value
+    return name or "unnamed", settings
+
+
+def url_matches(url, expected):
+    # A topic URL also matches the links to its individual posts.
+    url, expected = url.rstrip("/"), expected.rstrip("/")
+    return url == expected or url.startswith(expected + "/")
+
+
+def score_links(links, expected_urls, ks):
+    found_at = []
+    for expected in expected_urls:
+        rank = next((i for i, url in enumerate(links) if url_matches(url, expected)), None)
+        found_at.append(rank)
+    recall = {k: sum(1 for r in found_at if r is not None and r < k) / len(expected_urls) for k in ks}
+    first = min((r for r in found_at if r is not None), default=None)
+    return recall, 0.0 if first is None else 1.0 / (first + 1)
+
+
+def question_embeddings(questions, model_name, cache_path, embed):
+    from embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(max_entries=len(questions) + 1, ttl_seconds=float("inf"), disk_path=cache_path)
+    unique = list(dict.fromkeys(questions))
+    cached = asyncio.run(cache.get_many(unique, model_name))
+    missing = [q for q, embedding in zip(unique, cached) if embedding is None]
+    if missing and not embed:
+        sys.exit(f"{len(missing)} questions have no cached embedding in {cache_path}; rerun with --embed once.")
+    if missing:
+        import build_index
+
+        client = build_index.make_client()
+        for start in range(0, len(missing), EMBED_BATCH_SIZE):
+            batch = missing[start : start + EMBED_BATCH_SIZE]
+            response = client.embeddings.create(model=model_name, input=batch)
+            entries = [(batch[item.index], item.embedding) for item in response.data]
+            asyncio.run(cache.put_many(entries, model_name))
+        print(f"Embedded {len(missing)} questions with {model_name}; cached in {cache_path}")
+    embeddings = asyncio.run(cache.get_many(questions, model_name))
+    cache.close()
+    return embeddings
+
+
+def evaluate(main, labels, embeddings, ks):
+    from chunking import count_tokens
+
+    recalls = {k: 0.0 for k in ks}
+    reciprocal_ranks = contexts = prompt_tokens = 0.0
+    timings = []
+    for (question, expected_urls), embedding in zip(labels, embeddings):
+        start = time.perf_counter()
+        final_contexts = main.retrieve_contexts(question, embedding)
+        timings.append(time.perf_counter() - start)
+        links = [link.url for link in main.derive_links(final_contexts)]
+        recall, reciprocal_rank = score_links(links, expected_urls, ks)
+        for k in ks:
+            recalls[k] += recall[k]
+        reciprocal_ranks += reciprocal_rank
+        contexts += len(final_contexts)
+        if final_contexts:
+            messages = main.build_llm_messages(question, final_contexts)
+            prompt_tokens += sum(count_tokens(m["content"]) for m in messages)
+    n = len(labels)
+    timings.sort()
+    return {
+        **{f"recall@{k}": recalls[k] / n for k in ks},
+        "mrr": reciprocal_ranks / n,
+        "avg_contexts": contexts / n,
+        "avg_prompt_tokens": prompt_tokens / n,
+        "p50_ms": timings[n // 2] * 1000,
+        "p95_ms": timings[min(n - 1, int(n * 0.95))] * 1000,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Offline retrieval quality vs. cost evaluation.")
+    parser.add_argument("--labels", required=True, help=".json/.jsonl labels or a promptfoo .yaml")
+    parser.add_argument("--config", action="append", help="name:VAR=value,... (repeatable)")
+    parser.add_argument("--index-dir", help="embedding index (default: EMBEDDING_INDEX_DIR)")
+    parser.add_argument("--embedding-cache", default="query_embeddings.sqlite3", help="SQLite question embedding cache")
+    parser.add_argument("--embed", action="store_true", help="embed questions missing from the cache")
+    parser.add_argument("--k", default="1,3,5", help="comma-separated cut-offs for recall@k")
+    parser.add_argument("--json-out")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AIPIPE_TOKEN", "offline")  # the clients are created but never called
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import main
+    import embedding_index
+    import lexical_index
+    import thread_index
+
+    index_dir = args.index_dir or main.EMBEDDING_INDEX_DIR
+    if not os.path.exists(index_dir) and os.path.exists(main.EMBEDDINGS_FILE):
+        embedding_index.convert_json(main.EMBEDDINGS_FILE, index_dir, os.getenv("EMBEDDING_MODEL_NAME"))
+    model_name = embedding_index.read_header(index_dir).get("model") or os.getenv("EMBEDDING_MODEL_NAME")
+    os.environ["EMBEDDING_MODEL_NAME"] = model_name  # questions must be embedded like the index
+
+    labels = load_labels(args.labels)
+    ks = [int(k) for k in args.k.split(",")]
+    configs = [parse_config(spec, main) for spec in (args.config or DEFAULT_CONFIGS)]
+    embeddings = question_embeddings([q for q, _ in labels], model_name, args.embedding_cache, args.embed)
+    defaults = {key: getattr(main, key) for _, settings in configs for key in settings}
+
+    print(f"{len(labels)} labelled questions, index {index_dir} ({model_name})")
+    header = f"{'config':<22}" + "".join(f"{f'R@{k}':>7}" for k in ks)
+    print(header + f"{'MRR':>7}{'ctx':>6}{'tokens':>8}{'p50 ms':>8}{'p95 ms':>8}")
+    results = {}
+    lexical = None
+    for name, settings in configs:
+        for key, value in {**defaults, **settings}.items():
+            setattr(main, key, value)
+        # Reopened per config so RETRIEVAL_INDEX / VECTOR_QUANTIZATION settings take effect.
+        with embedding_index.index_lock(index_dir):
+            store = main.load_vector_store(index_dir)
+        if store is None:
+            sys.exit(f"Could not open the embedding index at {index_dir}")
+        main.vector_store = store
+        lexical = lexical or lexical_index.load_or_build(store.index_dir, store.records, store.version)
+        main.lexical_index = lexical
+        main.thread_index = thread_index.load_or_build(
+            store.index_dir,
+            store.records,
+            store.version,
+            before=main.THREAD_EXPAND_BEFORE,
+            after=main.THREAD_EXPAND_AFTER,
+        )
+        result = evaluate(main, labels, embeddings, ks)
+        results[name] = {"settings": settings, **result}
+        print(
+            f"{name:<22}" + "".join(f"{result[f'recall@{k}']:7.3f}" for k in ks)
+            + f"{result['mrr']:7.3f}{result['avg_contexts']:6.1f}{result['avg_prompt_tokens']:8.0f}"
+            + f"{result['p50_ms']:8.2f}{result['p95_ms']:8.2f}"
+        )
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json_out}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,173 @@
+# Local stand-in for the AI Pipe OpenAI-compatible API.
+#
+#   python benchmarks/fake_aipipe.py --port 8001 --latency-ms 50 --token-ms 5
+#   export OPENAI_API_BASE_FOR_EMBEDDINGS=http://127.0.0.1:8001/v1
+#   export OPENROUTER_API_BASE_FOR_CHAT=http://127.0.0.1:8001/v1
+#
+# Embeddings are deterministic per (model, text), so repeated runs and resumed
+# builds see the same vectors.
+import argparse
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_embedding(text, model, dim):
+    seed = int.from_bytes(hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeAIPipeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    config = argparse.Namespace(dim=1536, latency_ms=0.0, fail_rate=0.0, token_ms=0.0)
+    stats = {"requests": 0, "embedding_inputs": 0}
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.stats)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        payload = self._read_json()
+        self.stats["requests"] += 1
+        if self.config.latency_ms:
+            time.sleep(self.config.latency_ms / 1000)
+        if self.config.fail_rate and random.random() < self.config.fail_rate:
+            self._send_json(503, {"error": {"message": "injected failure"}})
+            return
+        if self.path.endswith("/embeddings"):
+            self._embeddings(payload)
+        elif self.path.endswith("/chat/completions"):
+            self._chat(payload)
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def _embeddings(self, payload):
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        model = payload.get("model", "fake-embedding")
+        self.stats["embedding_inputs"] += len(inputs)
+        data = [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(text, model, self.config.dim)}
+            for i, text in enumerate(inputs)
+        ]
+        tokens = sum(len(text.split()) for text in inputs)
+        self._send_json(
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": model,
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+        )
+
+    def _chat(self, payload):
+        self.stats["chat_requests"] = self.stats.get("chat_requests", 0) + 1
+        question = payload.get("messages", [{}])[-1].get("content", "")
+        answer = f"Fake answer based on {len(question)} characters of prompt."
+        if payload.get("stream"):
+            self._chat_stream(payload, answer)
+            return
+        self._send_json(
+            200,
+            {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake-chat"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": answer},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            },
+        )
+
+    def _chat_stream(self, payload, answer):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            if i and self.config.token_ms:
+                time.sleep(self.config.token_ms / 1000)  # time between streamed chunks
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "fake-chat"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": word if i == 0 else " " + word},
+                        "finish_reason": "stop" if i == len(words) - 1 else None,
+                    }
+                ],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeAIPipeServer(ThreadingHTTPServer):
+    request_queue_size = 256  # the default of 5 drops connections under a load test
+    daemon_threads = True
+
+
+def make_server(host="127.0.0.1", port=8001, dim=1536, latency_ms=0.0, fail_rate=0.0, token_ms=0.0):
+    FakeAIPipeHandler.config = argparse.Namespace(
+        dim=dim, latency_ms=latency_ms, fail_rate=fail_rate, token_ms=token_ms
+    )
+    return FakeAIPipeServer((host, port), FakeAIPipeHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake AI Pipe server for local runs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--token-ms", type=float, default=0.0, help="delay between streamed chunks")
+    args = parser.parse_args()
+    server = make_server(
+        args.host, args.port, args.dim, args.latency_ms, args.fail_rate, args.token_ms
+    )
+    print(f"Fake AI Pipe listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
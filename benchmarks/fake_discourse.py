@@ -0,0 +1,145 @@
+# Local stand-in for the Discourse JSON endpoints used by scrapers/new_discourse.py.
+#
+#   python benchmarks/fake_discourse.py --port 8002 --latency-ms 100 --rate-limit-rate 0.05
+#   python scrapers/new_discourse.py --base-url http://127.0.0.1:8002 --output /tmp/posts.json
+#
+# Topics and posts are generated deterministically from --seed, so two scraper
+# runs against the same server must produce identical output.
+import argparse
+import json
+import random
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TOPICS_PER_LIST_PAGE = 30
+POSTS_PER_TOPIC_PAGE = 20
+FIRST_DATE = datetime(2024, 11, 1, tzinfo=timezone.utc)
+
+
+def make_forum(n_topics, seed=0):
+    rng = random.Random(seed)
+    topics = {}
+    for topic_id in range(1000, 1000 + n_topics):
+        created = FIRST_DATE + timedelta(minutes=rng.randrange(0, 60 * 24 * 210))
+        posts = []
+        posted = created
+        for post_number in range(1, rng.randint(1, 70) + 1):
+            posts.append(
+                {
+                    "id": topic_id * 1000 + post_number,
+                    "post_number": post_number,
+                    "username": f"user{rng.randrange(50)}",
+                    "created_at": posted.isoformat().replace("+00:00", "Z"),
+                    "cooked": (
+                        f"<p>Reply {post_number} in topic {topic_id}: "
+                        f"<code>GA{rng.randrange(10)}</code> question.</p>"
+                        f"<blockquote>quoted earlier text</blockquote><p>{'more text ' * rng.randint(1, 30)}</p>"
+                    ),
+                }
+            )
+            posted += timedelta(minutes=rng.randrange(1, 60 * 24 * 3))
+        topics[topic_id] = {
+            "id": topic_id,
+            "title": f"Topic {topic_id}",
+            "slug": f"topic-{topic_id}",
+            "created_at": created.isoformat().replace("+00:00", "Z"),
+            "last_posted_at": posts[-1]["created_at"],
+            "posts_count": len(posts),
+            "highest_post_number": len(posts),
+            "posts": posts,
+        }
+    return topics
+
+
+class FakeDiscourseHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = argparse.Namespace(latency_ms=0.0, rate_limit_rate=0.0, retry_after=0.2)
+    topics = {}
+    stats = {"requests": 0, "rate_limited": 0}
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        page = int(parse_qs(url.query).get("page", ["0"])[0])
+        if url.path == "/stats":
+            self._send_json(200, self.stats)
+            return
+        self.stats["requests"] += 1
+        if self.config.latency_ms:
+            time.sleep(self.config.latency_ms / 1000)
+        if self.config.rate_limit_rate and random.random() < self.config.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            self._send_json(
+                429,
+                {"errors": ["You've performed this action too many times."]},
+                {"Retry-After": f"{self.config.retry_after:g}"},
+            )
+            return
+        topic_match = re.fullmatch(r"/t/(\d+)\.json", url.path)
+        if url.path.startswith("/c/") and url.path.endswith(".json"):
+            self._topic_list(page)
+        elif topic_match and int(topic_match.group(1)) in self.topics:
+            self._topic_posts(self.topics[int(topic_match.group(1))], page)
+        else:
+            self._send_json(404, {"errors": ["The requested URL or resource could not be found."]})
+
+    def _topic_list(self, page):
+        # order=created&ascending=false
+        ordered = sorted(self.topics.values(), key=lambda t: t["created_at"], reverse=True)
+        chunk = ordered[page * TOPICS_PER_LIST_PAGE : (page + 1) * TOPICS_PER_LIST_PAGE]
+        summaries = [{k: v for k, v in t.items() if k != "posts"} for t in chunk]
+        self._send_json(200, {"topic_list": {"topics": summaries}})
+
+    def _topic_posts(self, topic, page):
+        # Like Discourse, page 0 and page 1 both return the first page of posts.
+        first = max(page - 1, 0) * POSTS_PER_TOPIC_PAGE
+        posts = topic["posts"][first : first + POSTS_PER_TOPIC_PAGE]
+        if page > 1 and not posts:
+            self._send_json(404, {"errors": ["The requested URL or resource could not be found."]})
+            return
+        self._send_json(200, {"id": topic["id"], "title": topic["title"], "post_stream": {"posts": posts}})
+
+
+def make_server(host="127.0.0.1", port=8002, n_topics=120, latency_ms=0.0, rate_limit_rate=0.0, retry_after=0.2, seed=0):
+    FakeDiscourseHandler.config = argparse.Namespace(
+        latency_ms=latency_ms, rate_limit_rate=rate_limit_rate, retry_after=retry_after
+    )
+    FakeDiscourseHandler.topics = make_forum(n_topics, seed)
+    FakeDiscourseHandler.stats = {"requests": 0, "rate_limited": 0}
+    return ThreadingHTTPServer((host, port), FakeDiscourseHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Discourse server for scraper runs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--topics", type=int, default=120)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.2, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    server = make_server(
+        args.host, args.port, args.topics, args.latency_ms, args.rate_limit_rate, args.retry_after, args.seed
+    )
+    print(f"Fake Discourse listening on http://{args.host}:{args.port} with {args.topics} topics")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
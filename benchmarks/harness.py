@@ -0,0 +1,176 @@
+# Shared setup for the API benchmarks: a throwaway working directory with the
+# scraped data, a fake AI Pipe server, and the question corpus to replay.
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, REPO_DIR)
+import embedding_index  # noqa: E402
+import records_io  # noqa: E402
+from fake_aipipe import make_server  # noqa: E402
+
+# Used when no --questions file is given.
+DEFAULT_QUESTIONS = [
+    "How do I submit GA4?",
+    "What is the deadline for Project 1?",
+    "Should I use gpt-4o-mini or gpt-3.5-turbo-0125 for the assignment?",
+    "How do I run a Docker container with Podman?",
+    "What does the haversine formula compute?",
+    "How are bonus marks awarded in TDS?",
+    "Can I use uv instead of pip to install dependencies?",
+    "How do I deploy a FastAPI app on Vercel?",
+    "What is the passing score for the end term exam?",
+    "How do I count tokens for a prompt?",
+    "Where can I find the recording of the live session?",
+    "How do I scrape a page that needs JavaScript?",
+]
+
+
+def load_questions(path=None):
+    """Questions from a promptfoo YAML config, a .txt file (one per line), or .json/.jsonl records."""
+    if not path:
+        return list(DEFAULT_QUESTIONS)
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            sys.exit("Reading a promptfoo config needs PyYAML: pip install pyyaml")
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        tests = config.get("tests") or []
+        questions = [(test.get("vars") or {}).get("question") for test in tests]
+    elif path.endswith(".txt"):
+        with open(path, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f]
+    else:
+        questions = [
+            record if isinstance(record, str) else record.get("question") or (record.get("vars") or {}).get("question")
+            for record in records_io.iter_records(path)
+        ]
+    questions = [q for q in questions if q]
+    if not questions:
+        sys.exit(f"No questions found in {path}")
+    return questions
+
+
+def prepare_workdir(workdir, data_dir=REPO_DIR, limit=0):
+    """Copy course_content and discourse_posts into workdir as .jsonl, keeping at most limit records each."""
+    os.makedirs(workdir, exist_ok=True)
+    for stem in ("course_content", "discourse_posts"):
+        source = records_io.find_records_file(os.path.join(data_dir, stem))
+        dest = os.path.join(workdir, f"{stem}.jsonl")
+        records = records_io.iter_records(source)
+        records_io.write_records(dest, itertools.islice(records, limit) if limit else records)
+    return workdir
+
+
+def clean_index(workdir):
+    embedding_index.remove_index(os.path.join(workdir, "embedding_index"))
+
+
+def start_fake_aipipe(dim=1536, latency_ms=0.0, token_ms=0.0):
+    server = make_server("127.0.0.1", 0, dim=dim, latency_ms=latency_ms, token_ms=token_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def spawn_fake_aipipe(port, dim=1536, latency_ms=0.0, token_ms=0.0):
+    # A separate process, so the fake server does not compete with the app for the GIL.
+    process = subprocess.Popen(
+        [
+            sys.executable, os.path.join(REPO_DIR, "benchmarks", "fake_aipipe.py"),
+            "--port", str(port), "--dim", str(dim),
+            "--latency-ms", str(latency_ms), "--token-ms", str(token_ms),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    wait_for_http(f"http://127.0.0.1:{port}/stats", process)
+    return process, f"http://127.0.0.1:{port}/v1"
+
+
+def spawn_app(port, workdir, env, workers=1):
+    """Run main:app under uvicorn in workdir; returns (process, seconds until it answered)."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+            "--log-level", "warning", "--no-access-log",
+        ],
+        cwd=workdir,
+        env={**os.environ, **env, "PYTHONPATH": REPO_DIR},
+    )
+    # The server listens at once; /readyz turns 200 when the index is loaded or built.
+    wait_for_http(f"http://127.0.0.1:{port}/readyz", process, timeout=600)
+    return process, time.perf_counter() - start
+
+
+def wait_for_http(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"{' '.join(process.args[:3])} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    process.terminate()
+    sys.exit(f"Timed out waiting for {url}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def app_env(fake_url, caches=False, extra=None):
+    """Environment for main.py pointed at the fake server; caches off unless asked for."""
+    env = {
+        "AIPIPE_TOKEN": "benchmark",
+        "OPENAI_API_BASE_FOR_EMBEDDINGS": fake_url,
+        "OPENROUTER_API_BASE_FOR_CHAT": fake_url,
+        "EMBEDDING_MODEL_NAME": "fake-embedding",
+        "CHAT_MODEL_NAME": "fake-chat",
+        "EMBEDDING_INDEX_DIR": "embedding_index",
+        "INDEX_WATCH_INTERVAL": "0",
+        "LOG_LEVEL": "WARNING",
+        # main.py calls load_dotenv(override=True); a real .env must not redirect us to AI Pipe.
+        "PYTHON_DOTENV_DISABLED": "1",
+    }
+    if not caches:
+        # Repeated questions would otherwise skip the embedding and LLM calls entirely.
+        env.update({"EMBEDDING_CACHE_SIZE": "0", "ANSWER_CACHE_SIZE": "0", "EMBEDDING_CACHE_PATH": ""})
+    env.update(extra or {})
+    return env
+
+
+def check_dotenv():
+    # PYTHON_DOTENV_DISABLED is only honoured by newer python-dotenv releases.
+    import dotenv.main
+
+    if os.path.exists(os.path.join(REPO_DIR, ".env")) and not hasattr(dotenv.main, "_load_dotenv_disabled"):
+        sys.exit("This python-dotenv would load .env over the benchmark settings; move .env aside first.")
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def write_json(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {path}")
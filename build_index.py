@@ -0,0 +1,461 @@
+# Standalone embedding index builder.
+#
+# Packs many texts into each embeddings.create call, runs a bounded number of
+# batches concurrently and appends every finished batch to a checkpoint file,
+# so an interrupted build resumes where it stopped:
+#
+#   python build_index.py --concurrency 4 --batch-size 128
+#
+# Every record is keyed by a hash of its text and the model name. A rebuild
+# reuses vectors from the existing index for unchanged keys, so after a
+# re-scrape only new or edited course sections and posts are embedded.
+#
+# Point OPENAI_API_BASE_FOR_EMBEDDINGS at benchmarks/fake_aipipe.py to try it
+# without spending AI Pipe credits.
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+import embedding_index
+import quantization
+import records_io
+from ann_index import IVFIndex
+from chunking import chunk_text
+from lexical_index import BM25Index
+from thread_index import ThreadIndex
+
+DEFAULT_BATCH_SIZE = 128
+DEFAULT_MAX_BATCH_CHARS = 120_000  # keeps a batch well under the per-request token cap
+DEFAULT_CONCURRENCY = 4
+MAX_ATTEMPTS = 4
+
+log = logging.getLogger("tds_ta.build_index")
+
+
+def collect_content_items(course_content_data, discourse_posts_data, chunk_tokens=0, chunk_overlap=0):
+    # Same records startup_event has always embedded: content only, with metadata kept alongside.
+    # With chunk_tokens set, long sections and posts become overlapping chunks that keep
+    # their parent's url; short ones are left exactly as before.
+    combined_content = []
+    for item in course_content_data:
+        text_content = str(item.get("content", ""))
+        if text_content:
+            combined_content.extend(
+                _chunked_items(
+                    text_content,
+                    {
+                        "source": "course",
+                        "title": str(item.get("title", "")),
+                        "content": text_content,
+                        "url": item.get("source_url"),
+                    },
+                    chunk_tokens,
+                    chunk_overlap,
+                )
+            )
+    for item in discourse_posts_data:
+        text_content = str(item.get("content", ""))
+        if text_content:
+            combined_content.extend(
+                _chunked_items(
+                    text_content,
+                    {
+                        "source": "discourse",
+                        "title": str(item.get("topic_title", "")),
+                        "content": text_content,
+                        "url": item.get("url"),
+                        "topic_id": item.get("topic_id", ""),
+                        "post_number": item.get("post_number", ""),
+                    },
+                    chunk_tokens,
+                    chunk_overlap,
+                )
+            )
+    return combined_content
+
+
+def _chunked_items(text_content, original_data, chunk_tokens, chunk_overlap):
+    chunks = chunk_text(text_content, chunk_tokens, chunk_overlap) if chunk_tokens else [text_content]
+    if len(chunks) == 1:
+        return [{"text_to_embed": text_content, "original_data": original_data}]
+    return [
+        {
+            "text_to_embed": chunk,
+            "original_data": {
+                **original_data,
+                "content": chunk,
+                "chunk": i,
+                "chunk_count": len(chunks),
+            },
+        }
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def content_key(text, model_name):
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+def metadata_digest(data):
+    # Title, url, topic and chunk position; the embedded text itself is covered by content_key.
+    metadata = {key: value for key, value in data.items() if key != "content"}
+    encoded = json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+def record_id(data):
+    # Identity of a record independent of its text, used to tell "changed" from "added".
+    chunk = f"#chunk{data['chunk']}" if "chunk" in data else ""
+    if data.get("source") == "discourse":
+        return f"{data.get('url')}{chunk}"
+    return f"{data.get('url')}#{data.get('title')}{chunk}"
+
+
+def load_previous_embeddings(index_dir, model_name, keep_sources=()):
+    """Return ({key: vector}, {record_id: {keys}}, [(key, record), ...]) from an existing index.
+
+    Rows whose source is in keep_sources are returned in the last list instead of
+    previous_ids, so the caller can carry them over unchanged.
+    """
+    if not os.path.exists(index_dir):
+        return {}, {}, []
+    try:
+        vectors, records, header = embedding_index.load_index(index_dir, mmap=False)
+    except embedding_index.IndexFormatError as e:
+        log.warning(f"Ignoring unreadable index at {index_dir}: {e}")
+        return {}, {}, []
+    if header.get("model") != model_name:
+        log.info(f"Existing index was built with '{header.get('model')}'; re-embedding everything.")
+        return {}, {}, []
+    keys = embedding_index.load_keys(index_dir) or [
+        content_key(str(record.get("content", "")), model_name) for record in records
+    ]
+    previous, previous_ids, kept = {}, {}, []
+    for key, vector, record in zip(keys, vectors, records):
+        previous[key] = vector
+        if record.get("source") in keep_sources:
+            kept.append((key, record))
+        else:
+            previous_ids.setdefault(record_id(record), set()).add(key)
+    return previous, previous_ids, kept
+
+
+def diff_summary(keyed_items, previous, previous_ids):
+    counts = {"added": 0, "changed": 0, "removed": 0, "reused": 0}
+    current_ids = set()
+    for key, item in keyed_items:
+        rid = record_id(item["original_data"])
+        current_ids.add(rid)
+        if key in previous:
+            counts["reused"] += 1
+        elif rid in previous_ids:
+            counts["changed"] += 1
+        else:
+            counts["added"] += 1
+    counts["removed"] = sum(
+        len(keys) for rid, keys in previous_ids.items() if rid not in current_ids
+    )
+    return counts
+
+
+def make_batches(items, batch_size, max_batch_chars):
+    batch, batch_chars = [], 0
+    for item in items:
+        text_len = len(item["text_to_embed"])
+        if batch and (len(batch) >= batch_size or batch_chars + text_len > max_batch_chars):
+            yield batch
+            batch, batch_chars = [], 0
+        batch.append(item)
+        batch_chars += text_len
+    if batch:
+        yield batch
+
+
+def load_checkpoint(checkpoint_path):
+    done = {}
+    if not os.path.exists(checkpoint_path):
+        return done
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # torn final line from a crash; everything before it is good
+            done[entry["key"]] = entry["embedding"]
+    return done
+
+
+def embed_batch(client, model_name, texts):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            response = client.embeddings.create(model=model_name, input=texts)
+            embeddings = [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+            tokens = response.usage.total_tokens if response.usage else 0
+            return embeddings, tokens
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            delay = 2 ** attempt
+            log.warning(f"Embedding batch of {len(texts)} failed ({e}); retrying in {delay}s...")
+            time.sleep(delay)
+
+
+def build_embeddings(
+    items,
+    client,
+    model_name,
+    checkpoint_path,
+    batch_size=DEFAULT_BATCH_SIZE,
+    max_batch_chars=DEFAULT_MAX_BATCH_CHARS,
+    concurrency=DEFAULT_CONCURRENCY,
+    previous=None,
+    progress=None,
+):
+    """Return (vectors, records, keys) for items, embedding only what previous and the checkpoint lack.
+
+    progress, if given, is called as progress(embedded, to_embed) before the first batch and after each one.
+    """
+    done = dict(previous or {})
+    done.update(load_checkpoint(checkpoint_path))
+    keyed = [(content_key(item["text_to_embed"], model_name), item) for item in items]
+    pending, seen = [], set()
+    for key, item in keyed:
+        if key not in done and key not in seen:
+            seen.add(key)
+            pending.append({**item, "key": key})
+    log.info(
+        f"{len(items)} items: {len(items) - len(pending)} already embedded, "
+        f"{len(pending)} to embed (batch_size={batch_size}, concurrency={concurrency})"
+    )
+
+    batches = list(make_batches(pending, batch_size, max_batch_chars))
+    start = time.perf_counter()
+    embedded, total_tokens, failed = 0, 0, 0
+    if progress:
+        progress(0, len(pending))
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint, ThreadPoolExecutor(
+        max_workers=max(1, concurrency)
+    ) as pool:
+        futures = {
+            pool.submit(
+                embed_batch, client, model_name, [i["text_to_embed"] for i in batch]
+            ): batch
+            for batch in batches
+        }
+        for n, future in enumerate(as_completed(futures), start=1):
+            batch = futures[future]
+            try:
+                embeddings, tokens = future.result()
+            except Exception as e:
+                failed += len(batch)
+                log.error(f"Giving up on a batch of {len(batch)} items: {e}")
+                continue
+            # Only this thread writes the checkpoint, one flushed line per item.
+            for item, embedding in zip(batch, embeddings):
+                done[item["key"]] = embedding
+                checkpoint.write(json.dumps({"key": item["key"], "embedding": embedding}))
+                checkpoint.write("\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+            embedded += len(batch)
+            total_tokens += tokens
+            elapsed = time.perf_counter() - start
+            log.info(
+                f"Batch {n}/{len(batches)}: {embedded}/{len(pending)} items, "
+                f"{embedded / elapsed:.1f} items/s, {total_tokens / elapsed:.0f} tokens/s"
+            )
+            if progress:
+                progress(embedded, len(pending))
+
+    elapsed = time.perf_counter() - start
+    if pending:
+        log.info(
+            f"Embedded {embedded} items ({total_tokens} tokens) in {elapsed:.1f}s"
+            + (f"; {failed} items failed" if failed else "")
+        )
+
+    vectors, records, keys = [], [], []
+    for key, item in keyed:
+        if key in done:
+            vectors.append(done[key])
+            records.append(item["original_data"])
+            keys.append(key)
+    return vectors, records, keys
+
+
+def build_index(
+    items,
+    client,
+    model_name,
+    index_dir,
+    batch_size=DEFAULT_BATCH_SIZE,
+    max_batch_chars=DEFAULT_MAX_BATCH_CHARS,
+    concurrency=DEFAULT_CONCURRENCY,
+    progress=None,
+    failed_sources=(),
+    retrieval_index="exact",
+    ivf_lists=0,
+    vector_quantization="none",
+    pca_dim=256,
+):
+    # Rows from a source that could not be read this time ("course", "discourse") are
+    # kept as they are; only sources that loaded can add, change or remove rows.
+    # retrieval_index .. pca_dim mirror main.py's settings of the same names, so the
+    # IVF index / compact codes the server will use are saved with the build.
+    checkpoint_path = f"{index_dir}.checkpoint.jsonl"
+    items = [item for item in items if item["original_data"]["source"] not in failed_sources]
+    previous, previous_ids, kept = load_previous_embeddings(index_dir, model_name, failed_sources)
+    if kept:
+        log.warning(f"Keeping {len(kept)} indexed rows from unreadable sources: {', '.join(sorted(failed_sources))}")
+    if previous:
+        keyed = [(content_key(item["text_to_embed"], model_name), item) for item in items]
+        counts = diff_summary(keyed, previous, previous_ids)
+        log.info(
+            "Index diff: {added} added, {changed} changed, {removed} removed, "
+            "{reused} reused".format(**counts)
+        )
+    vectors, records, keys = build_embeddings(
+        items,
+        client,
+        model_name,
+        checkpoint_path,
+        batch_size,
+        max_batch_chars,
+        concurrency,
+        previous,
+        progress,
+    )
+    complete = len(records) == len(items)
+    for key, record in kept:
+        vectors.append(previous[key])
+        records.append(record)
+        keys.append(key)
+    if not records:
+        return None
+    # Rows whose text is unchanged reuse their vector, but take the freshly scraped metadata.
+    digests = [metadata_digest(record) for record in records]
+
+    def save_search_indexes(build_dir, header):
+        # Saved before the build is published, so serving workers (read-only ones
+        # included) just memory-map them instead of each building them.
+        version = embedding_index.index_version(header)
+        BM25Index.from_records(records).save(build_dir, version)
+        ThreadIndex.from_records(records).save(build_dir, version)
+        if retrieval_index == "ivf" or vector_quantization != "none":
+            matrix, _, _ = embedding_index.load_index(build_dir, lazy_records=True)  # normalized
+            if retrieval_index == "ivf":
+                IVFIndex.build(matrix, n_lists=ivf_lists or None, index_version=version).save(build_dir)
+            if vector_quantization != "none":
+                codec = quantization.make_codec(vector_quantization, pca_dim).fit(matrix)
+                quantization.save_codec(build_dir, codec, version)
+
+    header = embedding_index.write_index(
+        index_dir, vectors, records, model_name, keys, digests, before_publish=save_search_indexes
+    )
+    if complete:
+        os.remove(checkpoint_path)  # keep it around while anything is still missing
+    return header
+
+
+def index_is_stale(items, index_dir, model_name, failed_sources=()):
+    # Cheap check (hashing only) for whether the scraped data no longer matches the index:
+    # a row's text (re-embedded) or its title/url (records rewritten, vectors reused) changed.
+    # Rows from sources in failed_sources are left out: an unreadable file is not a deletion.
+    try:
+        _, records, header = embedding_index.load_index(index_dir)
+    except (FileNotFoundError, embedding_index.IndexFormatError):
+        return True
+    keys = embedding_index.load_keys(index_dir) or [
+        content_key(str(record.get("content", "")), header.get("model")) for record in records
+    ]
+    digests = embedding_index.load_metadata_digests(index_dir) or [
+        metadata_digest(record) for record in records
+    ]
+    indexed = {
+        (key, digest)
+        for key, digest, record in zip(keys, digests, records)
+        if record.get("source") not in failed_sources
+    }
+    wanted = {
+        (content_key(item["text_to_embed"], model_name), metadata_digest(item["original_data"]))
+        for item in items
+        if item["original_data"]["source"] not in failed_sources
+    }
+    return wanted != indexed
+
+
+def make_client():
+    # Index builds run in worker threads, so they use the synchronous client.
+    return OpenAI(
+        api_key=os.getenv("AIPIPE_TOKEN"),
+        base_url=os.getenv("OPENAI_API_BASE_FOR_EMBEDDINGS"),
+    )
+
+
+def main():
+    load_dotenv(override=True)
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger("tds_ta").setLevel(logging.INFO)  # build progress from the library code
+    parser = argparse.ArgumentParser(description="Build the embedding index.")
+    # .jsonl files are preferred when both formats exist
+    parser.add_argument("--course", default=records_io.find_records_file("course_content"))
+    parser.add_argument("--discourse", default=records_io.find_records_file("discourse_posts"))
+    parser.add_argument("--dest", default=os.getenv("EMBEDDING_INDEX_DIR", "embedding_index"))
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL_NAME"))
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-batch-chars", type=int, default=DEFAULT_MAX_BATCH_CHARS)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    # 0 chunk tokens = embed whole sections/posts
+    parser.add_argument("--chunk-tokens", type=int, default=int(os.getenv("CHUNK_TOKENS", "0")))
+    parser.add_argument("--chunk-overlap", type=int, default=int(os.getenv("CHUNK_OVERLAP", "64")))
+    # Same settings as the server, so what it searches with is built here, not by each worker
+    parser.add_argument("--retrieval-index", choices=["exact", "ivf"], default=os.getenv("RETRIEVAL_INDEX", "exact"))
+    parser.add_argument("--ivf-lists", type=int, default=int(os.getenv("IVF_NLISTS", "0")))
+    parser.add_argument("--quantization", default=os.getenv("VECTOR_QUANTIZATION", "none"))
+    parser.add_argument("--pca-dim", type=int, default=int(os.getenv("QUANTIZATION_PCA_DIM", "256")))
+    args = parser.parse_args()
+
+    client = make_client()
+    failed_sources = set()
+    items = collect_content_items(
+        records_io.iter_source(args.course, "course", failed_sources),
+        records_io.iter_source(args.discourse, "discourse", failed_sources),
+        args.chunk_tokens,
+        args.chunk_overlap,
+    )
+    start = time.perf_counter()
+    # Serving workers started without INDEX_READ_ONLY wait on the same lock.
+    with embedding_index.index_lock(args.dest):
+        header = build_index(
+            items,
+            client,
+            args.model,
+            args.dest,
+            args.batch_size,
+            args.max_batch_chars,
+            args.concurrency,
+            failed_sources=failed_sources,
+            retrieval_index=args.retrieval_index,
+            ivf_lists=args.ivf_lists,
+            vector_quantization=args.quantization,
+            pca_dim=args.pca_dim,
+        )
+    if header:
+        print(
+            f"Wrote {header['rows']} x {header['dim']} index to {args.dest} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+    else:
+        print("Nothing was embedded; no index written.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Token counting, overlapping chunking and token-budgeted prompt packing.
+#
+# Uses tiktoken (required, see requirements.txt). Its encoding is downloaded on first
+# use; if that fails (e.g. no network), counts whitespace-delimited pieces instead,
+# which undercount real tokens, so every token budget becomes approximate.
+import logging
+import re
+from functools import lru_cache
+
+import tiktoken
+
+FALLBACK_PIECE_RE = re.compile(r"\s*\S+")
+DEFAULT_ENCODING = "cl100k_base"
+TRUNCATION_SUFFIX = "..."
+
+log = logging.getLogger("tds_ta.chunking")
+
+
+class _WhitespaceTokenizer:
+    def encode(self, text):
+        return FALLBACK_PIECE_RE.findall(text)
+
+    def decode(self, pieces):
+        return "".join(pieces)
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(encoding_name=DEFAULT_ENCODING):
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:  # e.g. no network to fetch the BPE file
+        log.warning(
+            f"Could not load tiktoken encoding '{encoding_name}': {e}. "
+            "Counting words instead, so token budgets are approximate."
+        )
+        return _WhitespaceTokenizer()
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text):
+    return len(get_tokenizer().encode(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """text cut to at most max_tokens tokens, the "..." marking the cut included."""
+    tokenizer = get_tokenizer()
+    tokens = tokenizer.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - len(tokenizer.encode(TRUNCATION_SUFFIX)))
+    while True:
+        truncated = tokenizer.decode(tokens[:keep]).rstrip() + TRUNCATION_SUFFIX
+        # Re-encoding at the cut can merge differently, so check rather than assume.
+        if keep == 0 or len(tokenizer.encode(truncated)) <= max_tokens:
+            return truncated
+        keep -= 1
+
+
+def chunk_text(text, max_tokens, overlap=0):
+    """Split text into windows of at most max_tokens, each sharing overlap tokens with the previous."""
+    tokenizer = get_tokenizer()
+    tokens = tokenizer.encode(text)
+    if max_tokens <= 0 or len(tokens) <= max_tokens:
+        return [text]
+    step = max(1, max_tokens - max(0, overlap))
+    chunks = []
+    for start in range(0, len(tokens), step):
+        chunks.append(tokenizer.decode(tokens[start : start + max_tokens]).strip())
+        if start + max_tokens >= len(tokens):
+            break
+    return [c for c in chunks if c]
+
+
+def pack_contexts(contexts, format_context, budget_tokens, per_context_max_tokens, min_tokens=48):
+    """Format contexts in rank order until budget_tokens is used up.
+
+    format_context(i, ctx, content) returns the text block for one context. The
+    last context that does not fit whole is truncated if at least min_tokens remain.
+    Returns (blocks, used_tokens).
+    """
+    blocks, used = [], 0
+    for ctx in contexts:
+        content = str(ctx.get("content", "No content available")).strip()
+        if per_context_max_tokens and count_tokens(content) > per_context_max_tokens:
+            content = truncate_to_tokens(content, per_context_max_tokens)
+        block = format_context(len(blocks), ctx, content)
+        block_tokens = count_tokens(block)
+        remaining = budget_tokens - used
+        if block_tokens > remaining:
+            overhead = block_tokens - count_tokens(content)
+            if remaining - overhead < min_tokens:
+                break
+            limit = remaining - overhead
+            while block_tokens > remaining and limit >= min_tokens:
+                block = format_context(len(blocks), ctx, truncate_to_tokens(content, limit))
+                block_tokens = count_tokens(block)
+                limit -= max(1, block_tokens - remaining)
+            if block_tokens > remaining:
+                break
+            blocks.append(block)
+            used += block_tokens
+            break
+        blocks.append(block)
+        used += block_tokens
+    return blocks, used
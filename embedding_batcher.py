@@ -0,0 +1,93 @@
+import asyncio
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent query embeddings into shared, batched upstream calls.
+
+    Texts that arrive within window_seconds of the first one (up to max_batch of them)
+    go out in a single embed_batch call. A text whose key is already in flight is not
+    sent again; its callers share the pending result.
+    """
+
+    def __init__(self, embed_batch, window_seconds=0.002, max_batch=64, key=None):
+        self.embed_batch = embed_batch  # async (texts) -> [embedding or None, ...] in the same order
+        self.window_seconds = window_seconds
+        self.max_batch = max(1, max_batch)
+        self.key = key or (lambda text: text)
+        self._in_flight = {}  # key -> future shared by everyone waiting on that text
+        self._pending = []  # (key, text) waiting for the window to close
+        self._timer = None
+        self._tasks = set()
+        self.calls = 0
+        self.inputs = 0
+        self.coalesced = 0
+
+    async def embed(self, text):
+        future = self._join(text, self._pending)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._pending and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_seconds, self._flush)
+        # Shielded: one caller going away must not cancel the call the others are waiting on.
+        return await asyncio.shield(future)
+
+    async def embed_many(self, texts, batch_size):
+        """Embed texts now in calls of up to batch_size, sharing any already in flight."""
+        new = []
+        futures = [self._join(text, new) for text in texts]
+        for start in range(0, len(new), batch_size):
+            self._dispatch(new[start : start + batch_size])
+        return await asyncio.shield(asyncio.gather(*futures))
+
+    def _join(self, text, queue):
+        key = self.key(text)
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return future
+        future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        queue.append((key, text))
+        return future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        self.calls += 1
+        self.inputs += len(batch)
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)  # the loop only keeps weak references to tasks
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            embeddings = await self.embed_batch([text for _, text in batch])
+        except asyncio.CancelledError:
+            for key, _ in batch:
+                self._in_flight.pop(key).cancel()
+            raise
+        except Exception as e:
+            if len(batch) > 1:
+                # Retried one by one, so only the callers whose input fails get the error.
+                await asyncio.gather(*(self._run([entry]) for entry in batch))
+                return
+            self._in_flight.pop(batch[0][0]).set_exception(e)
+            return
+        for (key, _), embedding in zip(batch, embeddings):
+            self._in_flight.pop(key).set_result(embedding)
+
+    def stats(self):
+        return {
+            "window_ms": self.window_seconds * 1000,
+            "max_batch": self.max_batch,
+            "calls": self.calls,
+            "inputs": self.inputs,
+            "coalesced": self.coalesced,
+            "avg_batch": self.inputs / self.calls if self.calls else 0.0,
+            "in_flight": len(self._in_flight),
+        }
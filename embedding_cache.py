@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+log = logging.getLogger("tds_ta.embedding_cache")
+
+DISK_READ_BATCH = 500  # keys per SELECT, under SQLite's bound-parameter limit
+
+
+def normalize_question(text):
+    # Repeats differ mostly in case and whitespace; collapse both for the cache key.
+    return " ".join(str(text).casefold().split())
+
+
+class EmbeddingCache:
+    """Bounded LRU cache of query embeddings with a TTL and an optional SQLite tier.
+
+    The SQLite tier is best effort: reads and writes run in worker threads, one query or
+    transaction per batch, and a failed read or write is logged and counted rather than raised.
+    """
+
+    def __init__(self, max_entries=2048, ttl_seconds=86400, disk_path=None, max_disk_rows=20000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_rows = max_disk_rows  # oldest rows are deleted beyond this; 0 = unbounded
+        self._entries = OrderedDict()  # key -> (expires_at, embedding)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.disk_errors = 0
+        self._db = None  # reads, in worker threads, one at a time
+        self._writer = None  # writes, in worker threads, one at a time
+        self._read_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        if disk_path:
+            try:
+                self._writer = sqlite3.connect(disk_path, check_same_thread=False)
+                # WAL lets the reader keep going while a write is being committed.
+                self._writer.execute("PRAGMA journal_mode=WAL")
+                self._writer.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings "
+                    "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._writer.execute(
+                    "CREATE INDEX IF NOT EXISTS query_embeddings_created_at ON query_embeddings (created_at)"
+                )
+                self._writer.commit()
+                self._db = sqlite3.connect(disk_path, timeout=0.1, check_same_thread=False)
+            except sqlite3.Error as e:
+                log.warning(
+                    "Embedding cache file unavailable; caching in memory only.",
+                    extra={"path": disk_path, "error": str(e)},
+                )
+                self.close()
+
+    @staticmethod
+    def make_key(text, model_name):
+        return f"{model_name}\0{normalize_question(text)}"
+
+    async def get_many(self, texts, model_name):
+        """Cached embeddings for texts (None where missing), reading the SQLite tier in a worker thread."""
+        keys = [self.make_key(text, model_name) for text in texts]
+        embeddings = [self._get_from_memory(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, embedding in zip(keys, embeddings) if embedding is None))
+        from_disk = {}
+        if missing and self._db is not None:
+            from_disk = await asyncio.to_thread(self._read_rows, missing)
+        for i, key in enumerate(keys):
+            if embeddings[i] is not None:
+                self.hits += 1
+            elif key in from_disk:
+                embeddings[i] = from_disk[key]
+                self._remember(key, embeddings[i])
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        return embeddings
+
+    def _get_from_memory(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, embedding = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return embedding
+
+    async def put_many(self, entries, model_name):
+        """Cache (text, embedding) pairs, writing them to the SQLite tier in one transaction."""
+        rows = []
+        now = time.time()
+        for text, embedding in entries:
+            key = self.make_key(text, model_name)
+            self._remember(key, embedding)
+            if self._writer is not None:
+                rows.append((key, np.asarray(embedding, dtype=np.float32).tobytes(), now))
+        if rows:
+            await asyncio.to_thread(self._write_rows, rows)
+
+    def _write_rows(self, rows):
+        with self._write_lock:
+            if self._writer is None:
+                return  # closed meanwhile
+            try:
+                self._writer.executemany("INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?)", rows)
+                self._writer.execute(
+                    "DELETE FROM query_embeddings WHERE created_at <= ?", (time.time() - self.ttl_seconds,)
+                )
+                if self.max_disk_rows:
+                    evicted = self._writer.execute(
+                        "DELETE FROM query_embeddings WHERE key IN (SELECT key FROM query_embeddings "
+                        "ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_rows,),
+                    ).rowcount
+                    self.disk_evictions += max(evicted, 0)
+                self._writer.commit()
+            except sqlite3.Error as e:
+                self.disk_errors += 1
+                log.warning("Could not write cached embeddings to disk.", extra={"rows": len(rows), "error": str(e)})
+                try:
+                    self._writer.rollback()
+                except sqlite3.Error:
+                    pass
+
+    def _remember(self, key, embedding):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read_rows(self, keys):
+        found = {}
+        oldest = time.time() - self.ttl_seconds  # older rows are deleted with the next write
+        with self._read_lock:
+            if self._db is None:
+                return found  # closed meanwhile
+            try:
+                for start in range(0, len(keys), DISK_READ_BATCH):
+                    batch = keys[start : start + DISK_READ_BATCH]
+                    rows = self._db.execute(
+                        "SELECT key, embedding FROM query_embeddings "
+                        f"WHERE created_at > ? AND key IN ({','.join('?' * len(batch))})",
+                        (oldest, *batch),
+                    )
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            except sqlite3.Error as e:
+                self.disk_errors += 1
+                log.warning(
+                    "Could not read cached embeddings from disk.", extra={"keys": len(keys), "error": str(e)}
+                )
+        return found
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "disk_tier": self._db is not None,
+            "max_disk_rows": self.max_disk_rows,
+            "disk_evictions": self.disk_evictions,
+            "disk_errors": self.disk_errors,
+        }
+
+    def close(self):
+        with self._read_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
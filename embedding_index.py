@@ -0,0 +1,359 @@
+# On-disk embedding index: a raw float32 .npy matrix opened with mmap, a JSONL
+# metadata sidecar (one data object per row) and a small JSON header.
+#
+#   embedding_index/
+#   ├── header.json     # format version, build version, model name, dimension, row count
+#   ├── vectors.npy     # float32 [rows, dim], rows pre-normalized to unit length
+#   ├── records.jsonl   # data object for row i on line i
+#   └── keys.txt        # content hash of row i on line i (see build_index.content_key),
+#                       # optionally followed by a tab and a digest of the row's metadata
+#
+# Search structures derived from it (BM25 postings, the Discourse thread layout)
+# are saved alongside as <name>.<array>.npy plus <name>.json naming the build
+# version they belong to; see save_arrays.
+#
+# Workers open the same directory read-only: vectors, records and those arrays
+# are all memory-mapped, so N processes share one copy through the page cache.
+# Writers (the builder, converters) serialize on the sibling <index_dir>.lock file.
+#
+# Each build is written to its own sibling directory, <index_dir>.<version>, and
+# published by atomically replacing the symlink <index_dir> to point at it. Readers
+# resolve the link once (resolve_index_dir) and read every file from that build.
+#
+# Convert an existing content_embeddings.json once with:
+#   python embedding_index.py convert --src content_embeddings.json --dest embedding_index
+import argparse
+import json
+import mmap
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single builder assumed
+    fcntl = None
+
+INDEX_FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.jsonl"
+KEYS_FILE = "keys.txt"
+LOAD_ATTEMPTS = 3  # a load racing with back-to-back publishes
+BUILD_DIR_SUFFIX_RE = re.compile(r"\.(\d{14}-[0-9a-f]{8}|legacy)$")  # <index_dir>.<version>
+
+
+class IndexFormatError(Exception):
+    pass
+
+
+class RecordStore:
+    """Read-only sequence over records.jsonl; a row is parsed only when accessed."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        newlines = np.flatnonzero(np.frombuffer(self._buffer, dtype=np.uint8) == 10)
+        self._ends = newlines.astype(np.int64)
+        self._starts = np.concatenate([[0], self._ends[:-1] + 1]).astype(np.int64)
+
+    def __len__(self):
+        return len(self._ends)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return json.loads(self._buffer[self._starts[i] : self._ends[i]])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+@contextmanager
+def index_lock(index_dir):
+    """Hold an exclusive advisory lock on <index_dir>.lock while building or converting."""
+    with open(f"{os.path.abspath(index_dir)}.lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def write_index(index_dir, vectors, records, model_name, keys=None, metadata_digests=None, before_publish=None):
+    """Write a new build of the index and publish it at index_dir in one atomic step.
+
+    before_publish(build_dir, header), if given, runs once the build is complete but
+    before any reader can see it, e.g. to save search structures alongside.
+    """
+    vectors = normalize_rows(vectors) if len(records) else np.empty((0, 0), np.float32)
+    if len(vectors) != len(records):
+        raise ValueError(f"Got {len(vectors)} vectors but {len(records)} records.")
+    if keys is not None and len(keys) != len(records):
+        raise ValueError(f"Got {len(keys)} keys but {len(records)} records.")
+    if metadata_digests is not None and len(metadata_digests) != len(keys or ()):
+        raise ValueError(f"Got {len(metadata_digests)} metadata digests for {len(keys or ())} keys.")
+
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    build_dir = f"{index_dir.rstrip(os.sep)}.{version}"
+    os.makedirs(build_dir)
+
+    np.save(os.path.join(build_dir, VECTORS_FILE), vectors)
+    with open(os.path.join(build_dir, RECORDS_FILE), "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+    if keys is not None:
+        with open(os.path.join(build_dir, KEYS_FILE), "w", encoding="utf-8") as f:
+            if metadata_digests is None:
+                f.write("".join(f"{key}\n" for key in keys))
+            else:
+                f.write("".join(f"{key}\t{digest}\n" for key, digest in zip(keys, metadata_digests)))
+    header = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "version": version,
+        "model": model_name,
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "rows": len(records),
+        "dtype": "float32",
+        "normalized": True,
+        "created_at": time.time(),
+    }
+    # The header is written last so a half-written directory never validates.
+    with open(os.path.join(build_dir, HEADER_FILE), "w", encoding="utf-8") as f:
+        json.dump(header, f, indent=2)
+    if before_publish is not None:
+        before_publish(build_dir, header)
+    publish(index_dir, build_dir)
+    return header
+
+
+def publish(index_dir, build_dir):
+    """Point the index_dir symlink at build_dir, then remove builds no reader can still be opening."""
+    index_dir = index_dir.rstrip(os.sep)
+    link_tmp = f"{index_dir}.link-{os.getpid()}"
+    try:
+        os.symlink(os.path.basename(build_dir), link_tmp, target_is_directory=True)
+    except (OSError, NotImplementedError):
+        # No symlinks (e.g. Windows without the privilege): swap by renaming instead,
+        # which leaves a moment with no index_dir; readers see IndexFormatError and retry.
+        old_dir = f"{index_dir}.old-{os.getpid()}"
+        if os.path.exists(index_dir):
+            os.rename(index_dir, old_dir)
+        os.rename(build_dir, index_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return
+    previous = None
+    if os.path.islink(index_dir):
+        previous = os.path.realpath(index_dir)
+    elif os.path.isdir(index_dir):
+        # An index written before builds were versioned; moved aside once.
+        previous = f"{index_dir}.legacy"
+        shutil.rmtree(previous, ignore_errors=True)
+        os.rename(index_dir, previous)
+    os.replace(link_tmp, index_dir)
+    # The build just replaced is kept: a reader may have resolved it and not opened it yet.
+    keep = {os.path.realpath(build_dir), previous and os.path.realpath(previous)}
+    parent = os.path.dirname(os.path.abspath(index_dir))
+    prefix = os.path.basename(index_dir)
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if name.startswith(prefix) and BUILD_DIR_SUFFIX_RE.fullmatch(name[len(prefix):]):
+            if os.path.realpath(path) not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def remove_index(index_dir):
+    """Delete the index at index_dir: the symlink and every build directory next to it."""
+    index_dir = index_dir.rstrip(os.sep)
+    if os.path.islink(index_dir):
+        os.remove(index_dir)
+    else:
+        shutil.rmtree(index_dir, ignore_errors=True)
+    parent = os.path.dirname(os.path.abspath(index_dir))
+    prefix = os.path.basename(index_dir)
+    for name in os.listdir(parent) if os.path.isdir(parent) else ():
+        if name.startswith(prefix) and BUILD_DIR_SUFFIX_RE.fullmatch(name[len(prefix):]):
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+def resolve_index_dir(index_dir):
+    """The build directory index_dir currently points at; read every file of one load from it."""
+    return os.path.realpath(index_dir)
+
+
+def read_header(index_dir):
+    header_path = os.path.join(index_dir, HEADER_FILE)
+    try:
+        with open(header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+    except FileNotFoundError:
+        raise IndexFormatError(f"No index header at {header_path}")
+    except json.JSONDecodeError as e:
+        raise IndexFormatError(f"Corrupt index header at {header_path}: {e}")
+    if header.get("format_version") != INDEX_FORMAT_VERSION:
+        raise IndexFormatError(
+            f"Unsupported index format version {header.get('format_version')} "
+            f"(expected {INDEX_FORMAT_VERSION})"
+        )
+    return header
+
+
+def index_version(header):
+    # Identifies one build of the index; caches keyed on it are invalid after a rebuild.
+    return header.get("version") or f"{header.get('model')}@{header.get('created_at')}"
+
+
+def load_index(index_dir, mmap=True, lazy_records=False):
+    """Return (vectors, records, header). vectors is a read-only memmap by default.
+
+    With lazy_records, records is a memory-mapped RecordStore instead of a list.
+    """
+    return load_build(index_dir, mmap, lazy_records)[1:]
+
+
+def load_build(index_dir, mmap=True, lazy_records=False):
+    """Like load_index, but returns (build_dir, vectors, records, header), all read from build_dir.
+
+    If the build being read is replaced and removed meanwhile, the new one is loaded instead.
+    """
+    for attempt in range(LOAD_ATTEMPTS):
+        build_dir = resolve_index_dir(index_dir)
+        try:
+            return (build_dir, *_load_files(build_dir, mmap, lazy_records))
+        except (FileNotFoundError, IndexFormatError):
+            if attempt == LOAD_ATTEMPTS - 1 or resolve_index_dir(index_dir) == build_dir:
+                raise
+
+
+def _load_files(index_dir, mmap, lazy_records):
+    header = read_header(index_dir)
+    vectors = np.load(
+        os.path.join(index_dir, VECTORS_FILE), mmap_mode="r" if mmap else None
+    )
+    if vectors.dtype != np.float32:
+        raise IndexFormatError(f"Expected float32 vectors, found {vectors.dtype}")
+    records_path = os.path.join(index_dir, RECORDS_FILE)
+    if lazy_records:
+        records = RecordStore(records_path)
+    else:
+        with open(records_path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+
+    rows = header.get("rows")
+    if len(records) != rows or (rows and vectors.shape != (rows, header.get("dim"))):
+        raise IndexFormatError(
+            f"Index at {index_dir} is inconsistent: header says {rows}x{header.get('dim')}, "
+            f"found {len(records)} records and vectors of shape {vectors.shape}"
+        )
+    return vectors, records, header
+
+
+def _read_keys_file(index_dir):
+    keys_path = os.path.join(index_dir, KEYS_FILE)
+    if not os.path.exists(keys_path):
+        return None
+    with open(keys_path, "r", encoding="utf-8") as f:
+        return [line.strip().split("\t") for line in f if line.strip()]
+
+
+def load_keys(index_dir):
+    # Older indexes (and converted JSON) have no keys file; callers derive them instead.
+    rows = _read_keys_file(index_dir)
+    return None if rows is None else [row[0] for row in rows]
+
+
+def load_metadata_digests(index_dir):
+    # None when the index predates metadata digests; callers hash the records instead.
+    rows = _read_keys_file(index_dir)
+    if not rows or any(len(row) < 2 for row in rows):
+        return None
+    return [row[1] for row in rows]
+
+
+def save_arrays(index_dir, name, arrays, index_version, **meta):
+    """Save arrays as <name>.<key>.npy next to the index; <name>.json is written last."""
+    for key, array in arrays.items():
+        path = os.path.join(index_dir, f"{name}.{key}.npy")
+        tmp_path = f"{path}.tmp-{os.getpid()}.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+    meta_path = os.path.join(index_dir, f"{name}.json")
+    tmp_path = f"{meta_path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"index_version": index_version, "arrays": list(arrays), **meta}, f)
+    os.replace(tmp_path, meta_path)
+
+
+def load_arrays(index_dir, name, expected_version):
+    """Return (arrays, meta) with arrays memory-mapped read-only, or None if missing or stale."""
+    try:
+        with open(os.path.join(index_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if meta.get("index_version") != expected_version:
+        return None
+    try:
+        arrays = {
+            key: np.load(os.path.join(index_dir, f"{name}.{key}.npy"), mmap_mode="r")
+            for key in meta["arrays"]
+        }
+    except (OSError, ValueError):
+        return None
+    return arrays, meta
+
+
+def convert_json(json_path, index_dir, model_name):
+    # content_embeddings.json is [{"embedding": [...], "data": {...}}, ...]
+    with open(json_path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    records = [item["data"] for item in items]
+    vectors = np.empty((len(items), len(items[0]["embedding"]) if items else 0), np.float32)
+    for i, item in enumerate(items):
+        vectors[i] = item["embedding"]
+    del items
+    return write_index(index_dir, vectors, records, model_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the binary embedding index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    convert = sub.add_parser("convert", help="Convert content_embeddings.json to an index")
+    convert.add_argument("--src", default="content_embeddings.json")
+    convert.add_argument("--dest", default="embedding_index")
+    convert.add_argument("--model", default=os.getenv("EMBEDDING_MODEL_NAME"))
+
+    info = sub.add_parser("info", help="Print an index header")
+    info.add_argument("--dest", default="embedding_index")
+
+    args = parser.parse_args()
+    if args.command == "convert":
+        start = time.perf_counter()
+        header = convert_json(args.src, args.dest, args.model)
+        print(
+            f"Wrote {header['rows']} x {header['dim']} index to {args.dest} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+    elif args.command == "info":
+        print(json.dumps(read_header(args.dest), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# BM25 inverted index over the same records as the vector store.
+#
+# Postings are stored CSR-style in flat NumPy arrays (term offsets, doc ids and
+# precomputed BM25 weights), so a query is a handful of slice-and-add steps
+# with no per-document Python work. Terms are identified by a 64-bit hash kept
+# in a sorted array rather than a dict, so the whole index can be saved next to
+# the embedding index and memory-mapped by every worker.
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+
+import numpy as np
+
+import embedding_index
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+BM25_ARRAYS = "bm25"
+
+log = logging.getLogger("tds_ta.lexical_index")
+
+
+def tokenize(text):
+    # Keeps exact tokens like "ga4", "q8" and "haversine" intact.
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def record_text(record):
+    return f"{record.get('title', '')}\n{record.get('content', '')}"
+
+
+def term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class BM25Index:
+    def __init__(self, term_hashes, offsets, doc_ids, weights, n_docs):
+        self.term_hashes = term_hashes  # uint64, ascending; term id = position
+        self.offsets = offsets  # [n_terms + 1] into doc_ids / weights
+        self.doc_ids = doc_ids  # int32 doc ids grouped by term
+        self.weights = weights  # float32 BM25 contribution of that term in that doc
+        self.n_docs = n_docs
+
+    @classmethod
+    def build(cls, texts, k1=1.5, b=0.75):
+        vocab = {}
+        term_ids, doc_ids, tfs = [], [], []
+        doc_lens = []
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+
+        n_docs = len(doc_lens)
+        # Renumber terms in hash order so a term id can be found by binary search.
+        term_hashes = np.fromiter((term_hash(term) for term in vocab), dtype=np.uint64, count=len(vocab))
+        hash_order = np.argsort(term_hashes, kind="stable")
+        new_ids = np.empty(len(vocab), dtype=np.int32)
+        new_ids[hash_order] = np.arange(len(vocab), dtype=np.int32)
+        term_hashes = term_hashes[hash_order]
+        term_ids = new_ids[np.asarray(term_ids, dtype=np.int32)] if term_ids else np.empty(0, np.int32)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        doc_lens = np.asarray(doc_lens, dtype=np.float32)
+        avg_len = doc_lens.mean() if n_docs else 0.0
+
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+        df = np.bincount(term_ids, minlength=len(vocab)).astype(np.float32)
+        offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * doc_lens[doc_ids] / avg_len) if n_docs else tfs
+        weights = (idf[term_ids] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+        return cls(term_hashes, offsets, doc_ids, weights, n_docs)
+
+    @classmethod
+    def from_records(cls, records):
+        return cls.build(record_text(record) for record in records)
+
+    @property
+    def n_terms(self):
+        return len(self.term_hashes)
+
+    def term_id(self, term):
+        key = np.uint64(term_hash(term))
+        i = int(np.searchsorted(self.term_hashes, key))
+        return i if i < len(self.term_hashes) and self.term_hashes[i] == key else None
+
+    def save(self, index_dir, index_version):
+        embedding_index.save_arrays(
+            index_dir,
+            BM25_ARRAYS,
+            {
+                "term_hashes": self.term_hashes,
+                "offsets": self.offsets,
+                "doc_ids": self.doc_ids,
+                "weights": self.weights,
+            },
+            index_version,
+            n_docs=self.n_docs,
+        )
+
+    @classmethod
+    def load(cls, index_dir, expected_version):
+        """Memory-map a saved index, or return None if it is missing or for another index version."""
+        loaded = embedding_index.load_arrays(index_dir, BM25_ARRAYS, expected_version)
+        if loaded is None:
+            return None
+        arrays, meta = loaded
+        return cls(arrays["term_hashes"], arrays["offsets"], arrays["doc_ids"], arrays["weights"], meta["n_docs"])
+
+    def search(self, query, top_n=10):
+        """Return (doc_ids, scores) of the top_n BM25 matches, best first."""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.term_id(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(top_n, len(matched))
+        best = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return best.astype(np.int64), scores[best]
+
+
+def load_or_build(index_dir, records, index_version, save=True):
+    # save=False (read-only workers) builds a missing index in memory only.
+    bm25 = BM25Index.load(index_dir, index_version)
+    if bm25 is None:
+        start = time.perf_counter()
+        bm25 = BM25Index.from_records(records)
+        log.info(f"Built BM25 index ({bm25.n_terms} terms) in {time.perf_counter() - start:.1f}s")
+        if not save:
+            log.warning(f"{index_dir} has no BM25 index for this build; kept in memory, not saved.")
+            return bm25
+        try:
+            bm25.save(index_dir, index_version)
+        except OSError as e:
+            log.warning(f"Could not save BM25 index to {index_dir}: {e}")
+    return bm25
+
+
+def reciprocal_rank_fusion(rankings, top_n, k=60):
+    """Fuse [(ranked_ids, weight), ...] into the top_n ids by weighted RRF score."""
+    fused = {}
+    for ranked_ids, weight in rankings:
+        if weight <= 0:
+            continue
+        for rank, doc_id in enumerate(ranked_ids):
+            fused[int(doc_id)] = fused.get(int(doc_id), 0.0) + weight / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)[:top_n]
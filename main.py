@@ -1,63 +1,172 @@
 # main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import asyncio
+import hmac
 import json
+import logging
 import os
 import time
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import APIStatusError, AsyncOpenAI
+from vector_store import VectorStore
+import embedding_index
+import build_index
+import ann_index
+import quantization
+import records_io
+import telemetry
+from lexical_index import BM25Index, reciprocal_rank_fusion, load_or_build as load_or_build_bm25
+from thread_index import ThreadIndex, load_or_build as load_or_build_threads
+from chunking import get_tokenizer, pack_contexts, truncate_to_tokens
+from embedding_cache import EmbeddingCache
+from embedding_batcher import EmbeddingBatcher
+from answer_cache import SemanticAnswerCache
 
 load_dotenv(override=True)
 
+# Records are formatted and written on a background thread; LOG_LEVEL=DEBUG adds full prompts.
+log = telemetry.setup_logging(
+    "tds_ta", os.getenv("LOG_LEVEL", "INFO"), os.getenv("LOG_FORMAT", "json")
+)
+
 # --- AI Pipe Client ---
-embedding_client = OpenAI(
+# One pooled HTTP client shared by both async clients, so a single worker can keep
+# many embedding and chat calls in flight without blocking the event loop.
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "60"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+DISCONNECT_POLL_INTERVAL = 0.25  # seconds between client-disconnect checks
+
+upstream_http_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(
+        UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT
+    ),
+    limits=httpx.Limits(
+        max_connections=UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+    ),
+)
+embedding_client = AsyncOpenAI(
     api_key=os.getenv("AIPIPE_TOKEN"),
     base_url=os.getenv("OPENAI_API_BASE_FOR_EMBEDDINGS"),
+    http_client=upstream_http_client,
 )
-chat_client = OpenAI(
+chat_client = AsyncOpenAI(
     api_key=os.getenv("AIPIPE_TOKEN"),
     base_url=os.getenv("OPENROUTER_API_BASE_FOR_CHAT"),
+    http_client=upstream_http_client,
 )
 
 # --- Embeddings and Vector Store ---
-all_content_embeddings = []
-EMBEDDINGS_FILE = "content_embeddings.json"
+vector_store = VectorStore.from_pairs([])  # replaced by install_index
+EMBEDDINGS_FILE = "content_embeddings.json"  # legacy format, converted on startup
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", "embedding_index")
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "0"))  # split long items at index time; 0 = off
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "64"))
+RETRIEVAL_INDEX = os.getenv("RETRIEVAL_INDEX", "exact")  # "exact" or "ivf" (approximate)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))  # lists scanned per query; higher = better recall
+IVF_NLISTS = int(os.getenv("IVF_NLISTS", "0"))  # 0 = sqrt(rows)
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")  # none, float16, int8 or pca
+QUANTIZATION_PCA_DIM = int(os.getenv("QUANTIZATION_PCA_DIM", "256"))
+QUANTIZATION_RESCORE = int(os.getenv("QUANTIZATION_RESCORE", "50"))  # exact rescore; 0 = off
+# Workers that never build or convert the index; they only open what build_index.py wrote.
+INDEX_READ_ONLY = os.getenv("INDEX_READ_ONLY", "false").lower() in ("1", "true", "yes")
+INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", "10"))  # seconds; 0 = never reload
+# Rebuild and swap the index when course_content / discourse_posts change on disk.
+RELOAD_ON_DATA_CHANGE = os.getenv("RELOAD_ON_DATA_CHANGE", "false").lower() in ("1", "true", "yes")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # enables POST /admin/reload; empty = disabled
+index_watch_task = None
+index_load_task = None  # startup load or a triggered reload, running in the background
+reload_lock = asyncio.Lock()  # one build/reload at a time per worker
+# Reported by /readyz. state: starting, loading, building, ready or failed.
+index_status = {
+    "state": "starting",
+    "version": None,
+    "rows": 0,
+    "progress": None,
+    "reloading": False,
+    "last_reload": None,
+    "error": None,
+}
+data_files_signature = None  # (path, mtime_ns, size) of the data files behind the served index
 
-discourse_topics_map = {}  # topic_id -> list of posts sorted by post_number
+# --- Lexical (BM25) Index ---
+lexical_index = BM25Index.from_records([])  # replaced by install_index
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "0.5"))  # 0 = vector only
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # per signal, before fusion
+RETRIEVAL_TOP_N = int(os.getenv("RETRIEVAL_TOP_N", "3"))  # hits per question, before thread expansion
 
+# --- Discourse Thread Index ---
+thread_index = ThreadIndex.from_records([])  # replaced by install_index
+THREAD_EXPAND_BEFORE = int(os.getenv("THREAD_EXPAND_BEFORE", "0"))  # preceding posts per hit
+THREAD_EXPAND_AFTER = int(os.getenv("THREAD_EXPAND_AFTER", "2"))  # following posts per hit
+THREAD_EXPAND_MAX = int(os.getenv("THREAD_EXPAND_MAX", "6"))  # expanded posts per request
 
-def find_top_n_similar(query_embedding, content_embeddings_list, top_n=5):
-    if not query_embedding or not content_embeddings_list:
-        return []
-    query_embedding_reshaped = np.array(query_embedding).reshape(1, -1)
-    similarities = []
-    for content_emb_vector, data_object in content_embeddings_list:
-        content_emb_vector_reshaped = np.array(content_emb_vector).reshape(1, -1)
-        sim = cosine_similarity(query_embedding_reshaped, content_emb_vector_reshaped)[
-            0
-        ][0]
-        similarities.append((sim, data_object))
-    similarities.sort(key=lambda x: x[0], reverse=True)
-    return [data_object for sim, data_object in similarities[:top_n]]
+# --- Query Embedding Cache ---
+embedding_cache = EmbeddingCache(
+    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL", "86400")),
+    disk_path=os.getenv("EMBEDDING_CACHE_PATH") or None,  # e.g. query_embeddings.sqlite3
+    max_disk_rows=int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ROWS", "20000")),  # 0 = unbounded
+)
 
+# --- Query Embedding Batching ---
+# Uncached questions arriving within the window share one embeddings call; identical
+# questions already in flight wait for that call instead of sending their own.
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "2"))
+EMBEDDING_BATCH_MAX = int(os.getenv("EMBEDDING_BATCH_MAX", "64"))  # inputs per coalesced call
+# Longer questions are cut before embedding, so one of them cannot fail a coalesced call.
+EMBEDDING_MAX_INPUT_TOKENS = int(os.getenv("EMBEDDING_MAX_INPUT_TOKENS", "8000"))
+# Upstream rejections caused by the input itself; a batch rejected with one is split and retried.
+# Timeouts, 429s and 5xx are already retried by the client and would fail the halves too.
+EMBEDDING_INPUT_ERROR_STATUSES = (400, 413, 422)
+
+# --- Semantic Answer Cache ---
+# Paraphrased questions above the cosine threshold reuse a stored answer instead of calling the LLM.
+answer_cache = SemanticAnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "0")),
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+)
+
+# --- Batch Endpoint ---
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))  # questions per /api/batch call
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))  # chat calls in flight per batch
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))  # inputs per embeddings call
+
+
+# About the old prompt: each context was cut at 500 characters (~125 tokens), with at most
+# RETRIEVAL_TOP_N hits plus THREAD_EXPAND_MAX thread posts.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1200"))  # context tokens per prompt
+PROMPT_CONTEXT_MAX_TOKENS = int(os.getenv("PROMPT_CONTEXT_MAX_TOKENS", "128"))  # per context
+
+NO_RELEVANT_INFO_ANSWER = "I could not find relevant information in my documents to answer your question."
+NO_CONTEXT_ANSWER = "I couldn't find any relevant documents to answer your question."
+LLM_EMPTY_ANSWER = "Error: Empty response from LLM."
+LLM_ERROR_ANSWER = "Sorry, I encountered an error trying to generate an answer."
 
-async def generate_llm_answer(user_question: str, contexts: list):
-    if not contexts:
-        return "I couldn't find any relevant documents to answer your question."
-
-    prompt_context_str = ""
-    for i, ctx in enumerate(contexts):
-        url = str(ctx.get("url", "N/A"))
-        content = str(ctx.get("content", "No content available")).strip()
-        title = str(ctx.get("title", "Untitled Document")).strip()
-        source_type = str(ctx.get("source", "Unknown source")).strip()
-        max_context_len = 500
-        if len(content) > max_context_len:
-            content = content[:max_context_len] + "..."
-        prompt_context_str += f'Context Document {i+1} (Source Type: {source_type}, Title: "{title}", URL: {url}):\n{content}\n\n'
+
+def format_context_block(i, ctx, content):
+    url = str(ctx.get("url", "N/A"))
+    title = str(ctx.get("title", "Untitled Document")).strip()
+    source_type = str(ctx.get("source", "Unknown source")).strip()
+    return f'Context Document {i+1} (Source Type: {source_type}, Title: "{title}", URL: {url}):\n{content}\n\n'
+
+
+def build_llm_messages(user_question: str, contexts: list):
+    # Fill the token budget in rank order instead of cutting every context at 500 chars.
+    context_blocks, context_tokens = pack_contexts(
+        contexts,
+        format_context_block,
+        PROMPT_TOKEN_BUDGET,
+        PROMPT_CONTEXT_MAX_TOKENS,
+    )
+    prompt_context_str = "".join(context_blocks)
 
     system_message = """You are a helpful Teaching Assistant for the 'Tools in Data Science' (TDS) course.
     Your goal is to answer student questions accurately based ONLY on the provided context documents.
@@ -76,28 +185,70 @@ async def generate_llm_answer(user_question: str, contexts: list):
     Student Question: "{user_question}"
     """
 
-    try:
-        print(f"\n--- LLM Call ---")
-        print(f"System Message for LLM: {system_message}")
-        print(
-            f"User Prompt for LLM (context part snippet):\n{prompt_context_str[:300]}..."
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(
+            "LLM prompt",
+            extra={"system_message": system_message, "context_snippet": prompt_context_str[:300]},
         )
-        print(f"User Prompt for LLM (question part): {user_question}")
+    log.info(
+        "Packed contexts",
+        extra={
+            "packed": len(context_blocks),
+            "contexts": len(contexts),
+            "context_tokens": context_tokens,
+        },
+    )
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_prompt},
+    ]
 
-        chat_completion = chat_client.chat.completions.create(
+
+async def generate_llm_answer(user_question: str, contexts: list):
+    if not contexts:
+        return NO_CONTEXT_ANSWER
+
+    with telemetry.stage("prompt"):
+        messages = build_llm_messages(user_question, contexts)
+    try:
+        with telemetry.stage("llm"):
+            chat_completion = await chat_client.chat.completions.create(
+                model=os.getenv("CHAT_MODEL_NAME"),  # type: ignore
+                messages=messages,  # type: ignore
+                temperature=0.2,
+            )
+        answer = chat_completion.choices[0].message.content
+        log.debug("LLM answer", extra={"answer_snippet": (answer or "")[:300]})
+        return answer.strip() if answer else LLM_EMPTY_ANSWER
+    except Exception as e:
+        log.error("Error calling LLM", extra={"error": str(e)})
+        return LLM_ERROR_ANSWER
+
+
+async def stream_llm_answer(user_question: str, contexts: list):
+    # Yields answer text pieces as the chat client produces them.
+    if not contexts:
+        yield NO_CONTEXT_ANSWER
+        return
+
+    with telemetry.stage("prompt"):
+        messages = build_llm_messages(user_question, contexts)
+    start = time.perf_counter()
+    try:
+        stream = await chat_client.chat.completions.create(
             model=os.getenv("CHAT_MODEL_NAME"),  # type: ignore
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_prompt},
-            ],
+            messages=messages,  # type: ignore
             temperature=0.2,
+            stream=True,
         )
-        answer = chat_completion.choices[0].message.content
-        print(f"LLM Raw Answer: {answer[:300]}...")  # type: ignore # Log LLM answer snippet
-        return answer.strip() if answer else "Error: Empty response from LLM."
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
     except Exception as e:
-        print(f"Error calling LLM: {e}")
-        return "Sorry, I encountered an error trying to generate an answer."
+        log.error("Error streaming from LLM", extra={"error": str(e)})
+        raise
+    finally:
+        telemetry.record("llm", time.perf_counter() - start)
 
 
 class QuestionRequest(BaseModel):
@@ -105,6 +256,10 @@ class QuestionRequest(BaseModel):
     image: str | None = None
 
 
+class BatchRequest(BaseModel):
+    questions: list[str]
+
+
 class Link(BaseModel):
     url: str
     text: str
@@ -133,244 +288,779 @@ app.add_middleware(
 )
 
 
-def get_embedding(text_to_embed: str):
+async def get_embedding(text_to_embed: str):
+    with telemetry.stage("embed"):
+        return await fetch_embedding(text_to_embed)
+
+
+def embedding_input(text: str):
+    return truncate_to_tokens(text, EMBEDDING_MAX_INPUT_TOKENS)
+
+
+async def fetch_embedding(text_to_embed: str):
+    text_to_embed = embedding_input(text_to_embed)
+    model_name = os.getenv("EMBEDDING_MODEL_NAME")
+    (cached,) = await embedding_cache.get_many([text_to_embed], model_name)
+    if cached is not None:
+        return cached
+    return await embedding_batcher.embed(text_to_embed)
+
+
+async def get_embeddings(texts: list):
+    # One embeddings call per EMBEDDING_BATCH_SIZE uncached texts; None where a call failed.
+    model_name = os.getenv("EMBEDDING_MODEL_NAME")
+    texts = [embedding_input(text) for text in texts]
+    unique = list(dict.fromkeys(texts))  # in order
+    cached = await embedding_cache.get_many(unique, model_name)
+    embeddings = {text: embedding for text, embedding in zip(unique, cached) if embedding is not None}
+    missing = [text for text in unique if text not in embeddings]
+    with telemetry.stage("embed"):
+        fetched = await embedding_batcher.embed_many(missing, EMBEDDING_BATCH_SIZE)
+    embeddings.update(zip(missing, fetched))
+    return [embeddings.get(text) for text in texts]
+
+
+async def embed_uncached(texts: list):
+    # One upstream call for a batch assembled by embedding_batcher; None where it failed.
+    # If the batch is rejected because of its input, the halves are retried separately
+    # until only the offending questions are left to fail.
+    model_name = os.getenv("EMBEDDING_MODEL_NAME")
+    embeddings = [None] * len(texts)
     try:
-        response = embedding_client.embeddings.create(
-            model=os.getenv("EMBEDDING_MODEL_NAME"),  # type: ignore
-            input=text_to_embed,
+        response = await embedding_client.embeddings.create(
+            model=model_name,  # type: ignore
+            input=texts,
         )
-        return response.data[0].embedding
+    except APIStatusError as e:
+        if len(texts) > 1 and e.status_code in EMBEDDING_INPUT_ERROR_STATUSES:
+            middle = len(texts) // 2
+            left, right = await asyncio.gather(
+                embed_uncached(texts[:middle]), embed_uncached(texts[middle:])
+            )
+            return left + right
+        log.error(
+            "Error getting embeddings",
+            extra={"texts": len(texts), "text": texts[0][:50], "status": e.status_code, "error": str(e)},
+        )
+        return embeddings
     except Exception as e:
-        print(f"Error getting embedding for text '{text_to_embed[:50]}...': {e}")
-        return None
+        log.error(
+            "Error getting embeddings",
+            extra={"texts": len(texts), "text": texts[0][:50], "error": str(e)},
+        )
+        return embeddings
+    for item in response.data:
+        embeddings[item.index] = item.embedding
+    await embedding_cache.put_many(
+        [(text, embedding) for text, embedding in zip(texts, embeddings) if embedding is not None], model_name
+    )
+    return embeddings
 
 
-@app.on_event("startup")
-async def startup_event():
-    global course_content_data, discourse_posts_data, all_content_embeddings
-    print("Loading data...")
-    course_content_data = []
-    discourse_posts_data = []
+embedding_batcher = EmbeddingBatcher(
+    embed_uncached,
+    window_seconds=EMBEDDING_BATCH_WINDOW_MS / 1000,
+    max_batch=EMBEDDING_BATCH_MAX,
+    # Same key as the cache, so questions differing only in case or spacing share a call.
+    key=lambda text: EmbeddingCache.make_key(text, os.getenv("EMBEDDING_MODEL_NAME")),
+)
 
-    try:
-        with open("course_content.json", "r", encoding="utf-8") as f:
-            course_content_data = json.load(f)
-        print(f"Loaded {len(course_content_data)} items from course_content.json")
-    except FileNotFoundError:
-        print("Error: course_content.json not found.")
-    except json.JSONDecodeError:
-        print("Error: Could not decode course_content.json.")
 
+def load_vector_store(index_dir):
+    # Vectors and records stay memory-mapped, so every worker shares them via the page cache.
+    # Sidecars are read from the same build directory, even if a newer one is published meanwhile.
+    index_dir, vectors, records, header = embedding_index.load_build(index_dir, lazy_records=True)
+    model_name = os.getenv("EMBEDDING_MODEL_NAME")
+    if header.get("model") and model_name and header["model"] != model_name:
+        log.warning(
+            f"Embedding index at {index_dir} was built with '{header['model']}', "
+            f"but EMBEDDING_MODEL_NAME is '{model_name}'. Ignoring it."
+        )
+        return None
+    log.info(
+        f"Loaded embedding index v{header['format_version']} from {index_dir}: "
+        f"{header['rows']} rows x {header['dim']} dims ({header.get('model')})"
+    )
+    store = VectorStore(
+        vectors,
+        records,
+        normalized=True,
+        version=embedding_index.index_version(header),
+        index_dir=index_dir,
+    )
+    # build_index.py saves these with the index; read-only workers never write to it.
+    if RETRIEVAL_INDEX == "ivf" and len(store):
+        ivf = ann_index.load_or_build(
+            index_dir, store.matrix, store.version, n_lists=IVF_NLISTS or None, save=not INDEX_READ_ONLY
+        )
+        store.use_ann(ivf, IVF_NPROBE)
+        log.info(f"Using IVF index: {ivf.n_lists} lists, n_probe={IVF_NPROBE}")
+    elif VECTOR_QUANTIZATION != "none" and len(store):
+        codec = quantization.load_or_fit(
+            index_dir,
+            store.matrix,
+            VECTOR_QUANTIZATION,
+            store.version,
+            QUANTIZATION_PCA_DIM,
+            save=not INDEX_READ_ONLY,
+        )
+        store.use_quantized(quantization.QuantizedSearcher(codec, QUANTIZATION_RESCORE))
+        log.info(
+            f"Using {VECTOR_QUANTIZATION} codes ({codec.nbytes / 2**20:.1f} MiB), "
+            f"exact rescore of {QUANTIZATION_RESCORE} candidates"
+        )
+    return store
+
+
+def open_shared_index(index_dir):
+    if not os.path.exists(index_dir):
+        log.warning(f"No embedding index at {index_dir} yet; waiting for build_index.py to write one.")
+        return None
     try:
-        with open("discourse_posts.json", "r", encoding="utf-8") as f:
-            discourse_posts_data = json.load(f)
-        print(f"Loaded {len(discourse_posts_data)} items from discourse_posts.json")
-    except FileNotFoundError:
-        print("Error: discourse_posts.json not found.")
-    except json.JSONDecodeError:
-        print("Error: Could not decode discourse_posts.json.")
-
-    print("AI Pipe clients configured (using environment variables).")
-    loaded_from_file = False
-    try:
-        if os.path.exists(EMBEDDINGS_FILE):
-            with open(EMBEDDINGS_FILE, "r") as f:
-                loaded_embeddings_data = json.load(f)
-                all_content_embeddings = [
-                    (item["embedding"], item["data"]) for item in loaded_embeddings_data
-                ]
-            print(
-                f"Loaded {len(all_content_embeddings)} pre-computed embeddings from {EMBEDDINGS_FILE}"
-            )
-            if all_content_embeddings:
-                loaded_from_file = True
+        return load_vector_store(index_dir)
     except Exception as e:
-        print(
-            f"Could not load pre-computed embeddings from {EMBEDDINGS_FILE}: {e}. Will re-generate."
-        )
-        all_content_embeddings = []
-
-    if not loaded_from_file:
-        print("Generating embeddings for all content (this might take a while)...")
-        combined_content = []
-        for item in course_content_data:
-            text_content = str(
-                item.get("content", "")
-            )  # Using just content for embedding
-            title = str(item.get("title", ""))  # Keep title for original_data
-            if text_content:
-                combined_content.append(
-                    {
-                        "text_to_embed": text_content,  # Embed only content
-                        "original_data": {
-                            "source": "course",
-                            "title": title,
-                            "content": text_content,
-                            "url": item.get("source_url"),
-                        },
-                    }
+        log.error(f"Could not load embedding index from {index_dir}: {e}")
+        return None
+
+
+def open_or_build_index(content_items, progress=None, failed_sources=()):
+    """Load the index, converting legacy JSON or re-embedding changed content first if needed."""
+    model_name = os.getenv("EMBEDDING_MODEL_NAME")
+    with embedding_index.index_lock(EMBEDDING_INDEX_DIR):
+        store = None
+        loaded_from_file = False
+        try:
+            if not os.path.exists(EMBEDDING_INDEX_DIR) and os.path.exists(EMBEDDINGS_FILE):
+                log.info(
+                    f"Converting legacy {EMBEDDINGS_FILE} to binary index at {EMBEDDING_INDEX_DIR} (one-time)..."
                 )
-        for item in discourse_posts_data:
-            text_content = str(
-                item.get("content", "")
+                embedding_index.convert_json(EMBEDDINGS_FILE, EMBEDDING_INDEX_DIR, model_name)
+            if os.path.exists(EMBEDDING_INDEX_DIR):
+                store = load_vector_store(EMBEDDING_INDEX_DIR)
+                loaded_from_file = store is not None and len(store) > 0
+        except Exception as e:
+            log.warning(
+                f"Could not load embedding index from {EMBEDDING_INDEX_DIR}: {e}. Will re-generate."
             )
-            topic_id_val = item.get("topic_id", "")
-            post_number_val = item.get("post_number", "")
-            title = str(item.get("topic_title", ""))
-            if text_content:
-                combined_content.append(
-                    {
-                        "text_to_embed": text_content,  # Embed only content
-                        "original_data": {
-                            "source": "discourse",
-                            "title": title,
-                            "content": text_content,
-                            "url": item.get("url"),
-                            "topic_id": topic_id_val,
-                            "post_number": post_number_val
-                        },
-                    }
-                )
-        all_content_embeddings = []
-        for i, content_item in enumerate(combined_content):
-            print(
-                f"Embedding item {i+1}/{len(combined_content)}: {content_item['original_data']['title'][:50]} (Source: {content_item['original_data']['source']})..."
+
+        if (
+            loaded_from_file
+            and content_items
+            and build_index.index_is_stale(
+                content_items, EMBEDDING_INDEX_DIR, model_name, failed_sources
             )
-            embedding_vector = get_embedding(content_item["text_to_embed"])
-            if embedding_vector:
-                all_content_embeddings.append(
-                    (embedding_vector, content_item["original_data"])
-                )
-            # time.sleep(0.05) # Reduced delay, adjust if rate limits hit
+        ):
+            log.info("Scraped data changed since the index was built; updating the differences...")
+            loaded_from_file = False
 
-        if combined_content:
+        if not loaded_from_file:
+            log.info("Generating embeddings for new or changed content (this might take a while)...")
             try:
-                with open(EMBEDDINGS_FILE, "w") as f:
-                    serializable_embeddings = [
-                        {"embedding": emb, "data": data}
-                        for emb, data in all_content_embeddings
-                    ]
-                    json.dump(serializable_embeddings, f)
-                print(
-                    f"Saved {len(all_content_embeddings)} embeddings to {EMBEDDINGS_FILE}"
+                # Batched, concurrent and checkpointed; rerunning resumes a crashed build.
+                header = build_index.build_index(
+                    content_items,
+                    build_index.make_client(),
+                    model_name,
+                    EMBEDDING_INDEX_DIR,
+                    progress=progress,
+                    failed_sources=failed_sources,
+                    retrieval_index=RETRIEVAL_INDEX,
+                    ivf_lists=IVF_NLISTS,
+                    vector_quantization=VECTOR_QUANTIZATION,
+                    pca_dim=QUANTIZATION_PCA_DIM,
                 )
+                if header:
+                    log.info(f"Saved {header['rows']} embeddings to {EMBEDDING_INDEX_DIR}")
+                    store = load_vector_store(EMBEDDING_INDEX_DIR) or store
             except Exception as e:
-                print(f"Error saving embeddings: {e}")
-    print(f"Total content items with embeddings: {len(all_content_embeddings)}")
+                log.error(f"Error building embedding index: {e}")
+    return store if store is not None and len(store) else None
 
-    for post in discourse_posts_data:
-        topic_id = post.get("topic_id")
-        if topic_id not in discourse_topics_map:
-            discourse_topics_map[topic_id] = []
-        discourse_topics_map[topic_id].append(post)
 
-    # Sort posts within each topic by post_number
-    for topic_id in discourse_topics_map:
-        discourse_topics_map[topic_id].sort(key=lambda p: p.get("post_number", 0))
-    print(f"Discourse topics loaded with {len(discourse_topics_map)} unique topics.")
-    print("API ready.")
+def read_data_signature():
+    signature = []
+    for stem in ("course_content", "discourse_posts"):
+        path = records_io.find_records_file(stem)
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((path, None, None))
+    return tuple(signature)
 
 
-@app.post("/api/", response_model=AnswerResponse)
-async def get_answer(request: QuestionRequest):
-    print(f"\n--- New Request ---")  # Separator for logs
-    print(f"Received question: {request.question}")
+def report_build_progress(embedded, to_embed):
+    # Called from the build thread; a reload keeps the state "ready" while the old index serves.
+    if index_status["state"] != "ready":
+        index_status["state"] = "building"
+    index_status["progress"] = {"embedded": embedded, "to_embed": to_embed}
 
-    if not request.question.strip():
-        return AnswerResponse(answer="Please provide a question.", links=[])
 
-    question_embedding = get_embedding(request.question)
-    if not question_embedding:
-        return AnswerResponse(
-            answer="Sorry, I couldn't process the question embedding.", links=[]
+def prepare_index():
+    """Load the data, open or build the index, and open its BM25 and thread indexes.
+
+    Runs in a worker thread, next to the index that is currently being served.
+    """
+    signature = read_data_signature()
+    failed_sources = set()
+    if INDEX_READ_ONLY:
+        store = open_shared_index(EMBEDDING_INDEX_DIR)
+    else:
+        # The scraped files are only streamed through to check or build the index;
+        # everything served afterwards comes from the memory-mapped index itself.
+        combined_content = build_index.collect_content_items(
+            records_io.iter_source(records_io.find_records_file("course_content"), "course", failed_sources),
+            records_io.iter_source(records_io.find_records_file("discourse_posts"), "discourse", failed_sources),
+            CHUNK_TOKENS,
+            CHUNK_OVERLAP,
+        )
+        # One worker converts or builds while the others wait, then they all just load it.
+        store = open_or_build_index(
+            combined_content, progress=report_build_progress, failed_sources=failed_sources
         )
+    if store is None:
+        return None
+    log.info(f"Vector store ready: {len(store)} rows x {store.dim} dims")
+    # Both are saved with the index by build_index.py and memory-mapped here. An index
+    # written without them gets them built by the first worker to open it, and saved
+    # unless the worker is read-only.
+    lexical = load_or_build_bm25(
+        store.index_dir, store.records, store.version, save=not INDEX_READ_ONLY
+    )
+    log.info(f"BM25 index ready: {lexical.n_terms} terms over {lexical.n_docs} records")
+    threads = load_or_build_threads(
+        store.index_dir,
+        store.records,
+        store.version,
+        before=THREAD_EXPAND_BEFORE,
+        after=THREAD_EXPAND_AFTER,
+        save=not INDEX_READ_ONLY,
+    )
+    log.info(f"Thread index ready: {len(threads)} posts in {threads.n_topics} topics")
+    return store, lexical, threads, signature
 
-    # Using top_n=5 as discussed
-    initial_relevant_contexts = find_top_n_similar(
-        question_embedding, all_content_embeddings, top_n=3
+
+def install_index(store, lexical, threads=None, signature=None):
+    global vector_store, lexical_index, thread_index, data_files_signature
+    # Replaced together between requests; in-flight requests keep the objects they hold.
+    vector_store, lexical_index = store, lexical
+    if threads is not None:
+        thread_index = threads
+    if signature is not None:
+        data_files_signature = signature
+    index_status.update(
+        state="ready", version=store.version, rows=len(store), progress=None, error=None
     )
+    log.info(f"Now serving embedding index {store.version}: {len(store)} rows")
+
+
+async def refresh_index(reason: str):
+    """Prepare a new index alongside the served one and swap it in; False if none could be loaded."""
+    async with reload_lock:
+        if index_status["state"] == "ready":
+            index_status["reloading"] = True
+        else:
+            index_status["state"] = "loading"
+        log.info(f"Preparing embedding index ({reason})...")
+        prepared = None
+        try:
+            prepared = await asyncio.to_thread(prepare_index)
+        except Exception as e:
+            log.error(f"Could not prepare embedding index: {e}")
+            index_status["error"] = str(e)
+        finally:
+            index_status["reloading"] = False
+            index_status["progress"] = None
+        index_status["last_reload"] = {"reason": reason, "at": time.time(), "ok": prepared is not None}
+        if prepared is None:
+            if index_status["state"] != "ready":
+                index_status["state"] = "failed"
+                index_status["error"] = index_status["error"] or "No embedding index could be loaded or built."
+            return False
+        install_index(*prepared)
+        return True
+
+
+async def watch_index_version():
+    """Poll the index header (and the data files) and swap to a new index without a restart."""
+    rejected_version = None
+    rejected_signature = None
+    pending_signature = None  # changed data files, seen on the previous tick
+    while True:
+        await asyncio.sleep(INDEX_WATCH_INTERVAL)
+        if reload_lock.locked():
+            continue  # this worker is already loading or building one
+        if RELOAD_ON_DATA_CHANGE and not INDEX_READ_ONLY:
+            signature = read_data_signature()
+            if signature not in (data_files_signature, rejected_signature):
+                # A scraper may still be writing; rebuild only once the files have stopped
+                # changing for a whole tick, so a half-written file is never indexed.
+                if signature != pending_signature:
+                    pending_signature = signature
+                    continue
+                pending_signature = None
+                log.info("Data files changed; rebuilding the index in the background...")
+                if not await refresh_index("data files changed"):
+                    rejected_signature = signature
+                continue
+        try:
+            header = embedding_index.read_header(EMBEDDING_INDEX_DIR)
+        except embedding_index.IndexFormatError:
+            continue  # not written yet, or mid-rename; look again next tick
+        version = embedding_index.index_version(header)
+        if version in (vector_store.version, rejected_version):
+            continue
+        log.info(f"Embedding index changed to {version}; reloading...")
+        if not await refresh_index(f"index changed to {version}"):
+            rejected_version = version
+
+
+async def load_index_then_watch():
+    global index_watch_task
+    # Loaded up front rather than on the first request; tiktoken may download its encoding.
+    await asyncio.to_thread(get_tokenizer)
+    await refresh_index("startup")
+    if INDEX_WATCH_INTERVAL > 0:
+        index_watch_task = asyncio.create_task(watch_index_version())
+    if index_status["state"] == "ready":
+        log.info("API ready.")
+
+
+@app.on_event("startup")
+async def startup_event():
+    global index_load_task
+    log.info("AI Pipe clients configured (using environment variables).")
+    # Accept traffic right away; the index is loaded or built in the background and
+    # /readyz answers 503 until it is being served.
+    index_load_task = asyncio.create_task(load_index_then_watch())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in (index_load_task, index_watch_task):
+        if task is not None:
+            task.cancel()
+    await upstream_http_client.aclose()
+    embedding_cache.close()
+    telemetry.stop_logging()
 
-    final_contexts_for_llm = []
-    processed_urls = set()  # To avoid adding the same post multiple times
 
-    # --- ADDED LOGGING FOR RETRIEVED CONTEXTS ---
-    print(
-        f"\nRetrieved {len(initial_relevant_contexts)} contexts for question: '{request.question}'"
+@app.get("/healthz")
+async def healthz():
+    # Liveness only: the process is up and the event loop is answering.
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    ready = index_status["state"] == "ready"
+    return JSONResponse(dict(index_status), status_code=200 if ready else 503)
+
+
+@app.post("/admin/reload", status_code=202)
+async def admin_reload(http_request: Request):
+    # Re-reads the data files, re-embeds what changed, and swaps the new index in while
+    # the current one keeps answering. Poll /readyz for progress.
+    global index_load_task
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = http_request.headers.get("x-admin-token", "")
+    authorization = http_request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        supplied = authorization[7:]
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+    if reload_lock.locked():
+        raise HTTPException(status_code=409, detail="A load or reload is already running.")
+    index_load_task = asyncio.create_task(refresh_index("admin request"))
+    return JSONResponse({"accepted": True, **index_status}, status_code=202)
+
+
+def require_index_ready():
+    if index_status["state"] != "ready":
+        raise HTTPException(
+            status_code=503,
+            detail=f"The search index is not ready yet ({index_status['state']}).",
+            headers={"Retry-After": "5"},
+        )
+
+
+@app.get("/stats")
+async def get_stats():
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_batcher": embedding_batcher.stats(),
+        "answer_cache": answer_cache.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Prometheus text format: per-stage and per-endpoint latency histograms.
+    return PlainTextResponse(
+        telemetry.render_metrics(), media_type="text/plain; version=0.0.4"
     )
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def run_until_disconnected(http_request: Request, coro):
+    # Cancel the in-flight upstream calls as soon as the client goes away.
+    task = asyncio.ensure_future(coro)
+
+    async def watch_disconnect():
+        while not task.done():
+            if await http_request.is_disconnected():
+                task.cancel()
+                return
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if watcher.done() and not watcher.cancelled():
+            raise ClientDisconnected()
+        raise
+    finally:
+        watcher.cancel()
+
+
+@app.post("/api/", response_model=AnswerResponse)
+async def get_answer(request: QuestionRequest, http_request: Request, response: Response):
+    require_index_ready()
+    timings = telemetry.start_request()
+    try:
+        answer = await run_until_disconnected(
+            http_request, answer_question(request.question)
+        )
+    except ClientDisconnected:
+        log.info("Client disconnected; cancelled in-flight request.")
+        return Response(status_code=499)
+    finally:
+        telemetry.finish_request(timings, "/api/")
+    # e.g. "embed;dur=212.4, retrieve;dur=3.1, ..., total;dur=1480.2", shown in browser devtools
+    response.headers["Server-Timing"] = timings.server_timing()
+    return answer
+
+
+def hybrid_enabled():
+    return HYBRID_LEXICAL_WEIGHT > 0 and lexical_index.n_docs == len(vector_store)
+
+
+def vector_candidates(top_n=3):
+    # Rows taken from the vector ranking: top_n alone, or more to fuse with BM25.
+    return max(top_n, HYBRID_CANDIDATES) if hybrid_enabled() else top_n
+
+
+def hybrid_search(question: str, question_embedding, top_n=3, vector_ids=None):
+    # Exact tokens like "GA4" or "haversine" are often missed by embeddings alone,
+    # so vector and BM25 rankings are merged with weighted reciprocal rank fusion.
+    # vector_ids, when given, is this question's row of a batched vector search.
+    if not hybrid_enabled():
+        if vector_ids is not None:
+            return [vector_store.records[i] for i in vector_ids[:top_n]]
+        return vector_store.search(question_embedding, top_n=top_n)
+    candidates = vector_candidates(top_n)
+    if vector_ids is None:
+        vector_ids, _ = vector_store.search_indices(question_embedding, candidates)
+    lexical_ids, _ = lexical_index.search(question, candidates)
+    fused_ids = reciprocal_rank_fusion(
+        [(vector_ids, HYBRID_VECTOR_WEIGHT), (lexical_ids, HYBRID_LEXICAL_WEIGHT)],
+        top_n=top_n,
+    )
+    return [vector_store.records[i] for i in fused_ids]
+
+
+def retrieve_contexts(question: str, question_embedding, vector_ids=None):
+    # Using top_n=5 as discussed
+    with telemetry.stage("retrieve"):
+        initial_relevant_contexts = hybrid_search(
+            question, question_embedding, top_n=RETRIEVAL_TOP_N, vector_ids=vector_ids
+        )
+
+    final_contexts_for_llm = []
+    processed_contexts = set()  # To avoid adding the same post multiple times
+    expanded = 0  # thread posts added so far, capped at THREAD_EXPAND_MAX
+
+    log.info("Retrieved contexts", extra={"contexts": len(initial_relevant_contexts)})
+    expand_start = time.perf_counter()
     for ctx in initial_relevant_contexts:
-        if ctx["url"] not in processed_urls:
+        # Chunks of one long section share its url, so they are told apart by chunk number.
+        context_key = (ctx["url"], ctx.get("chunk"))
+        if context_key not in processed_contexts:
             final_contexts_for_llm.append(ctx)
-            processed_urls.add(ctx["url"])
+            processed_contexts.add(context_key)
 
-        if ctx.get("source") == "discourse":
+        if ctx.get("source") == "discourse" and expanded < THREAD_EXPAND_MAX:
             topic_id = ctx.get("topic_id")
             current_post_number = ctx.get("post_number")
 
-            if topic_id and current_post_number and topic_id in discourse_topics_map:
-                topic_posts = discourse_topics_map[topic_id]
-                current_post_index = -1
-                for i, p in enumerate(topic_posts):
-                    if p.get("post_number") == current_post_number:
-                        current_post_index = i
+            if topic_id and current_post_number:
+                # Neighbouring posts in the same thread (replies by default)
+                for thread_post in thread_index.window(topic_id, current_post_number):
+                    if expanded >= THREAD_EXPAND_MAX:
                         break
-
-                if current_post_index != -1:
-                    # Add next 1 or 2 posts if they exist
-                    for i in range(1, 3):  # For next post, and post after next
-                        next_post_index = current_post_index + i
-                        if next_post_index < len(topic_posts):
-                            next_post_data = topic_posts[next_post_index]
-                            # Check if this next_post_data is already part of the initially retrieved contexts
-                            # or already added to final_contexts_for_llm to avoid too much redundancy.
-                            # For simplicity now, just add if not already processed by URL.
-                            if next_post_data["url"] not in processed_urls:
-                                final_contexts_for_llm.append(next_post_data)
-                                processed_urls.add(next_post_data["url"])
-                                print(
-                                    f"  Added reply context: {next_post_data.get('topic_title', 'N/A')[:30]}... (Post {next_post_data['post_number']})"
-                                )
-                        else:
-                            break  # No more posts in this topic
+                    # For simplicity, just add if not already processed by URL.
+                    thread_key = (thread_post["url"], thread_post.get("chunk"))
+                    if thread_key not in processed_contexts:
+                        final_contexts_for_llm.append(thread_post)
+                        processed_contexts.add(thread_key)
+                        expanded += 1
+                        log.debug(
+                            "Added thread context",
+                            extra={
+                                "topic_title": thread_post.get("title", "N/A")[:30],
+                                "post_number": thread_post["post_number"],
+                            },
+                        )
+    telemetry.record("thread", time.perf_counter() - expand_start)
     # Now, final_contexts_for_llm might have more than top_n items.
     # You might want to limit the total number of contexts sent to the LLM, e.g., to 5 or 6.
     # Or, ensure your prompt can handle a variable number of contexts.
     # For now, let's assume the LLM prompt can handle up to ~6 contexts effectively.
     # The LLM prompt already iterates through `contexts`, so it's fine.
 
+    return final_contexts_for_llm
+
+
+def derive_links(final_contexts_for_llm: list):
+    start = time.perf_counter()
+    derived_links = []
+    seen_urls = set()  # several chunks of one page still give a single link
+    for ctx in final_contexts_for_llm:
+        url = str(ctx.get("url", "#"))
+        if url in seen_urls:
+            continue
+        seen_urls.add(url)
+        title = str(ctx.get("title", "Relevant Document"))
+        # Link canonicalization
+        if (
+            url.startswith("https://tds.s-anand.net#") and "/../" in url
+        ):  # More specific to the known URL structure
+            parts = url.split("#", 1)  # Split only on the first #
+            base = parts[0]
+            hash_path = parts[1] if len(parts) > 1 else ""
+            # Replace /../ which implies going up one segment from root of hash path
+            # e.g., #/2025-01/../docker becomes #/docker (incorrect for this site)
+            # e.g., #/../docker becomes #/docker (correct for this site if #/ is root)
+            # The links are like "#/../docker", meaning relative to the root of the hash path.
+            # So, "#/../<name>" should become "#/<name>"
+            if hash_path.startswith("/../"):
+                hash_path = hash_path.replace(
+                    "/../", "/", 1
+                )  # Replace only the first instance at the start
+            url = base + "#" + hash_path
+        derived_links.append(Link(url=url, text=title[:100]))
+    telemetry.record("links", time.perf_counter() - start)
+    return derived_links
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/stream")
+async def stream_answer(request: QuestionRequest):
+    # Server-Sent Events: "links" right after retrieval, "token" per LLM chunk, then "done"
+    # carrying the same AnswerResponse that /api/ would return.
+    require_index_ready()
+    return StreamingResponse(
+        timed_stream(answer_question_events(request.question), "/api/stream"),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def timed_stream(events, endpoint: str):
+    # Headers are already sent when streaming starts, so stage timings only reach /metrics.
+    timings = telemetry.start_request()
+    try:
+        async for event in events:
+            yield event
+    finally:
+        telemetry.finish_request(timings, endpoint)
+
+
+async def answer_question_events(question: str):
+    log.info("Question received", extra={"endpoint": "/api/stream", "question": question[:200]})
+
+    if not question.strip():
+        response = AnswerResponse(answer="Please provide a question.", links=[])
+        yield sse_event("links", {"links": []})
+        yield sse_event("done", response.model_dump())
+        return
+
+    question_embedding = await get_embedding(question)
+    if not question_embedding:
+        response = AnswerResponse(
+            answer="Sorry, I couldn't process the question embedding.", links=[]
+        )
+        yield sse_event("links", {"links": []})
+        yield sse_event("done", response.model_dump())
+        return
+
+    cached_response, similarity = answer_cache.lookup(
+        question, question_embedding, vector_store.version
+    )
+    if cached_response is not None:
+        log.info("Answer cache hit; skipping LLM call.", extra={"similarity": round(similarity, 3)})
+        yield sse_event("links", {"links": [l.model_dump() for l in cached_response.links]})
+        yield sse_event("token", {"text": cached_response.answer})
+        yield sse_event("done", cached_response.model_dump())
+        return
+
+    final_contexts_for_llm = retrieve_contexts(question, question_embedding)
+    derived_links = derive_links(final_contexts_for_llm)
+    yield sse_event("links", {"links": [l.model_dump() for l in derived_links]})
+
+    if not final_contexts_for_llm:
+        response = AnswerResponse(answer=NO_RELEVANT_INFO_ANSWER, links=[])
+        yield sse_event("token", {"text": response.answer})
+        yield sse_event("done", response.model_dump())
+        return
+
+    answer_parts = []
+    try:
+        async for piece in stream_llm_answer(question, final_contexts_for_llm):
+            answer_parts.append(piece)
+            yield sse_event("token", {"text": piece})
+        llm_answer = "".join(answer_parts).strip() or LLM_EMPTY_ANSWER
+    except Exception:
+        llm_answer = LLM_ERROR_ANSWER
+        yield sse_event("error", {"message": llm_answer})
+
+    response = AnswerResponse(answer=llm_answer, links=derived_links)
+    if llm_answer not in (LLM_EMPTY_ANSWER, LLM_ERROR_ANSWER):
+        answer_cache.store(question, question_embedding, vector_store.version, response)
+    yield sse_event("done", response.model_dump())
+
+
+async def answer_question(question: str):
+    log.info("Question received", extra={"endpoint": "/api/", "question": question[:200]})
+
+    if not question.strip():
+        return AnswerResponse(answer="Please provide a question.", links=[])
+
+    question_embedding = await get_embedding(question)
+    if not question_embedding:
+        return AnswerResponse(
+            answer="Sorry, I couldn't process the question embedding.", links=[]
+        )
+
+    cached_response, similarity = answer_cache.lookup(
+        question, question_embedding, vector_store.version
+    )
+    if cached_response is not None:
+        log.info("Answer cache hit; skipping LLM call.", extra={"similarity": round(similarity, 3)})
+        return cached_response
+
+    final_contexts_for_llm = retrieve_contexts(question, question_embedding)
+    return await answer_from_contexts(question, question_embedding, final_contexts_for_llm)
+
+
+async def answer_from_contexts(question: str, question_embedding, final_contexts_for_llm):
     if not final_contexts_for_llm:
-        llm_answer = "I could not find relevant information in my documents to answer your question."
+        llm_answer = NO_RELEVANT_INFO_ANSWER
         derived_links = []
     else:
-        print(
-            f"Total contexts (including replies) for LLM: {len(final_contexts_for_llm)}"
+        log.info(
+            "Total contexts (including replies) for LLM",
+            extra={"contexts": len(final_contexts_for_llm)},
         )
         llm_answer = await generate_llm_answer(
-            request.question, final_contexts_for_llm
+            question, final_contexts_for_llm
         )  # Pass the augmented list
-        derived_links = []
-        for ctx in final_contexts_for_llm:
-            url = str(ctx.get("url", "#"))
-            title = str(ctx.get("title", "Relevant Document"))
-            # Link canonicalization
-            if (
-                url.startswith("https://tds.s-anand.net#") and "/../" in url
-            ):  # More specific to the known URL structure
-                parts = url.split("#", 1)  # Split only on the first #
-                base = parts[0]
-                hash_path = parts[1] if len(parts) > 1 else ""
-                # Replace /../ which implies going up one segment from root of hash path
-                # e.g., #/2025-01/../docker becomes #/docker (incorrect for this site)
-                # e.g., #/../docker becomes #/docker (correct for this site if #/ is root)
-                # The links are like "#/../docker", meaning relative to the root of the hash path.
-                # So, "#/../<name>" should become "#/<name>"
-                if hash_path.startswith("/../"):
-                    hash_path = hash_path.replace(
-                        "/../", "/", 1
-                    )  # Replace only the first instance at the start
-                url = base + "#" + hash_path
-            derived_links.append(Link(url=url, text=title[:100]))
-
-    if "could not find" in llm_answer.lower() or "no information" in llm_answer.lower():
-        pass
-
-    return AnswerResponse(answer=llm_answer, links=derived_links)
+        derived_links = derive_links(final_contexts_for_llm)
+
+    response = AnswerResponse(answer=llm_answer, links=derived_links)
+    if final_contexts_for_llm and llm_answer not in (LLM_EMPTY_ANSWER, LLM_ERROR_ANSWER):
+        answer_cache.store(question, question_embedding, vector_store.version, response)
+    return response
+
+
+@app.post("/api/batch")
+async def batch_answers(request: BatchRequest):
+    # NDJSON: one AnswerResponse per line, plus the question's position in the request,
+    # written as each answer completes (not in request order).
+    if len(request.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch.",
+        )
+    require_index_ready()
+    return StreamingResponse(
+        timed_stream(answer_batch_lines(request.questions), "/api/batch"),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+def batch_line(index: int, response: AnswerResponse) -> str:
+    return json.dumps({"index": index, **response.model_dump()}, ensure_ascii=False) + "\n"
+
+
+async def answer_batch_lines(questions: list):
+    log.info("Batch received", extra={"endpoint": "/api/batch", "questions": len(questions)})
+    asked = []
+    for i, question in enumerate(questions):
+        if question.strip():
+            asked.append(i)
+        else:
+            yield batch_line(i, AnswerResponse(answer="Please provide a question.", links=[]))
+
+    embeddings = await get_embeddings([questions[i] for i in asked])
+    ready = {}  # index -> AnswerResponse known without an LLM call
+    pending = []  # (index, embedding, contexts) still needing an answer
+
+    # No awaits from here to the end of retrieval, so every row id refers to the same
+    # vector_store even if the index watcher swaps in a new version meanwhile.
+    searchable = []
+    for i, embedding in zip(asked, embeddings):
+        if not embedding:
+            ready[i] = AnswerResponse(
+                answer="Sorry, I couldn't process the question embedding.", links=[]
+            )
+            continue
+        cached_response, _ = answer_cache.lookup(questions[i], embedding, vector_store.version)
+        if cached_response is not None:
+            ready[i] = cached_response
+        else:
+            searchable.append((i, embedding))
+    if searchable:
+        with telemetry.stage("retrieve_batch"):
+            hits = vector_store.search_indices_batch(
+                [embedding for _, embedding in searchable], vector_candidates(RETRIEVAL_TOP_N)
+            )
+        for (i, embedding), (vector_ids, _) in zip(searchable, hits):
+            contexts = retrieve_contexts(questions[i], embedding, vector_ids=vector_ids)
+            pending.append((i, embedding, contexts))
+    log.info(
+        "Batch retrieval done",
+        extra={
+            "answered_without_llm": len(ready),
+            "queued": len(pending),
+            "concurrency": BATCH_LLM_CONCURRENCY,
+        },
+    )
+
+    for i, response in ready.items():
+        yield batch_line(i, response)
+
+    llm_slots = asyncio.Semaphore(max(1, BATCH_LLM_CONCURRENCY))
+
+    async def answer_one(i, embedding, contexts):
+        async with llm_slots:
+            return i, await answer_from_contexts(questions[i], embedding, contexts)
+
+    tasks = [asyncio.create_task(answer_one(*item)) for item in pending]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            i, response = await finished
+            yield batch_line(i, response)
+    finally:
+        # Client went away mid-batch: stop the chat calls that have not finished.
+        for task in tasks:
+            task.cancel()
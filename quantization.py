@@ -0,0 +1,251 @@
+# Compact encodings of the embedding matrix for candidate search.
+#
+#   float16  half precision, 2x smaller than float32
+#   int8     scalar quantization with a per-dimension scale, 4x smaller
+#   pca      projection onto the top principal components fitted on the corpus
+#
+# Candidates are ranked on the compact codes and, optionally, the best few are
+# rescored exactly against the full-precision (memory-mapped) vectors, so only
+# those rows are ever paged in. Codes are saved as quantized-<kind>.npz inside
+# the embedding index directory, tied to the index build version.
+#
+#   python quantization.py report --dest embedding_index --pca-dim 256
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+
+import embedding_index
+
+SCORE_CHUNK_ROWS = 16384
+
+log = logging.getLogger("tds_ta.quantization")
+
+
+class Float16Codec:
+    kind = "float16"
+
+    def __init__(self, codes=None):
+        self.codes = codes
+
+    def fit(self, matrix):
+        self.codes = np.asarray(matrix, dtype=np.float16)
+        return self
+
+    def scores(self, query):
+        out = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCORE_CHUNK_ROWS):
+            block = self.codes[start : start + SCORE_CHUNK_ROWS].astype(np.float32)
+            out[start : start + SCORE_CHUNK_ROWS] = block @ query
+        return out
+
+    def arrays(self):
+        return {"codes": self.codes}
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+
+class Int8Codec:
+    kind = "int8"
+
+    def __init__(self, codes=None, scale=None):
+        self.codes = codes
+        self.scale = scale  # per-dimension float32 step
+
+    def fit(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        max_abs = np.abs(matrix).max(axis=0)
+        self.scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        self.codes = np.empty(matrix.shape, dtype=np.int8)
+        for start in range(0, len(matrix), SCORE_CHUNK_ROWS):
+            block = matrix[start : start + SCORE_CHUNK_ROWS] / self.scale
+            self.codes[start : start + SCORE_CHUNK_ROWS] = np.clip(np.rint(block), -127, 127)
+        return self
+
+    def scores(self, query):
+        # codes * scale @ q == codes @ (scale * q), so the query absorbs the scale.
+        scaled_query = query * self.scale
+        out = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCORE_CHUNK_ROWS):
+            block = self.codes[start : start + SCORE_CHUNK_ROWS].astype(np.float32)
+            out[start : start + SCORE_CHUNK_ROWS] = block @ scaled_query
+        return out
+
+    def arrays(self):
+        return {"codes": self.codes, "scale": self.scale}
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scale.nbytes
+
+
+class PCACodec:
+    kind = "pca"
+
+    def __init__(self, codes=None, mean=None, components=None, dim=256):
+        self.codes = codes
+        self.mean = mean
+        self.components = components  # [dim, full_dim]
+        self.dim = dim if components is None else len(components)
+
+    def fit(self, matrix, sample_rows=20000, seed=0):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(len(matrix), min(sample_rows, len(matrix)), replace=False)]
+        self.mean = sample.mean(axis=0).astype(np.float32)
+        _, _, vt = np.linalg.svd(sample - self.mean, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[: self.dim], dtype=np.float32)
+        self.dim = len(self.components)
+        self.codes = np.empty((len(matrix), self.dim), dtype=np.float32)
+        for start in range(0, len(matrix), SCORE_CHUNK_ROWS):
+            block = matrix[start : start + SCORE_CHUNK_ROWS] - self.mean
+            self.codes[start : start + SCORE_CHUNK_ROWS] = block @ self.components.T
+        return self
+
+    def scores(self, query):
+        # x ~= mean + codes @ components, so x . q ~= mean . q + codes @ (components @ q)
+        return self.codes @ (self.components @ query) + float(self.mean @ query)
+
+    def arrays(self):
+        return {"codes": self.codes, "mean": self.mean, "components": self.components}
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.mean.nbytes + self.components.nbytes
+
+
+CODECS = {codec.kind: codec for codec in (Float16Codec, Int8Codec, PCACodec)}
+
+
+def make_codec(kind, pca_dim=256):
+    if kind not in CODECS:
+        raise ValueError(f"Unknown quantization '{kind}'; expected one of {sorted(CODECS)}")
+    return PCACodec(dim=pca_dim) if kind == "pca" else CODECS[kind]()
+
+
+def codec_path(index_dir, kind):
+    return os.path.join(index_dir, f"quantized-{kind}.npz")
+
+
+def save_codec(index_dir, codec, index_version):
+    path = codec_path(index_dir, codec.kind)
+    tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+    np.savez(tmp_path, index_version=np.array(index_version or ""), **codec.arrays())
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_codec(index_dir, kind, index_version, pca_dim=256):
+    path = codec_path(index_dir, kind)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if str(data["index_version"]) != (index_version or ""):
+            return None
+        arrays = {name: data[name] for name in data.files if name != "index_version"}
+    codec = CODECS[kind](**arrays)
+    if kind == "pca" and codec.dim != pca_dim:
+        return None
+    return codec
+
+
+def load_or_fit(index_dir, matrix, kind, index_version, pca_dim=256, save=True):
+    # save=False (read-only workers) fits missing codes in memory only.
+    codec = load_codec(index_dir, kind, index_version, pca_dim)
+    if codec is None:
+        start = time.perf_counter()
+        codec = make_codec(kind, pca_dim).fit(matrix)
+        log.info(f"Built {kind} codes in {time.perf_counter() - start:.1f}s")
+        if not save:
+            log.warning(f"{index_dir} has no {kind} codes for this build; kept in memory, not saved.")
+            return codec
+        try:
+            save_codec(index_dir, codec, index_version)
+        except OSError as e:
+            log.warning(f"Could not save {kind} codes to {index_dir}: {e}")
+    return codec
+
+
+class QuantizedSearcher:
+    """Top-k on compact codes, with an optional exact rescore of the best candidates."""
+
+    def __init__(self, codec, rescore_candidates=50):
+        self.codec = codec
+        self.rescore_candidates = rescore_candidates
+
+    def search(self, matrix, query, top_n):
+        scores = self.codec.scores(query)
+        k = min(max(top_n, self.rescore_candidates), len(scores))
+        candidates = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        if self.rescore_candidates:
+            candidates = np.sort(candidates)  # sequential reads from the memmap
+            scores = np.asarray(matrix[candidates], dtype=np.float32) @ query
+        else:
+            scores = scores[candidates]
+        best = np.argsort(-scores, kind="stable")[:top_n]
+        return candidates[best].astype(np.int64), scores[best]
+
+
+def report(matrix, kinds, pca_dim, rescore_candidates, top_n=10, n_queries=200, seed=0):
+    from vector_store import VectorStore
+
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(matrix), min(n_queries, len(matrix)), replace=False)
+    noise = rng.standard_normal((len(picks), matrix.shape[1])).astype(np.float32) * 0.02
+    queries = embedding_index.normalize_rows(matrix[picks] + noise)
+    exact_store = VectorStore(matrix, [None] * len(matrix), normalized=True)
+    exact = [set(exact_store.search_indices(q, top_n)[0].tolist()) for q in queries]
+
+    full_bytes = matrix.shape[0] * matrix.shape[1] * 4
+    python_list_bytes = matrix.shape[0] * (56 + matrix.shape[1] * (8 + 24))  # list + float objects
+    print(f"{len(matrix)} rows x {matrix.shape[1]} dims, recall@{top_n} over {len(queries)} queries")
+    print(f"{'python lists':<26} {python_list_bytes / 2**20:9.1f} MiB")
+    print(f"{'float32 (exact)':<26} {full_bytes / 2**20:9.1f} MiB  recall=1.000")
+    for kind in kinds:
+        codec = make_codec(kind, pca_dim).fit(matrix)
+        for rescore in sorted({0, rescore_candidates}):
+            searcher = QuantizedSearcher(codec, rescore)
+            start = time.perf_counter()
+            found = [set(searcher.search(matrix, q, top_n)[0].tolist()) for q in queries]
+            ms = (time.perf_counter() - start) * 1000 / len(queries)
+            recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact)])
+            label = f"{kind}{f' (dim {codec.dim})' if kind == 'pca' else ''}"
+            label += f" +rescore {rescore}" if rescore else ""
+            print(
+                f"{label:<26} {codec.nbytes / 2**20:9.1f} MiB  recall={recall:.3f}  "
+                f"saved={1 - codec.nbytes / full_bytes:5.1%}  {ms:6.2f} ms/query"
+            )
+
+
+def main():
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger("tds_ta").setLevel(logging.INFO)  # build progress from the library code
+    parser = argparse.ArgumentParser(description="Quantized embedding storage tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Fit and save compact codes for an index")
+    build.add_argument("--dest", default="embedding_index")
+    build.add_argument("--kind", choices=sorted(CODECS), default="int8")
+    build.add_argument("--pca-dim", type=int, default=256)
+    rep = sub.add_parser("report", help="Memory saved and recall lost per encoding")
+    rep.add_argument("--dest", default="embedding_index")
+    rep.add_argument("--kinds", nargs="+", default=["float16", "int8", "pca"])
+    rep.add_argument("--pca-dim", type=int, default=256)
+    rep.add_argument("--rescore", type=int, default=50)
+    rep.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    matrix, _, header = embedding_index.load_index(args.dest)
+    if args.command == "build":
+        codec = make_codec(args.kind, args.pca_dim).fit(matrix)
+        path = save_codec(args.dest, codec, embedding_index.index_version(header))
+        print(f"Saved {args.kind} codes ({codec.nbytes / 2**20:.1f} MiB) to {path}")
+    else:
+        report(matrix, args.kinds, args.pca_dim, args.rescore, args.top_n)
+
+
+if __name__ == "__main__":
+    main()
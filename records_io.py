@@ -0,0 +1,223 @@
+# Reading and writing the scraped record files as JSON arrays or JSON Lines.
+#
+# JSON Lines (.jsonl) is one record per line: scrapers append each record as it
+# is produced, so a crashed run still leaves a usable file, and readers stream
+# records through a generator. Plain .json arrays stay supported everywhere and
+# are streamed too, decoded element by element from a small read buffer.
+#
+#   python records_io.py convert course_content.json discourse_posts.json
+#   python records_io.py convert --to json discourse_posts.jsonl
+import argparse
+import json
+import logging
+import os
+
+READ_CHUNK_CHARS = 1 << 16  # .json arrays are decoded from a buffer of about this size
+
+log = logging.getLogger("tds_ta.records_io")
+
+
+def is_jsonl(path):
+    return path.endswith(".jsonl")
+
+
+def find_records_file(stem):
+    """Prefer <stem>.jsonl over <stem>.json; returns the .json path if neither exists."""
+    jsonl_path = f"{stem}.jsonl"
+    return jsonl_path if os.path.exists(jsonl_path) else f"{stem}.json"
+
+
+def iter_records(path):
+    """Yield records from a .jsonl file or a JSON array file, one at a time.
+
+    Raises FileNotFoundError and json.JSONDecodeError like json.load would.
+    """
+    if is_jsonl(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        yield from _iter_json_array(f)
+
+
+def _iter_json_array(f, chunk_chars=READ_CHUNK_CHARS):
+    # Decode array elements one by one from a sliding buffer, so neither the file's
+    # text nor the list of records is ever held whole.
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_chars)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+        return not eof
+
+    def peek():
+        nonlocal pos
+        while True:
+            pos = _skip_whitespace(buffer, pos)
+            if pos < len(buffer) or not read_more():
+                return buffer[pos : pos + 1]
+
+    if peek() != "[":
+        raise json.JSONDecodeError("Expected a JSON array of records", buffer, pos)
+    pos += 1
+    if peek() == "]":
+        return
+    while True:
+        peek()
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if read_more():
+                continue  # the record runs past the buffer
+            raise
+        if end == len(buffer) and read_more():
+            continue  # a bare number may go on in the next chunk
+        yield record
+        pos = end
+        separator = peek()
+        if separator == ",":
+            pos += 1
+        elif separator == "]":
+            return
+        else:
+            raise json.JSONDecodeError("Expected ',' or ']'", buffer, pos)
+
+
+def _skip_whitespace(text, pos):
+    while pos < len(text) and text[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+def iter_source(path, source, failed_sources):
+    """Yield a scraped data file's records; if it is missing or undecodable, add source to failed_sources.
+
+    Callers keep a failed source's indexed rows instead of treating them as removed.
+    """
+    count = 0
+    try:
+        for record in iter_records(path):
+            count += 1
+            yield record
+        log.info(f"Loaded {count} items from {path}")
+    except FileNotFoundError:
+        failed_sources.add(source)
+        log.error(f"{path} not found; keeping its indexed rows.")
+    except json.JSONDecodeError as e:
+        failed_sources.add(source)
+        log.error(f"Could not decode {path} after {count} items ({e}); keeping its indexed rows.")
+
+
+class JsonlWriter:
+    """Append records to a .jsonl file, flushing each line so a crash loses at most one record."""
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.count = 0
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.count += 1
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordOutput:
+    """Scraper output: appended line by line for .jsonl, written as one indented array on close for .json."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._records = None if is_jsonl(path) else []
+        self._writer = JsonlWriter(path) if is_jsonl(path) else None
+
+    def add(self, record):
+        if self._writer:
+            self._writer.write(record)
+        else:
+            self._records.append(record)
+        self.count += 1
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+        else:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._records, f, indent=2, ensure_ascii=False)
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_records(path, records):
+    """Write records as JSON Lines or an indented JSON array (by extension), replacing path atomically."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    if is_jsonl(path):
+        with JsonlWriter(tmp_path) as writer:
+            writer.write_many(records)
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(records), f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def convert(path, to="jsonl"):
+    stem, _ = os.path.splitext(path)
+    dest = f"{stem}.{to}"
+    if dest == path:
+        raise ValueError(f"{path} is already .{to}")
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+
+    write_records(dest, counted(iter_records(path)))
+    return dest, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert scraped record files between JSON and JSON Lines.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    conv = sub.add_parser("convert")
+    conv.add_argument("paths", nargs="+")
+    conv.add_argument("--to", choices=["jsonl", "json"], default="jsonl")
+    args = parser.parse_args()
+    for path in args.paths:
+        dest, count = convert(path, args.to)
+        print(f"Wrote {count} records from {path} to {dest}")
+
+
+if __name__ == "__main__":
+    main()
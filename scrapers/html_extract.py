@@ -0,0 +1,141 @@
+# Single-pass HTML walkers shared by the scrapers.
+#
+# Both walk the tree once with an explicit stack, skip unwanted subtrees
+# without visiting them, and never look at an element's parents, so the cost
+# is O(elements) regardless of nesting depth. lxml is used when installed.
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+
+try:
+    import lxml  # noqa: F401  (only needed as a BeautifulSoup tree builder)
+    HTML_PARSER = "lxml"
+except ImportError:  # optional dependency
+    HTML_PARSER = "html.parser"
+
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5'}
+# Elements turned into one content part each; their subtrees are not walked again.
+BLOCK_TAGS = HEADING_TAGS | {'p', 'ul', 'ol', 'pre', 'blockquote', 'table', 'details'}
+TEXT_STRING_TYPES = (NavigableString, CData)  # what Tag.get_text() returns by default
+
+
+def parse_html(html, parser=None):
+    return BeautifulSoup(html, parser or HTML_PARSER)
+
+
+def plain_text(html_or_tag, skip_tags=('blockquote',), parser=None):
+    """Same as decomposing skip_tags and calling get_text(separator='\n', strip=True), in one pass."""
+    root = parse_html(html_or_tag, parser) if isinstance(html_or_tag, str) else html_or_tag
+    skip = set(skip_tags)
+    pieces = []
+    stack = [iter(root.children)]
+    while stack:
+        for node in stack[-1]:
+            if isinstance(node, Tag):
+                if node.name not in skip:
+                    stack.append(iter(node.children))
+                    break
+            elif type(node) in TEXT_STRING_TYPES:
+                text = node.strip()
+                if text:
+                    pieces.append(text)
+        else:
+            stack.pop()
+    return "\n".join(pieces)
+
+
+def _is_source_code_div(element):
+    return element.name == 'div' and 'sourceCode' in (element.get('class') or ())
+
+
+def iter_blocks(container):
+    """Yield (element, in_details) for each content block under container, in document order.
+
+    Subtrees whose class list contains 'sidebar' are skipped. A block's own subtree is
+    not descended into, except for <details>, whose children are blocks in their own right.
+    """
+    stack = [(iter(container.children), False)]
+    while stack:
+        children, in_details = stack[-1]
+        for node in children:
+            if not isinstance(node, Tag):
+                continue
+            if 'sidebar' in (node.get('class') or ()):
+                continue
+            if node.name in BLOCK_TAGS or _is_source_code_div(node):
+                yield node, in_details
+                if node.name == 'details':
+                    stack.append((iter(node.children), True))
+                    break
+            else:
+                stack.append((iter(node.children), in_details))
+                break
+        else:
+            stack.pop()
+
+
+def _list_part(element, prefix):
+    items = [li.get_text(separator=' ', strip=True) for li in element.find_all('li', recursive=False)]
+    items = [item for item in items if item]
+    return "\n".join(f"{prefix}{item}" for item in items) if items else None
+
+
+def _table_part(element):
+    table_representation = ["Table:"]
+    has_thead = element.find('thead') is not None
+    for row_idx, row in enumerate(element.find_all('tr')):
+        cols = [col.get_text(strip=True) for col in row.find_all(['th', 'td'])]
+        if row_idx == 0 and has_thead:
+            table_representation.append(" | ".join(cols))
+            table_representation.append(" | ".join(["---"] * len(cols)))
+        elif cols:
+            table_representation.append(" | ".join(cols))
+    return "\n".join(table_representation) if len(table_representation) > 1 else None
+
+
+def block_part(element, in_details=False):
+    """Text for one non-heading block, formatted like the original Selenium extractor, or None."""
+    name = element.name
+    if name == 'p':
+        text = element.get_text(separator=' ', strip=True)
+        if text and not (element.find('img') and not element.text.strip()):
+            return text
+    elif name in ('ul', 'ol'):
+        return _list_part(element, "  - " if in_details else "- ")
+    elif name == 'pre' or _is_source_code_div(element):
+        code_text = element.get_text().strip()
+        if code_text:
+            return f"```\n{code_text}\n```"
+    elif name == 'details':
+        summary_tag = element.find('summary', recursive=False)
+        if summary_tag:
+            return f"Details Summary: {summary_tag.get_text(separator=' ', strip=True)}"
+    elif name == 'blockquote':
+        quote_text = element.get_text(separator='\n', strip=True)
+        if quote_text:
+            return "> " + quote_text.replace('\n', '\n> ')
+    elif name == 'table':
+        return _table_part(element)
+    return None
+
+
+def iter_sections(container, page_url, title):
+    """Yield {"title", "content", "source_url"} sections, split at h1-h5 headings."""
+    current_title = title
+    parts = []
+    for element, in_details in iter_blocks(container):
+        if element.name in HEADING_TAGS:
+            new_title = element.get_text(separator=' ', strip=True)
+            if parts or (element.name != 'h1' and new_title != current_title):
+                section_text = "\n".join(part for part in parts if part).strip()
+                if section_text:
+                    yield {"title": current_title, "content": section_text, "source_url": page_url}
+                parts = []
+                current_title = new_title
+            elif element.name == 'h1':
+                current_title = new_title
+            continue
+        part = block_part(element, in_details)
+        if part:
+            parts.append(part)
+    section_text = "\n".join(part for part in parts if part).strip()
+    if section_text:
+        yield {"title": current_title, "content": section_text, "source_url": page_url}
@@ -1,29 +1,46 @@
+import argparse
 import json
+import os
+import posixpath
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup 
 import time
 
-# Selenium imports
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import TimeoutException
+from html_extract import iter_sections, parse_html
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from records_io import RecordOutput
+
+# Selenium imports (only needed for the browser-rendered fallback)
+try:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from webdriver_manager.chrome import ChromeDriverManager
+    from selenium.common.exceptions import TimeoutException
+except ImportError:
+    webdriver = None
+    TimeoutException = TimeoutError
 
 # --- Course Content Scraper START ---
 COURSE_BASE_URL = "https://tds.s-anand.net/" 
-INITIAL_COURSE_URL = f"{COURSE_BASE_URL}#/2025-01/" # Entry point, typically loads #/README or similar
-
-# get_content_from_page_selenium function remains the same as your last working version.
-# Ensure the blockquote fix is in your version:
-# elif element.name == 'blockquote':
-#     quote_text = element.get_text(separator='\n', strip=True)
-#     if quote_text:
-#         formatted_quote = f"> {quote_text.replace('\n', '\n> ')}"
-#         current_section_content_parts.append(formatted_quote)
+INITIAL_COURSE_ROUTE = "/2025-01/"
+INITIAL_COURSE_URL = f"{COURSE_BASE_URL}#{INITIAL_COURSE_ROUTE}" # Entry point, typically loads #/README or similar
+
+# The site is Docsify: every #/route is rendered in the browser from a plain markdown file,
+# so the fast path fetches those files directly instead of driving Chrome page by page.
+MARKDOWN_WORKERS = 8
+REQUEST_TIMEOUT = 30
+SAVE_HTML_DIR = None # set by --save-html to keep each rendered page as a fixture
+
 def get_content_from_page_selenium(driver, page_url):
-    page_course_data = []
     print(f"Selenium navigating to: {page_url}")
     try:
         driver.get(page_url)
@@ -32,110 +49,106 @@ def get_content_from_page_selenium(driver, page_url):
         )
         time.sleep(2) 
         page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
     except TimeoutException:
         print(f"Timeout waiting for content to load on {page_url}")
         return []
     except Exception as e:
         print(f"Error during Selenium navigation or getting page source for {page_url}: {e}")
         return []
+    if SAVE_HTML_DIR: # fixtures for benchmarks/bench_html_extract.py
+        os.makedirs(SAVE_HTML_DIR, exist_ok=True)
+        fixture_name = re.sub(r"[^A-Za-z0-9_-]+", "_", page_url.split('#')[-1]).strip('_') or "index"
+        with open(os.path.join(SAVE_HTML_DIR, f"{fixture_name}.html"), "w", encoding='utf-8') as f: f.write(page_source)
+    return list(iter_page_sections(page_source, page_url))
 
+
+def find_content_container(soup):
     content_article = soup.find('article', class_='markdown-section', id='main')
     if not content_article:
-        content_section = soup.find('section', class_='content')
-        if content_section: content_article = content_section
-        else:
-            content_article = soup.find('main')
-            if not content_article:
-                if soup.body: content_article = soup.body 
-                else:
-                    print(f"Selenium: Could not find specific content container for URL: {page_url}")
-                    return []
-    
+        content_article = soup.find('section', class_='content') or soup.find('main') or soup.body
+    return content_article
+
+
+def iter_page_sections(page_source, page_url):
+    """Yield title/content/source_url sections of one rendered page in a single pass over its tree."""
+    soup = parse_html(page_source)
+    content_article = find_content_container(soup)
+    if not content_article:
+        print(f"Selenium: Could not find specific content container for URL: {page_url}")
+        return
+
     page_h1_tag = content_article.find('h1')
-    current_section_title = page_h1_tag.get_text(separator=' ', strip=True) if page_h1_tag else \
-                           (soup.title.string if soup.title else page_url.split('#')[-1] or "Page Content")
-    current_section_content_parts = []
-
-    for element in content_article.find_all(True, recursive=True): 
-        if not hasattr(element, 'name'): continue
-        if any(parent.get('class') and 'sidebar' in parent.get('class') for parent in element.parents): continue
-        
-        if element.name in ['h1', 'h2', 'h3', 'h4', 'h5']:
-            new_title = element.get_text(separator=' ', strip=True)
-            if current_section_content_parts or (element.name != 'h1' and new_title != current_section_title):
-                section_text = "\n".join(part for part in current_section_content_parts if part).strip()
-                if section_text: page_course_data.append({"title": current_section_title, "content": section_text, "source_url": page_url})
-                current_section_content_parts = []
-                current_section_title = new_title
-            elif element.name == 'h1' and not current_section_content_parts : current_section_title = new_title
-        elif element.name == 'p':
-            text = element.get_text(separator=' ', strip=True)
-            if text and not (element.find('img') and not element.text.strip()): current_section_content_parts.append(text)
-        elif element.name == 'ul' or element.name == 'ol':
-            list_items = [li.get_text(separator=' ', strip=True) for li in element.find_all('li', recursive=False) if li.get_text(strip=True)]
-            if list_items: current_section_content_parts.append("\n".join(f"- {item}" for item in list_items))
-        elif element.name == 'pre' or (element.name == 'div' and element.has_attr('class') and 'sourceCode' in element['class']):
-            code_text = element.get_text()
-            if code_text.strip(): current_section_content_parts.append(f"```\n{code_text.strip()}\n```")
-        elif element.name == 'details':
-            summary_tag = element.find('summary', recursive=False)
-            if summary_tag: current_section_content_parts.append(f"Details Summary: {summary_tag.get_text(separator=' ', strip=True)}")
-            for detail_child in element.find_all(['p', 'ul', 'ol', 'div', 'pre'], recursive=False):
-                if summary_tag and detail_child == summary_tag: continue
-                if detail_child.name == 'p': current_section_content_parts.append(detail_child.get_text(separator=' ', strip=True))
-                elif detail_child.name in ['ul', 'ol']:
-                    d_list_items = [li.get_text(separator=' ', strip=True) for li in detail_child.find_all('li', recursive=False) if li.get_text(strip=True)]
-                    if d_list_items: current_section_content_parts.append("\n".join(f"  - {item}" for item in d_list_items))
-                elif detail_child.name == 'pre' or (detail_child.name == 'div' and detail_child.has_attr('class') and 'sourceCode' in detail_child['class']):
-                    d_code_text = detail_child.get_text()
-                    if d_code_text.strip(): current_section_content_parts.append(f"```\n{d_code_text.strip()}\n```")
-        elif element.name == 'blockquote':
-            quote_text = element.get_text(separator='\n', strip=True)
-            if quote_text:
-                formatted_quote = f"> {quote_text.replace('\n', '\n> ')}" # Corrected line
-                current_section_content_parts.append(formatted_quote)
-        elif element.name == 'table':
-            table_representation = ["Table:"]
-            for row_idx, row in enumerate(element.find_all('tr')):
-                cols = [col.get_text(strip=True) for col in row.find_all(['th', 'td'])]
-                if row_idx == 0 and element.find('thead'): 
-                    table_representation.append(" | ".join(cols))
-                    table_representation.append(" | ".join(["---"] * len(cols)))
-                elif cols: table_representation.append(" | ".join(cols))
-            if len(table_representation) > 1 : current_section_content_parts.append("\n".join(table_representation))
-
-    if current_section_content_parts:
-        section_text = "\n".join(part for part in current_section_content_parts if part).strip()
-        if section_text: page_course_data.append({"title": current_section_title, "content": section_text, "source_url": page_url})
-    if not page_course_data and content_article:
+    page_title = page_h1_tag.get_text(separator=' ', strip=True) if page_h1_tag else \
+                 (soup.title.string if soup.title else page_url.split('#')[-1] or "Page Content")
+    found_sections = False
+    for section in iter_sections(content_article, page_url, page_title):
+        found_sections = True
+        yield section
+    if not found_sections:
         all_text = content_article.get_text(separator='\n', strip=True)
         sidebar_check = content_article.find('aside', class_='sidebar')
         if sidebar_check: all_text = all_text.replace(sidebar_check.get_text(separator='\n', strip=True), '').strip()
         if all_text:
             title_tag_text = soup.title.string if soup.title else None
             final_title = title_tag_text or page_url.split('#')[-1] or "Page Content"
-            page_course_data.append({"title": final_title, "content": all_text, "source_url": page_url})
-    return page_course_data
+            yield {"title": final_title, "content": all_text, "source_url": page_url}
 
 
-def scrape_course_content_static():
-    all_site_course_data = []
-    
-    print("Initializing Selenium WebDriver...")
+def make_driver():
     options = webdriver.ChromeOptions()
     options.add_argument('--headless')
     options.add_argument('--disable-gpu')
     options.add_argument('--no-sandbox')
     options.add_argument('--window-size=1920,1080')
+    service = ChromeService(ChromeDriverManager().install())
+    return webdriver.Chrome(service=service, options=options)
+
+
+def scrape_pages_selenium(page_urls, selenium_workers=1, driver=None):
+    """Render page_urls with a pool of headless browsers, one per worker. Yields one section list per URL, in order.
+
+    A page is yielded as None if its worker could not start a browser (e.g. Chrome or chromedriver is missing).
+    """
+    if selenium_workers <= 1 and driver is not None:
+        for url in page_urls: yield get_content_from_page_selenium(driver, url)
+        return
+    local = threading.local()
+    drivers = []
+    drivers_lock = threading.Lock()
+
+    def scrape_one(url):
+        if not hasattr(local, 'driver'):
+            try:
+                local.driver = make_driver()
+            except Exception as e:
+                local.driver = None # tried once per worker, not once per page
+                print(f"Could not start a Selenium browser: {e}")
+            else:
+                with drivers_lock: drivers.append(local.driver)
+        if local.driver is None:
+            return None
+        return get_content_from_page_selenium(local.driver, url)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, selenium_workers)) as executor:
+            yield from executor.map(scrape_one, page_urls)
+    finally:
+        for pooled_driver in drivers: pooled_driver.quit()
+
+
+def scrape_course_content_static(output_filename="course_content.json", selenium_workers=1):
+    
+    print("Initializing Selenium WebDriver...")
     try:
-        service = ChromeService(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=options)
+        if webdriver is None: raise ImportError("selenium and webdriver-manager are not installed")
+        driver = make_driver()
     except Exception as e:
         print(f"Error initializing Selenium WebDriver: {e}")
-        with open("course_content.json", "w", encoding='utf-8') as f: json.dump({"error": f"Selenium init error: {str(e)}", "data": []}, f, indent=2, ensure_ascii=False)
-        return "course_content.json"
+        with open(output_filename, "w", encoding='utf-8') as f: json.dump({"error": f"Selenium init error: {str(e)}", "data": []}, f, indent=2, ensure_ascii=False)
+        return output_filename
 
+    # .jsonl output is appended page by page, so a crashed run keeps what it had.
+    all_site_course_data = RecordOutput(output_filename)
     initial_page_content = get_content_from_page_selenium(driver, INITIAL_COURSE_URL)
     if initial_page_content:
         all_site_course_data.extend(initial_page_content)
@@ -187,29 +200,317 @@ def scrape_course_content_static():
 
     print(f"Found {len(page_urls_to_scrape)} unique page links to scrape from the sidebar (using Selenium).")
     
-    for i, page_url in enumerate(list(page_urls_to_scrape)): # page_url is already normalized here
-        print(f"Processing linked page ({i+1}/{len(page_urls_to_scrape)}): {page_url}")
-        page_content = get_content_from_page_selenium(driver, page_url) # Pass normalized URL
+    page_urls = list(page_urls_to_scrape) # page_url is already normalized here
+    if selenium_workers > 1:
+        driver.quit() # the pool starts its own browsers
+        driver = None
+    print(f"Rendering {len(page_urls)} pages with {max(1, selenium_workers)} browser(s)...")
+    for page_url, page_content in zip(page_urls, scrape_pages_selenium(page_urls, selenium_workers, driver)):
         if page_content:
             all_site_course_data.extend(page_content)
         else:
             print(f"No content extracted from linked page (Selenium): {page_url}")
     
-    driver.quit()
+    if driver is not None: driver.quit()
 
-    output_filename = "course_content.json"
     if all_site_course_data:
         print(f"\nScraped a total of {len(all_site_course_data)} sections from the entire course site using Selenium.")
     else:
         print("\nNo sections were scraped from the course site using Selenium.")
             
-    with open(output_filename, "w", encoding='utf-8') as f:
-        json.dump(all_site_course_data, f, indent=2, ensure_ascii=False)
+    all_site_course_data.close()
     print(f"Course content saved to: {output_filename}")
     return output_filename
+
+# --- Markdown (Docsify) fast path ---
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+SETEXT_UNDERLINE_RE = re.compile(r"^ {0,3}(=+|-+)\s*$") # under a paragraph line: === is h1, --- is h2
+THEMATIC_BREAK_RE = re.compile(r"^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$") # <hr>, which has no text
+LIST_ITEM_RE = re.compile(r"^(\s*)(?:[-*+]|\d+[.)])\s+(.*)$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+TABLE_SEPARATOR_RE = re.compile(r"^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$")
+SUMMARY_RE = re.compile(r"<summary>(.*?)</summary>", re.IGNORECASE | re.DOTALL)
+LINK_TARGET = r"\((?:[^()]|\([^()]*\))*\)" # (url "title"), allowing one level of () inside the url
+IMAGE_RE = re.compile(r"!\[[^\]]*\]" + LINK_TARGET)
+LINK_RE = re.compile(r"\[([^\]]*)\](?:" + LINK_TARGET + r"|\[[^\]]*\])") # inline [text](url) or reference [text][ref]
+AUTOLINK_RE = re.compile(r"<((?:https?|ftp)://[^>\s]+|[^>\s@]+@[^>\s@]+)>")
+SIDEBAR_LINK_RE = re.compile(r"\[[^\]]*\]\(([^)\s]+)")
+TAG_RE = re.compile(r"<[^>]+>")
+CODE_SPAN_RE = re.compile(r"(`+)(.+?)\1")
+STRONG_RE = re.compile(r"(\*\*|__)(?=\S)(.+?)(?<=\S)\1")
+EMPHASIS_RE = re.compile(r"(?<![\w*])\*(?=[^\s*])(.+?)(?<=[^\s*])\*(?![\w*])|(?<!\w)_(?=[^\s_])(.+?)(?<=[^\s_])_(?!\w)")
+
+
+def strip_emphasis(text):
+    text = TAG_RE.sub("", text)
+    text = STRONG_RE.sub(r"\2", text)
+    return EMPHASIS_RE.sub(lambda m: m.group(1) or m.group(2), text) # snake_case and 2*3*4 are left alone
+
+
+def inline_text(text):
+    """Markdown inline syntax to the plain text a browser would show."""
+    text = IMAGE_RE.sub("", text)
+    text = LINK_RE.sub(r"\1", text)
+    text = AUTOLINK_RE.sub(r"\1", text)
+    # Code spans are shown verbatim, so *, _ and <...> inside them are kept.
+    pieces, pos = [], 0
+    for code in CODE_SPAN_RE.finditer(text):
+        pieces.append(strip_emphasis(text[pos:code.start()]))
+        pieces.append(code.group(2))
+        pos = code.end()
+    pieces.append(strip_emphasis(text[pos:]))
+    return " ".join("".join(pieces).split())
+
+
+def route_to_markdown_path(route):
+    # Docsify: #/foo -> foo.md, #/dir/ -> dir/README.md
+    path = route.lstrip('/')
+    if not path or path.endswith('/'): return path + 'README.md'
+    return path if path.endswith('.md') else path + '.md'
+
+
+def sidebar_routes(sidebar_markdown):
+    """Routes (like "/bash") linked from a _sidebar.md, in sidebar order."""
+    routes = []
+    for href in SIDEBAR_LINK_RE.findall(sidebar_markdown):
+        if re.match(r"^[a-z]+:", href) or href.startswith('#') and not href.startswith('#/'): continue
+        path = (href[2:] if href.startswith('#/') else href).split('?')[0].lstrip('/')
+        # Docsify resolves sidebar links from the site root; '../foo' becomes '/foo' like the Selenium path does.
+        normalized = posixpath.normpath(path) if path else '.'
+        normalized = re.sub(r"^(\.\./)+", "", normalized)
+        if normalized.endswith('.md'): normalized = normalized[:-3]
+        route = '/' + ('' if normalized in ('.', '..') else normalized)
+        if path.endswith('/') and not route.endswith('/'): route += '/'
+        if route not in routes: routes.append(route)
+    return routes
+
+
+def markdown_sections(markdown_text, page_url):
+    """Split one Docsify markdown page into title/content/source_url sections, like get_content_from_page_selenium."""
+    sections = []
+    current_title = None
+    parts = []
+    paragraph, list_items, quote_lines, table_rows = [], [], [], []
+    table_has_header = False
+
+    def flush_blocks():
+        nonlocal table_has_header
+        if paragraph:
+            text = inline_text(" ".join(paragraph))
+            if text: parts.append(text)
+            paragraph.clear()
+        if list_items:
+            items = [item for item in (inline_text(i) for i in list_items) if item]
+            if items: parts.append("\n".join(f"- {item}" for item in items))
+            list_items.clear()
+        if quote_lines:
+            lines = [line for line in (inline_text(q) for q in quote_lines) if line]
+            if lines: parts.append("> " + "\n> ".join(lines))
+            quote_lines.clear()
+        if table_rows:
+            table = ["Table:"]
+            for row_idx, cols in enumerate(table_rows):
+                table.append(" | ".join(cols))
+                if row_idx == 0 and table_has_header: table.append(" | ".join(["---"] * len(cols)))
+            parts.append("\n".join(table))
+            table_rows.clear()
+            table_has_header = False
+
+    def flush_section():
+        section_text = "\n".join(part for part in parts if part).strip()
+        if section_text:
+            sections.append({"title": current_title or page_url.split('#')[-1] or "Page Content", "content": section_text, "source_url": page_url})
+        parts.clear()
+
+    def start_heading(new_title, level):
+        # Same rule as html_extract.iter_sections for <h1>-<h5>.
+        nonlocal current_title
+        flush_blocks()
+        is_h1 = level == 1
+        if parts or (not is_h1 and new_title != current_title):
+            flush_section()
+            current_title = new_title
+        elif is_h1: current_title = new_title
+
+    lines = markdown_text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+        i += 1
+
+        fence = FENCE_RE.match(line)
+        if fence:
+            flush_blocks()
+            code = []
+            while i < len(lines) and not lines[i].strip().startswith(fence.group(1)):
+                code.append(lines[i])
+                i += 1
+            i += 1 # closing fence
+            code_text = "\n".join(code).strip()
+            if code_text: parts.append(f"```\n{code_text}\n```")
+            continue
+
+        setext = SETEXT_UNDERLINE_RE.match(line) if paragraph else None
+        if setext:
+            new_title = inline_text(" ".join(paragraph))
+            paragraph.clear()
+            start_heading(new_title, 1 if setext.group(1)[0] == '=' else 2)
+            continue
+
+        if THEMATIC_BREAK_RE.match(line):
+            flush_blocks()
+            continue
+
+        heading = HEADING_RE.match(line) if len(line) - len(line.lstrip()) < 4 else None
+        if heading and len(heading.group(1)) <= 5:
+            start_heading(inline_text(heading.group(2)), len(heading.group(1)))
+            continue
+
+        if not stripped:
+            flush_blocks()
+            continue
+
+        summary = SUMMARY_RE.search(stripped)
+        if summary:
+            flush_blocks()
+            parts.append(f"Details Summary: {inline_text(summary.group(1))}")
+            continue
+
+        if stripped.startswith('>'):
+            if not quote_lines: flush_blocks()
+            quote_lines.append(stripped.lstrip('>').strip())
+            continue
+
+        if stripped.startswith('|'):
+            if not table_rows: flush_blocks()
+            if TABLE_SEPARATOR_RE.match(stripped):
+                table_has_header = len(table_rows) == 1
+                continue
+            table_rows.append([inline_text(col) for col in stripped.strip('|').split('|')])
+            continue
+
+        item = LIST_ITEM_RE.match(line)
+        if item:
+            if not list_items: flush_blocks()
+            if item.group(1) and list_items: list_items[-1] += " " + item.group(2) # nested item
+            else: list_items.append(item.group(2))
+            continue
+        if list_items and line[:1].isspace():
+            list_items[-1] += " " + stripped # continuation of the last item
+            continue
+
+        if list_items or quote_lines or table_rows: flush_blocks()
+        paragraph.append(stripped)
+
+    flush_blocks()
+    flush_section()
+    return sections
+
+
+def make_http_session(pool_size=MARKDOWN_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=3)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def fetch_markdown(session, base_url, route):
+    response = session.get(base_url + route_to_markdown_path(route), timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    response.encoding = 'utf-8'
+    return response.text
+
+
+def scrape_course_content_markdown(output_filename="course_content.json", base_url=COURSE_BASE_URL,
+                                   workers=MARKDOWN_WORKERS, selenium_fallback=True, selenium_workers=1):
+    """Fetch every sidebar page's markdown concurrently and split it into sections.
+
+    Pages whose markdown cannot be fetched are rendered with Selenium when it is available.
+    Returns None if the sidebar itself cannot be loaded, so callers can fall back entirely.
+    """
+    start = time.perf_counter()
+    session = make_http_session(workers)
+    route_dir = INITIAL_COURSE_ROUTE if INITIAL_COURSE_ROUTE.endswith('/') else posixpath.dirname(INITIAL_COURSE_ROUTE)
+    sidebar = None
+    for sidebar_path in (route_dir.lstrip('/') + '_sidebar.md', '_sidebar.md'): # Docsify looks up from the route's folder
+        try:
+            sidebar = session.get(base_url + sidebar_path, timeout=REQUEST_TIMEOUT)
+            sidebar.raise_for_status()
+            break
+        except requests.RequestException as e:
+            print(f"Could not fetch {base_url}{sidebar_path}: {e}")
+            sidebar = None
+    if sidebar is None:
+        return None
+    sidebar.encoding = 'utf-8'
+
+    routes = [INITIAL_COURSE_ROUTE] + [r for r in sidebar_routes(sidebar.text) if r != INITIAL_COURSE_ROUTE]
+    print(f"Found {len(routes) - 1} unique page links in the sidebar; fetching markdown with {workers} workers...")
+
+    def fetch_page(route):
+        try:
+            return fetch_markdown(session, base_url, route)
+        except requests.RequestException as e:
+            print(f"Could not fetch markdown for #{route}: {e}")
+            return None
+
+    # Closed in finally: with .json output nothing is written until then.
+    all_site_course_data = RecordOutput(output_filename)
+    failed_urls = []
+    skipped_urls = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for route, markdown_text in zip(routes, executor.map(fetch_page, routes)):
+                page_url = f"{COURSE_BASE_URL}#{route}"
+                if markdown_text is None:
+                    failed_urls.append(page_url)
+                    continue
+                page_content = markdown_sections(markdown_text, page_url)
+                if page_content: all_site_course_data.extend(page_content)
+                else: print(f"No content extracted from markdown page: {page_url}")
+
+        if failed_urls and selenium_fallback and webdriver is not None:
+            print(f"Rendering {len(failed_urls)} pages with Selenium instead...")
+            rendered = 0
+            try:
+                for page_url, page_content in zip(failed_urls, scrape_pages_selenium(failed_urls, selenium_workers)):
+                    rendered += 1
+                    if page_content is None: skipped_urls.append(page_url)
+                    else: all_site_course_data.extend(page_content)
+            except Exception as e: # e.g. the browser crashed mid-run
+                print(f"Selenium fallback failed: {e}")
+                skipped_urls.extend(failed_urls[rendered:])
+        else:
+            skipped_urls = failed_urls
+    finally:
+        if skipped_urls:
+            print(f"Skipped {len(skipped_urls)} pages that could not be fetched or rendered:")
+            for page_url in skipped_urls: print(f"  {page_url}")
+        print(f"\nScraped a total of {len(all_site_course_data)} sections from {len(routes)} markdown pages in {time.perf_counter() - start:.1f}s.")
+        all_site_course_data.close()
+        print(f"Course content saved to: {output_filename}")
+    return output_filename
 # --- Course Content Scraper END ---
 
 if __name__ == "__main__":
-    print("Running Course Content Scraper (Selenium version)...")
-    scrape_course_content_static()
-    print("Course content scraping complete.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape the TDS course site.")
+    parser.add_argument("--mode", choices=["auto", "markdown", "selenium"], default="auto",
+                        help="auto: markdown, falling back to Selenium if the sidebar cannot be fetched")
+    parser.add_argument("--base-url", default=COURSE_BASE_URL, help="Where the markdown files are served from")
+    parser.add_argument("--output", default="course_content.json")
+    parser.add_argument("--workers", type=int, default=MARKDOWN_WORKERS)
+    parser.add_argument("--selenium-workers", type=int, default=1, help="Headless browsers rendering in parallel")
+    parser.add_argument("--save-html", default=None, help="Directory to save pages rendered by Selenium")
+    args = parser.parse_args()
+    SAVE_HTML_DIR = args.save_html
+    result = None
+    if args.mode in ("auto", "markdown"):
+        print("Running Course Content Scraper (markdown version)...")
+        result = scrape_course_content_markdown(args.output, args.base_url, args.workers,
+                                                selenium_fallback=args.mode == "auto", selenium_workers=args.selenium_workers)
+    if result is None and args.mode != "markdown":
+        print("Running Course Content Scraper (Selenium version)...")
+        scrape_course_content_static(args.output, args.selenium_workers)
+    print("Course content scraping complete.")
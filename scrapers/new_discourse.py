@@ -1,22 +1,46 @@
+import argparse
+import os
+import random
 import requests
 import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from bs4 import BeautifulSoup 
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
 import time
 
+from html_extract import plain_text
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from records_io import RecordOutput, find_records_file, iter_records, write_records
+
 # --- Discourse Scraper START (Robust Pagination for Topics & Posts) ---
 BASE_DISCOURSE_URL = "https://discourse.onlinedegree.iitm.ac.in"
-# Template for fetching pages of topic summaries, sorted by creation date (newest first)
-CATEGORY_TOPICS_URL_TEMPLATE = f"{BASE_DISCOURSE_URL}/c/courses/tds-kb/34.json?order=created&ascending=false&page="
-# Template for fetching pages of posts within a specific topic
-TOPIC_POSTS_URL_TEMPLATE = f"{BASE_DISCOURSE_URL}/t/{{topic_id}}.json?page={{page_num_posts}}"
+# Path for fetching pages of topic summaries, sorted by creation date (newest first)
+CATEGORY_TOPICS_PATH_TEMPLATE = "/c/courses/tds-kb/34.json?order=created&ascending=false&page="
+# Path for fetching pages of posts within a specific topic
+TOPIC_POSTS_PATH_TEMPLATE = "/t/{topic_id}.json?page={page_num_posts}"
 
 START_DATE = datetime(2025, 1, 1, tzinfo=timezone.utc)
 END_DATE = datetime(2025, 4, 14, 23, 59, 59, tzinfo=timezone.utc)
-REQUEST_DELAY = 0.75 # Be a bit more gentle with nested loops
 
 # Max pages to fetch for the TOPIC LIST (as per your observation, 0-7 covers it)
 MAX_TOPIC_LIST_PAGES = 7 
+MAX_POST_PAGES = 50 # Safety limit per topic, 50 pages * ~20 posts/page = ~1000 posts
+POSTS_PER_TOPIC_PAGE = 20 # Discourse default page size for /t/{id}.json
+
+# Topics are fetched by a pool of workers sharing one rate limit instead of sleeping before every request.
+MAX_WORKERS = 8
+REQUESTS_PER_SECOND = 4.0 # Across all workers; bursts of up to this many
+MAX_RETRIES = 5 # For 429, 5xx and connection errors
+BACKOFF_SECONDS = 1.0 # Doubled per attempt unless the server sends Retry-After
+REQUEST_TIMEOUT = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Incremental sync: per-topic watermarks from the last run, keyed by topic id
+SYNC_STATE_FILE = "discourse_sync_state.json"
 
 def parse_discourse_date(date_str):
     try:
@@ -25,16 +49,39 @@ def parse_discourse_date(date_str):
         return None
 
 def get_plain_text_bs(html_content):
+    # Post text without quoted replies, from one pass over the tree (see html_extract.plain_text).
     if not html_content: return ""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    for blockquote in soup.find_all('blockquote'): blockquote.decompose()
-    return soup.get_text(separator='\n', strip=True)
+    return plain_text(html_content, skip_tags=('blockquote',))
 
-def scrape_discourse_api():
-    all_posts_data = []
-    relevant_topic_summaries = []
-    
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0: return # unlimited
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def make_session(pool_size=MAX_WORKERS):
+    # One session, so every worker reuses the same pool of keep-alive connections.
     session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
     # !!! IMPORTANT: Paste your copied cookie string here !!!
     copied_cookie_string = "_ga_XDDWGSY1RE=GS1.1.1735319349.1.1.1735319575.0.0.0; _ga_MGSL57J8T3=GS1.1.1740652502.2.1.1740652547.0.0.0; _ga_8L0MCJC2XX=GS1.1.1744283296.1.0.1744283360.60.0.1907214739; _ga_FE0EJC6NK8=GS1.1.1744336701.3.0.1744336701.0.0.0; _ga_QHXRKWW9HH=GS1.3.1745680461.22.0.1745680461.0.0.0; _ga=GA1.1.735334308.1690304957; _ga_MXPR4XHYG9=GS1.1.1745820417.1.1.1745820431.0.0.0; _bypass_cache=true; _gcl_au=1.1.277248169.1749857140; _ga_5HTJMW67XK=GS2.1.s1749857144$o32$g0$t1749857154$j50$l0$h0; _ga_08NPRH5L4M=GS2.1.s1749857140$o75$g1$t1749857208$j60$l0$h0; _t=xe3znqZKCIanxfqge32wwW4rZ4dbhNk3rCW0QGDCfizPfkNT%2F3tsg%2FmIHHFFiy7d8tkjNDUVGARobcXuknKzL3algRg8dKWGQ93PVWFgpcUCwpjbnnASrbtJli%2BF3ReHG19nLnJcqcN0Kh4sunemCPaVpb9w8nkUPrhK7AlDF4OixqoD9wDh4UATOZVuf04ZOWRrr12cvzfZ2%2BSgE1D%2F4TwW1apcOwcm4p2%2FWwsWAQcGIoIZYjm6V6GDApT0FMM6ZaGWrETEfoLeem%2BF8uO4NinmFu91ajUHjvGP2baUWkEl0N4jqjBsgMWIBS4%3D--qUgbxHQl6wppj4nG--jC8mvrA34Z25umQMC%2F0Aug%3D%3D; _forum_session=EQE7ZODC4MZjjY0iRn%2BFlOfmQQQam41e65F4eXD9CLKqkZYHHJidWZM41VnLSUgZ9CvoAA04r4wTBAyoo%2FmJN5hYBCRwBvaf05bjoAiXl7osPCehtzLpm4dJGKLdNd6jjnQ%2FFV4hgdzU2BW6fXVNVxfL75%2Bytou6dwH7DavHk1kqs1RdNJ0Ui3R4jWbokki5ZAiFGa%2Bkaa0yMk%2FlBiPax5a23B%2Bivhq1gzcVVbVfYe%2BH4r0RFMuiBYlY1CbU4pAtciTGGuUnQb3SPWyHXmigK%2BTTHkBReHKFsCBllS6iXhnjIgm3XVPntscGuj6a2uIQv%2FFUJ2OM5LIy7pAahDr8qNCxjrE3iRyGwBQ0r0GclxA62bOGEQY66nBgaCV3mpdwN4lMzp6GREUseZuAooaRTL6vXJS62ZbsN1AV2Wc4ppgOQuBCLhOfZSMV6sHRh6b9BqAIA0QC5ydFguDWUvDrZPDpD7glQoGBVYhdPmWY3G%2BUqyMN%2BOYS%2F%2BOPQeu1XL3uPBqTpYq8KfaMGpvMO%2BXeDwLi13W3VHlx%2Fo9AbIVl%2BH5pesXEJafneGIL3i3XSucyvPQ9Q%2FEKn%2BCG5KSdX2zVslXezWd0oKA9zAzs7hxIWo4tUdX36iuHwf9WV0J5VcKwsOitn5kFOjuJhg%3D%3D--pRP6aDbFK1MPeter--V%2BAXxozu7LlFHjgSDahpjw%3D%3D"
     headers = {
@@ -44,126 +91,252 @@ def scrape_discourse_api():
         'X-Requested-With': 'XMLHttpRequest',
     }
     session.headers.update(headers)
+    return session
+
+def retry_after_seconds(response):
+    value = response.headers.get('Retry-After')
+    if not value: return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try: # HTTP-date form
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
 
+def fetch_json(session, url, bucket, max_retries=MAX_RETRIES):
+    """GET url and decode JSON. Returns None on 404; raises once retries are exhausted."""
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        try:
+            response = session.get(url, timeout=REQUEST_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries: raise
+            delay, reason = None, type(e).__name__
+        else:
+            if response.status_code == 404:
+                return None
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                response.raise_for_status()
+                return response.json()
+            delay, reason = retry_after_seconds(response), f"HTTP {response.status_code}"
+        if delay is None:
+            delay = BACKOFF_SECONDS * 2 ** attempt * (0.5 + random.random())
+        print(f"  {reason} for {url}; retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+        time.sleep(delay)
+
+def is_relevant_topic(topic_summary):
+    created_at_str = topic_summary.get('created_at')
+    last_posted_at_str = topic_summary.get('last_posted_at')
+
+    topic_created_dt = parse_discourse_date(created_at_str) if created_at_str else None
+    topic_last_posted_dt = parse_discourse_date(last_posted_at_str) if last_posted_at_str else None
+
+    if topic_created_dt and topic_last_posted_dt:
+        return topic_created_dt <= END_DATE and topic_last_posted_dt >= START_DATE
+    # If last_posted_at is missing, check created_at
+    return bool(topic_created_dt and START_DATE <= topic_created_dt <= END_DATE)
+
+def fetch_topic_summaries(session, bucket, base_url, executor):
     print("Fetching topic summaries from Discourse category (paginated, sorted)...")
-    for page_num_topics in range(MAX_TOPIC_LIST_PAGES + 1): # 0 to MAX_TOPIC_LIST_PAGES inclusive
-        category_url = f"{CATEGORY_TOPICS_URL_TEMPLATE}{page_num_topics}"
-        print(f"Fetching topic list page: {category_url}")
+    # All list pages are requested at once, then read in order up to the first empty or failed page.
+    page_urls = [f"{base_url}{CATEGORY_TOPICS_PATH_TEMPLATE}{n}" for n in range(MAX_TOPIC_LIST_PAGES + 1)]
+    futures = [executor.submit(fetch_json, session, url, bucket) for url in page_urls]
+
+    relevant_topic_summaries = []
+    for page_num_topics, future in enumerate(futures):
         try:
-            response = session.get(category_url)
-            response.raise_for_status()
-            category_page_data = response.json()
+            category_page_data = future.result()
+            if category_page_data is None:
+                raise requests.HTTPError(f"404 Not Found: {page_urls[page_num_topics]}")
         except Exception as e:
             print(f"Error fetching topic list page {page_num_topics}: {e}")
-            break 
+            break
 
         topics_on_page = category_page_data.get('topic_list', {}).get('topics', [])
         if not topics_on_page:
             print(f"No more topics found on topic list page {page_num_topics}.")
             break
-        
-        for topic_summary in topics_on_page:
-            created_at_str = topic_summary.get('created_at')
-            last_posted_at_str = topic_summary.get('last_posted_at')
-            
-            topic_created_dt = parse_discourse_date(created_at_str) if created_at_str else None
-            topic_last_posted_dt = parse_discourse_date(last_posted_at_str) if last_posted_at_str else None
+        relevant_topic_summaries.extend(t for t in topics_on_page if is_relevant_topic(t))
+        print(f"Collected {len(topics_on_page)} topics from list page {page_num_topics}. Total relevant topics so far: {len(relevant_topic_summaries)}")
+    for future in futures:
+        future.cancel()
+    return relevant_topic_summaries
 
-            if topic_created_dt and topic_last_posted_dt:
-                if topic_created_dt <= END_DATE and topic_last_posted_dt >= START_DATE:
-                    relevant_topic_summaries.append(topic_summary)
-            elif topic_created_dt and topic_created_dt <= END_DATE and topic_created_dt >= START_DATE: # If last_posted_at is missing, check created_at
-                 relevant_topic_summaries.append(topic_summary)
+def fetch_topic_posts(session, bucket, base_url, topic_summary, start_page=0, after_post_number=0):
+    """Return (posts, complete): this topic's posts inside the date range, in post order.
 
+    Only posts numbered above after_post_number are kept. complete is False if a page
+    failed, in which case the caller should not advance the topic's watermark.
+    """
+    topic_id = topic_summary.get('id')
+    topic_title = topic_summary.get('title')
+    topic_slug = topic_summary.get('slug')
+    posts = []
+    complete = True
 
-        print(f"Collected {len(topics_on_page)} topics from list page {page_num_topics}. Total relevant topics so far: {len(relevant_topic_summaries)}")
-        # Optional: Check if created_at of last topic on page is older than START_DATE to break early
-        # if topics_on_page and parse_discourse_date(topics_on_page[-1].get('created_at')) < START_DATE:
-        #     print("Topics on current page are older than START_DATE, stopping topic list fetching.")
-        #     break
-        time.sleep(REQUEST_DELAY)
-
-    print(f"\nFinished collecting topic summaries. Total relevant topics to process: {len(relevant_topic_summaries)}")
-    print("Now fetching all posts for relevant topics and filtering by date...")
-
-    unique_post_urls_added = set() # To avoid duplicate posts if a topic is somehow processed twice
-
-    for i, topic_summary in enumerate(relevant_topic_summaries):
-        topic_id = topic_summary.get('id')
-        topic_title = topic_summary.get('title')
-        topic_slug = topic_summary.get('slug')
-        
-        if not topic_id or not topic_slug: continue
-
-        print(f"\nProcessing Topic {i+1}/{len(relevant_topic_summaries)}: '{topic_title}' (ID: {topic_id})")
-        
-        page_num_posts = 0
-        while True: # Loop for paginating posts within this topic
-            topic_posts_url = TOPIC_POSTS_URL_TEMPLATE.format(topic_id=topic_id, page_num_posts=page_num_posts)
-            print(f"  Fetching posts page: {topic_posts_url}")
-            try:
-                time.sleep(REQUEST_DELAY)
-                topic_response = session.get(topic_posts_url)
-                if topic_response.status_code == 404:
-                    print(f"  Reached end of posts (404) for topic {topic_id} at page {page_num_posts}.")
-                    break 
-                topic_response.raise_for_status()
-                topic_page_data = topic_response.json()
-            except Exception as e:
-                print(f"  Error fetching posts for topic ID {topic_id}, page {page_num_posts}: {e}")
-                break 
-
-            posts_on_page = topic_page_data.get('post_stream', {}).get('posts', [])
-            if not posts_on_page and page_num_posts > 0 : # If not the first page and no posts, assume end
-                 print(f"  No more posts found for topic {topic_id} at page {page_num_posts}.")
-                 break
-            if not posts_on_page and page_num_posts == 0 and 'errors' in topic_page_data: # Handle cases where first page itself is an error
-                 print(f"  Error on first page of posts for topic {topic_id}: {topic_page_data.get('errors')}")
-                 break
-
-
-            for post in posts_on_page:
-                post_created_at_str = post.get('created_at')
-                if not post_created_at_str: continue
-                
-                post_date = parse_discourse_date(post_created_at_str)
-                if not post_date: continue
-
-                if START_DATE <= post_date <= END_DATE:
-                    post_number = post.get('post_number')
-                    post_permalink = f"{BASE_DISCOURSE_URL}/t/{topic_slug}/{topic_id}/{post_number}"
-                    
-                    if post_permalink not in unique_post_urls_added:
-                        post_content_html = post.get('cooked', '')
-                        post_content_text = get_plain_text_bs(post_content_html)
-                        username = post.get('username')
-                        
-                        all_posts_data.append({
-                            "url": post_permalink, "topic_title": topic_title, "topic_id": topic_id,
-                            "post_number": post_number, "author": username, "date_utc": post_date.isoformat(),
-                            "content": post_content_text
-                        })
-                        unique_post_urls_added.add(post_permalink)
-            
-            if not posts_on_page and page_num_posts == 0 : # If first page had no posts (e.g. topic deleted or empty)
+    page_num_posts = start_page
+    while True: # Loop for paginating posts within this topic
+        topic_posts_url = base_url + TOPIC_POSTS_PATH_TEMPLATE.format(topic_id=topic_id, page_num_posts=page_num_posts)
+        try:
+            topic_page_data = fetch_json(session, topic_posts_url, bucket)
+        except Exception as e:
+            print(f"  Error fetching posts for topic ID {topic_id}, page {page_num_posts}: {e}")
+            complete = False
+            break
+        if topic_page_data is None:
+            break # 404: past the last page
+
+        posts_on_page = topic_page_data.get('post_stream', {}).get('posts', [])
+        if not posts_on_page:
+            if page_num_posts == 0 and 'errors' in topic_page_data:
+                print(f"  Error on first page of posts for topic {topic_id}: {topic_page_data.get('errors')}")
+                complete = False
+            elif page_num_posts == 0:
                 print(f"  No posts found on the very first page for topic {topic_id}. Likely empty or issue.")
-                break
-
-            page_num_posts += 1
-            # Safety break if a topic somehow has an absurd number of pages (e.g., > 50 for typical topics)
-            if page_num_posts > 50 : # Adjust as needed, 50 pages * ~20 posts/page = ~1000 posts
-                print(f"  Reached safety limit of 50 pages for posts in topic {topic_id}. Moving to next topic.")
-                break
-    
-    output_filename = "discourse_posts_v2.json" # New filename
-    print(f"\nFound {len(all_posts_data)} posts in the specified date range from Discourse after robust scraping.")
-    with open(output_filename, "w", encoding='utf-8') as f:
-        json.dump(all_posts_data, f, indent=2, ensure_ascii=False)
+            break
+
+        for post in posts_on_page:
+            post_created_at_str = post.get('created_at')
+            if not post_created_at_str: continue
+
+            post_date = parse_discourse_date(post_created_at_str)
+            if not post_date: continue
+
+            post_number = post.get('post_number')
+            if post_number is not None and post_number <= after_post_number: continue
+
+            if START_DATE <= post_date <= END_DATE:
+                posts.append({
+                    "url": f"{BASE_DISCOURSE_URL}/t/{topic_slug}/{topic_id}/{post_number}", "topic_title": topic_title, "topic_id": topic_id,
+                    "post_number": post_number, "author": post.get('username'), "date_utc": post_date.isoformat(),
+                    "content": get_plain_text_bs(post.get('cooked', ''))
+                })
+
+        page_num_posts += 1
+        if page_num_posts > MAX_POST_PAGES:
+            print(f"  Reached safety limit of {MAX_POST_PAGES} pages for posts in topic {topic_id}. Moving to next topic.")
+            break
+    return posts, complete
+
+def scrape_discourse_api(base_url=BASE_DISCOURSE_URL, output_filename="discourse_posts_v2.json",
+                         max_workers=MAX_WORKERS, requests_per_second=REQUESTS_PER_SECOND):
+    start = time.perf_counter()
+    session = make_session(max_workers)
+    bucket = TokenBucket(requests_per_second)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        relevant_topic_summaries = fetch_topic_summaries(session, bucket, base_url, executor)
+        relevant_topic_summaries = [t for t in relevant_topic_summaries if t.get('id') and t.get('slug')]
+        print(f"\nFinished collecting topic summaries. Total relevant topics to process: {len(relevant_topic_summaries)}")
+        print(f"Now fetching all posts for relevant topics with {max_workers} workers at up to {requests_per_second:g} requests/s...")
+
+        # map() yields in topic order, so the output matches a sequential run.
+        # .jsonl output is appended topic by topic, so a crashed run keeps what it had.
+        all_posts_data = RecordOutput(output_filename)
+        unique_post_urls_added = set() # To avoid duplicate posts if a topic is somehow processed twice
+        topic_posts = executor.map(lambda t: fetch_topic_posts(session, bucket, base_url, t), relevant_topic_summaries)
+        for i, (topic_summary, (posts, _)) in enumerate(zip(relevant_topic_summaries, topic_posts)):
+            print(f"Processed Topic {i+1}/{len(relevant_topic_summaries)}: '{topic_summary.get('title')}' (ID: {topic_summary.get('id')}), {len(posts)} posts in range")
+            for post in posts:
+                if post['url'] not in unique_post_urls_added:
+                    all_posts_data.add(post)
+                    unique_post_urls_added.add(post['url'])
+
+    print(f"\nFound {len(all_posts_data)} posts in the specified date range from Discourse after robust scraping ({time.perf_counter() - start:.1f}s).")
+    all_posts_data.close()
     print(f"Discourse posts saved to: {output_filename}")
     return output_filename
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def load_json_file(path, default):
+    try:
+        with open(path, "r", encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def has_new_activity(topic_summary, watermark):
+    if not watermark: return True
+    if (topic_summary.get('highest_post_number') or 0) > watermark.get('highest_post_number', 0): return True
+    last_posted = parse_discourse_date(topic_summary.get('last_posted_at') or '')
+    seen_posted = parse_discourse_date(watermark.get('last_posted_at') or '')
+    return bool(last_posted and (not seen_posted or last_posted > seen_posted))
+
+def sync_discourse_incremental(base_url=BASE_DISCOURSE_URL, posts_filename=None,
+                               state_filename=SYNC_STATE_FILE,
+                               max_workers=MAX_WORKERS, requests_per_second=REQUESTS_PER_SECOND):
+    """Fetch only topics with new activity since the last run and merge their new posts into posts_filename.
+
+    posts_filename defaults to the discourse_posts file the server reads (.jsonl if present).
+    Returns the new or changed post records.
+    Edits to posts below a topic's watermark are not picked up; run a full scrape for those.
+    """
+    start = time.perf_counter()
+    posts_filename = posts_filename or find_records_file("discourse_posts")
+    session = make_session(max_workers)
+    bucket = TokenBucket(requests_per_second)
+    state = load_json_file(state_filename, {})
+    existing_posts = iter_records(posts_filename) if os.path.exists(posts_filename) else []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        relevant_topic_summaries = fetch_topic_summaries(session, bucket, base_url, executor)
+        relevant_topic_summaries = [t for t in relevant_topic_summaries if t.get('id') and t.get('slug')]
+        active_topics = [t for t in relevant_topic_summaries if has_new_activity(t, state.get(str(t['id'])))]
+        print(f"\n{len(active_topics)} of {len(relevant_topic_summaries)} relevant topics have new activity since the last sync.")
+
+        def fetch_new_posts(topic_summary):
+            watermark = state.get(str(topic_summary['id'])) or {}
+            # Resume from the page holding the last known post; a new topic starts at page 0.
+            start_page = watermark.get('posts_count', 0) // POSTS_PER_TOPIC_PAGE
+            return fetch_topic_posts(session, bucket, base_url, topic_summary, start_page, watermark.get('highest_post_number', 0))
+
+        fetched_posts = []
+        for topic_summary, (posts, complete) in zip(active_topics, executor.map(fetch_new_posts, active_topics)):
+            fetched_posts.extend(posts)
+            if complete:
+                state[str(topic_summary['id'])] = {
+                    'last_posted_at': topic_summary.get('last_posted_at'),
+                    'highest_post_number': max([topic_summary.get('highest_post_number') or 0] + [p['post_number'] or 0 for p in posts]),
+                    'posts_count': topic_summary.get('posts_count') or 0,
+                }
+
+    # Merge by permalink: replaced posts keep their position, new ones are appended.
+    merged = {post['url']: post for post in existing_posts}
+    changed_posts = []
+    for post in fetched_posts:
+        if merged.get(post['url']) != post:
+            changed_posts.append(post)
+        merged[post['url']] = post
+
+    # Posts first, then watermarks: a crash in between only means refetching a few pages.
+    write_records(posts_filename, merged.values()) # .json or .jsonl, by extension
+    write_json_atomic(state_filename, state)
+    print(f"Merged {len(changed_posts)} new or changed posts into {posts_filename} ({len(merged)} total, {time.perf_counter() - start:.1f}s).")
+    print("Run build_index.py (or let the server reload); only new or changed posts are re-embedded.")
+    return changed_posts
 # --- Discourse Scraper END ---
 
 if __name__ == "__main__":
-    print("Running Robust Discourse Scraper...")
-    scrape_discourse_api()
-    print("Discourse scraping complete.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape TDS Discourse posts.")
+    parser.add_argument("--base-url", default=BASE_DISCOURSE_URL, help="e.g. a local benchmarks/fake_discourse.py server")
+    parser.add_argument("--output", default="discourse_posts_v2.json")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--rps", type=float, default=REQUESTS_PER_SECOND, help="0 = no rate limit")
+    parser.add_argument("--incremental", action="store_true", help="Only fetch topics with new activity and merge into --merge-into")
+    parser.add_argument("--merge-into", default=None, help="default: discourse_posts.jsonl, else discourse_posts.json")
+    parser.add_argument("--state", default=SYNC_STATE_FILE)
+    args = parser.parse_args()
+    if args.incremental:
+        print("Running incremental Discourse sync...")
+        sync_discourse_incremental(args.base_url, args.merge_into, args.state, args.workers, args.rps)
+    else:
+        print("Running Robust Discourse Scraper...")
+        scrape_discourse_api(args.base_url, args.output, args.workers, args.rps)
+    print("Discourse scraping complete.")
@@ -0,0 +1,185 @@
+import atexit
+import bisect
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the histogram buckets; embedding and LLM calls sit in the upper half.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# --- Logging ---
+
+_STANDARD_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+_log_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed via extra= become top-level keys."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = {
+            key: value
+            for key, value in vars(record).items()
+            if key not in _STANDARD_RECORD_FIELDS and not key.startswith("_")
+        }
+        if fields:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in fields.items())
+        return line
+
+
+def setup_logging(name, level="INFO", fmt="json", stream=None):
+    """Return a logger whose records are formatted and written on a background thread.
+
+    The request path only puts records on a queue, so slow stdout/stderr never blocks it.
+    """
+    global _log_listener
+    handler = logging.StreamHandler(stream or sys.stderr)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    stop_logging()
+    log_queue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=False)
+    _log_listener.start()
+
+    logger = logging.getLogger(name)
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    logger.setLevel(str(level).upper())
+    logger.propagate = False
+    return logger
+
+
+def stop_logging():
+    # Flushes whatever is still queued.
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+atexit.register(stop_logging)
+
+# --- Metrics ---
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with one label."""
+
+    def __init__(self, name, help_text, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # label value -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {value: list(series) for value, series in self._series.items()}
+        for value, series in sorted(snapshot.items()):
+            label = f'{self.label}="{value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "tds_ta_stage_seconds", "Time spent in each stage of the answer pipeline.", "stage"
+)
+REQUEST_SECONDS = Histogram(
+    "tds_ta_request_seconds", "End-to-end time of answer requests.", "endpoint"
+)
+
+
+def render_metrics():
+    return STAGE_SECONDS.render() + REQUEST_SECONDS.render()
+
+
+# --- Per-request stage timings ---
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}  # stage -> seconds, summed if a stage runs more than once
+
+    def add(self, stage_name, seconds):
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request():
+    """Begin collecting stage timings for the current request (and tasks it spawns)."""
+    timings = RequestTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def finish_request(timings, endpoint):
+    REQUEST_SECONDS.observe(endpoint, timings.elapsed())
+
+
+def record(stage_name, seconds):
+    STAGE_SECONDS.observe(stage_name, seconds)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage_name, seconds)
+
+
+@contextmanager
+def stage(stage_name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage_name, time.perf_counter() - start)
@@ -0,0 +1,112 @@
+# Discourse thread index: the forum rows of the embedding index laid out topic by
+# topic in post_number order, with every position's topic bounds precomputed. It
+# is saved next to the embedding index and memory-mapped, and posts are read from
+# the index's own records, so workers do not each hold a copy of discourse_posts.
+import logging
+import time
+
+import numpy as np
+
+import embedding_index
+
+THREAD_ARRAYS = "threads"
+POST_NUMBER_BITS = 20  # a (topic_id, post_number) pair is packed into one int64 key
+
+log = logging.getLogger("tds_ta.thread_index")
+
+
+def thread_key(topic_id, post_number):
+    return (int(topic_id) << POST_NUMBER_BITS) | int(post_number)
+
+
+class ThreadIndex:
+    def __init__(self, records, keys, rows, topic_start, topic_end, before=0, after=2):
+        self.records = records  # the embedding index's records; rows point into them
+        self.keys = keys  # int64 thread_key per position, ascending
+        self.rows = rows  # int32 record row per position
+        self.topic_start = topic_start  # int32 first position of the post's topic
+        self.topic_end = topic_end  # int32 one past its last position
+        self.before = before
+        self.after = after
+
+    @classmethod
+    def from_records(cls, records, before=0, after=2):
+        # One position per post: chunked posts are represented by their first chunk.
+        keyed = []
+        for row, record in enumerate(records):
+            if record.get("source") != "discourse" or record.get("chunk", 0):
+                continue
+            try:
+                keyed.append((thread_key(record.get("topic_id"), record.get("post_number")), row))
+            except (TypeError, ValueError):
+                continue  # no usable topic_id / post_number
+        keyed.sort()
+        keys = np.array([key for key, _ in keyed], dtype=np.int64)
+        rows = np.array([row for _, row in keyed], dtype=np.int32)
+        boundaries = np.flatnonzero(np.diff(keys >> POST_NUMBER_BITS)) + 1
+        starts = np.concatenate([[0], boundaries])
+        ends = np.concatenate([boundaries, [len(keys)]])
+        topic_start = np.repeat(starts, ends - starts).astype(np.int32)
+        topic_end = np.repeat(ends, ends - starts).astype(np.int32)
+        return cls(records, keys, rows, topic_start, topic_end, before, after)
+
+    def save(self, index_dir, index_version):
+        embedding_index.save_arrays(
+            index_dir,
+            THREAD_ARRAYS,
+            {
+                "keys": self.keys,
+                "rows": self.rows,
+                "topic_start": self.topic_start,
+                "topic_end": self.topic_end,
+            },
+            index_version,
+        )
+
+    @classmethod
+    def load(cls, index_dir, records, expected_version, before=0, after=2):
+        """Memory-map a saved index, or return None if it is missing or for another index version."""
+        loaded = embedding_index.load_arrays(index_dir, THREAD_ARRAYS, expected_version)
+        if loaded is None:
+            return None
+        arrays, _ = loaded
+        return cls(
+            records, arrays["keys"], arrays["rows"], arrays["topic_start"], arrays["topic_end"], before, after
+        )
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def n_topics(self):
+        return int(np.count_nonzero(np.diff(self.keys >> POST_NUMBER_BITS))) + 1 if len(self.keys) else 0
+
+    def window(self, topic_id, post_number):
+        """Posts around (topic_id, post_number) in thread order, excluding that post itself."""
+        try:
+            key = thread_key(topic_id, post_number)
+        except (TypeError, ValueError):
+            return []
+        position = int(np.searchsorted(self.keys, key))
+        if position >= len(self.keys) or self.keys[position] != key:
+            return []
+        lo = max(int(self.topic_start[position]), position - self.before)
+        hi = min(int(self.topic_end[position]), position + self.after + 1)
+        return [self.records[int(self.rows[i])] for i in range(lo, hi) if i != position]
+
+
+def load_or_build(index_dir, records, index_version, before=0, after=2, save=True):
+    # save=False (read-only workers) builds a missing index in memory only.
+    threads = ThreadIndex.load(index_dir, records, index_version, before, after)
+    if threads is None:
+        start = time.perf_counter()
+        threads = ThreadIndex.from_records(records, before, after)
+        log.info(f"Built thread index ({len(threads)} posts) in {time.perf_counter() - start:.1f}s")
+        if not save:
+            log.warning(f"{index_dir} has no thread index for this build; kept in memory, not saved.")
+            return threads
+        try:
+            threads.save(index_dir, index_version)
+        except OSError as e:
+            log.warning(f"Could not save thread index to {index_dir}: {e}")
+    return threads
@@ -0,0 +1,114 @@
+import numpy as np
+
+
+class VectorStore:
+    """In-memory cosine similarity search over one contiguous float32 matrix."""
+
+    def __init__(self, vectors, records, normalized=False, version=None, index_dir=None):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(records), -1)
+        if len(matrix) != len(records):
+            raise ValueError(
+                f"Got {len(matrix)} vectors but {len(records)} records."
+            )
+        if normalized:
+            # Already unit length (e.g. a memory-mapped index); keep it zero-copy.
+            self.matrix = matrix
+        else:
+            # Pre-normalize rows once so a query only needs a single dot product.
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.matrix = np.ascontiguousarray(matrix / norms, dtype=np.float32)
+        # Sequences (lists, embedding_index.RecordStore) are kept as-is, not copied.
+        self.records = records if hasattr(records, "__getitem__") else list(records)
+        self.version = version  # embedding_index.index_version of the source index
+        self.index_dir = index_dir  # the build directory it was loaded from, if any
+        self.ann = None  # optional ann_index.IVFIndex; exact search when unset
+        self.n_probe = 8
+        self.quantized = None  # optional quantization.QuantizedSearcher
+
+    @classmethod
+    def from_pairs(cls, embedding_pairs):
+        # embedding_pairs is the legacy [(embedding, data_object), ...] list
+        if not embedding_pairs:
+            return cls(np.empty((0, 0), dtype=np.float32), [])
+        vectors = [emb for emb, _ in embedding_pairs]
+        records = [data for _, data in embedding_pairs]
+        return cls(vectors, records)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def _normalize_query(self, query_embedding):
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return query
+        return query / norm
+
+    def use_ann(self, ann, n_probe):
+        self.ann = ann
+        self.n_probe = n_probe
+
+    def use_quantized(self, searcher):
+        self.quantized = searcher
+
+    def search_indices(self, query_embedding, top_n=5, exact=False):
+        """Return (row_indices, scores) of the top_n rows, best first."""
+        if query_embedding is None or len(self.records) == 0 or top_n <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if self.ann is not None and not exact:
+            return self.ann.search(
+                self.matrix, self._normalize_query(query_embedding), top_n, self.n_probe
+            )
+        if self.quantized is not None and not exact:
+            return self.quantized.search(
+                self.matrix, self._normalize_query(query_embedding), top_n
+            )
+        scores = self.matrix @ self._normalize_query(query_embedding)
+        k = min(top_n, len(scores))
+        if k < len(scores):
+            # Partial selection, then sort only the k winners.
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return order, scores[order]
+
+    def search_indices_batch(self, query_embeddings, top_n=5, exact=False):
+        """search_indices for many queries at once; returns one (row_indices, scores) pair per query.
+
+        Exact search scores all queries with a single matrix-matrix product.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim != 2 or len(queries) == 0:
+            return []
+        if (self.ann is not None or self.quantized is not None) and not exact:
+            return [self.search_indices(query, top_n) for query in queries]
+        if len(self.records) == 0 or top_n <= 0:
+            empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+            return [empty for _ in range(len(queries))]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        scores = (queries / norms) @ self.matrix.T
+        k = min(top_n, scores.shape[1])
+        if k < scores.shape[1]:
+            candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        results = []
+        for row_scores, row_candidates in zip(scores, candidates):
+            order = row_candidates[np.argsort(-row_scores[row_candidates], kind="stable")]
+            results.append((order, row_scores[order]))
+        return results
+
+    def search(self, query_embedding, top_n=5, exact=False):
+        if query_embedding is None or len(query_embedding) == 0:
+            return []
+        indices, _ = self.search_indices(query_embedding, top_n, exact)
+        return [self.records[i] for i in indices]